@@ -1,17 +1,26 @@
 from src.agent.Core import AgentState, build_graph, save_graph_visualization
-from src.reports.TextReport import get_user_query, process_query
+from src.reports.TextReport import get_patient_id, get_user_query
+from src.reports.ImageReport import get_xray_input
+from src.reports.Session import ReportSession
 from langgraph.checkpoint.memory import MemorySaver
 from src.utils.DiagnosisExporter import DiagnosisExporter
-from src.reports.CombinedReport import generate_combined_report
+from src.models.LoadEmbeddingModel import preload_retrieval_models
+from src.models.LoadLLM import llm
+from src.utils.Streaming import TokenPrinter
+from src.reports.Batch import BATCH_WORKERS, run_batch
+import argparse
 import warnings
 import os
 import datetime
 
 warnings.filterwarnings("ignore")
 
-def build_graph_runnable():
-    # Compile the graph with persistent memory
-    graph = build_graph()
+# Print report sections token by token as the LLM produces them (0 = print each once complete)
+STREAM_REPORTS = os.environ.get("STREAM_REPORTS", "1") != "0"
+
+def build_graph_runnable(use_async: bool = False):
+    # Compile the graph with persistent memory; use_async builds awaitable nodes for `ainvoke`
+    graph = build_graph(use_async)
 
     try:
         runnable = graph.compile(checkpointer=MemorySaver())
@@ -24,33 +33,64 @@ def build_graph_runnable():
         return runnable
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Enhanced Medical Agent: interactive by default, or a batch of cases with --batch.")
+    parser.add_argument("--batch", metavar="CASES",
+                        help="JSONL or CSV file of cases (query, subject_id, image) to run without prompting")
+    parser.add_argument("--output", help="JSONL file the batch results are streamed to "
+                                         "(default data/diagnosis_results/batch_<timestamp>.jsonl)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Cases processed concurrently")
+    return parser.parse_args(argv)
+
+
+def print_llm_stats():
+    latency = llm.latency_stats()
+    print(f"\n⏱ LLM time to first token: mean {latency['ttft']['mean'] / 1000:.1f}s, p99 {latency['ttft']['p99'] / 1000:.1f}s "
+          f"| total: mean {latency['total']['mean'] / 1000:.1f}s")
+    cache = llm.cache_stats()
+    print(f"💾 LLM response cache: {cache['hits'] + cache['disk_hits']} hits, {cache['misses']} misses "
+          f"(hit rate {cache['hit_rate']:.0%})")
+
+
+def main(argv=None):
+    args = parse_args(argv)
     print("🏥 Starting Enhanced Medical Agent Application")
     
     runnable = build_graph_runnable()
+    # Warm the retrieval models up front so the first search does not stall the session
+    preload_retrieval_models()
+    
+    if args.batch:
+        # Models are loaded once for all cases; each case runs in its own session and graph thread
+        run_batch(runnable, args.batch, args.output, args.workers)
+        print_llm_stats()
+        print("\n🏥 Medical Agent completed!")
+        return
+    
     # Save graph visualization
     save_graph_visualization(runnable)
     
+    # Everything collected for this case lives in its report session
+    session = ReportSession()
+    
     # Get user query
     user_query = get_user_query()
     
-    # Process the query (to save it in the global state of TextReport)
-    process_query(user_query)
-    
-    # Get patient history ID first (this happens in generate_final_diagnosis)
-    # We're calling this separately to control the flow
-    from src.reports.TextReport import get_patient_history
-    patient_history_text, patient_history_available = get_patient_history()
+    # Clean and embed the query once; the context is reused by every later search
+    query_context = session.process_query(user_query)
     
-    # Now ask about X-ray image
-    from src.reports.ImageReport import get_xray_input
+    # Get patient history ID first, then ask about the X-ray image
+    patient_history_text, patient_history_available = session.load_patient_history(get_patient_id())
     xray_image = get_xray_input()
     
     if xray_image:
         try:
             # Generate the combined report and display it
             print("\n📋 Generating comprehensive clinical report...")
-            combined_report = generate_combined_report(user_query, xray_image, patient_history_text)
+            combined_report = session.generate_combined_report(user_query, xray_image, patient_history_text,
+                                                               query_context,
+                                                               on_token=TokenPrinter() if STREAM_REPORTS else None)
             print(f"\n📄 Combined Report Summary Length: {len(combined_report)} characters")
 
         except Exception as e:
@@ -66,7 +106,9 @@ def main():
         plan=None,
         reflection=None,
         agent_role="planner",
-        agent_outcome=None
+        agent_outcome=None,
+        query_context=query_context,
+        scratchpad=None
     )
     
     print("\n🚀 Initiating diagnostic workflow on the report...")
@@ -106,14 +148,8 @@ def main():
                 "timestamp": datetime.datetime.now().isoformat()
             }
             
-            # # Generate combined report
-            try:
-                
-                # Get diagnosis data from the combined report module
-                from src.reports.CombinedReport import diagnosis_data as combined_diagnosis_data
-                diagnosis_export_data.update(combined_diagnosis_data)
-            except (ImportError, AttributeError) as e:
-                print(f"\n⚠️ Could not generate combined diagnosis report: {str(e)}")
+            # Diagnosis data of the combined report
+            diagnosis_export_data.update(session.diagnosis_data)
             
             # Export to JSON
             export_path = DiagnosisExporter.export_to_json(
@@ -127,6 +163,7 @@ def main():
     else:
         print("\n❌ The diagnostic process did not complete successfully")
     
+    print_llm_stats()
     print("\n🏥 Medical Agent completed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+"""
+Benchmark full-corpus BM25Okapi scoring against the inverted-index BM25Index.
+
+Builds synthetic Zipf-distributed corpora of increasing size, checks that both
+engines return identical scores and reports the per-query latency of:
+  - BM25Okapi.get_scores (what Search.search used to do),
+  - BM25Index.score_candidates on 60 FAISS-sized candidate sets,
+  - BM25Index.top_k (exact lexical top-60).
+
+Usage:
+    python -m scripts.benchmark_bm25 --sizes 1000 10000 50000 --queries 50
+"""
+import argparse
+import time
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from src.retrieval.BM25Index import BM25Index
+
+
+def make_corpus(n_docs: int, vocab_size: int, rng: np.random.Generator):
+    ranks = np.arange(1, vocab_size + 1)
+    probs = 1.0 / ranks
+    probs /= probs.sum()
+    lengths = rng.integers(40, 200, size=n_docs)
+    words = rng.choice(vocab_size, size=int(lengths.sum()), p=probs)
+    corpus, offset = [], 0
+    for length in lengths:
+        corpus.append([f"t{w}" for w in words[offset:offset + length]])
+        offset += length
+    return corpus
+
+
+def time_per_query(fn, queries) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--vocab", type=int, default=30000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--candidates", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'docs':>8} {'okapi ms':>10} {'cand ms':>10} {'top-k ms':>10} {'speedup':>8}")
+    for n_docs in args.sizes:
+        corpus = make_corpus(n_docs, args.vocab, rng)
+        okapi = BM25Okapi(corpus)
+        index = BM25Index.from_tokenized(corpus)
+
+        queries = [[f"t{w}" for w in rng.integers(0, args.vocab // 10, size=rng.integers(3, 12))]
+                   for _ in range(args.queries)]
+        candidates = [rng.choice(n_docs, size=min(args.candidates, n_docs), replace=False) for _ in queries]
+
+        for q, cand in zip(queries[:5], candidates[:5]):
+            dense = okapi.get_scores(q)
+            if not np.array_equal(dense, index.get_scores(q)):
+                raise AssertionError("❌ Dense BM25Index scores differ from BM25Okapi.")
+            if not np.array_equal(dense[cand], index.score_candidates(q, cand)):
+                raise AssertionError("❌ Candidate BM25Index scores differ from BM25Okapi.")
+
+        okapi_ms = time_per_query(lambda q: okapi.get_scores(q), queries)
+        pairs = iter(candidates)
+        cand_ms = time_per_query(lambda q: index.score_candidates(q, next(pairs)), queries)
+        topk_ms = time_per_query(lambda q: index.top_k(q, args.candidates), queries)
+        print(f"{n_docs:>8} {okapi_ms:>10.2f} {cand_ms:>10.3f} {topk_ms:>10.3f} {okapi_ms / cand_ms:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Accuracy, FAISS recall and speed of the query encoder backends.
+
+Embeds the sample queries and the first chunks of the corpus with both
+encoders on every backend in EMBEDDING_BACKENDS and compares each with torch:
+- cosine distance of every model's vectors against EMBEDDING_COSINE_TOLERANCE
+- recall@k of the FAISS hits of the fused query vector (torch hits = truth)
+- single-query latency (embed_query) and batched throughput (embed_documents)
+
+Usage:
+    python -m scripts.benchmark_embedding_backends --backends torch torch_int8 onnx onnx_int8
+"""
+import argparse
+import gc
+import time
+
+import faiss
+import numpy as np
+
+from src.models.LoadEmbeddingModel import (
+    ALTERNATIVE_EMBEDDING_MODEL,
+    EMBEDDING_BACKENDS,
+    EMBEDDING_COSINE_TOLERANCE,
+    PRIMARY_EMBEDDING_MODEL,
+    load_embeddings,
+)
+from src.retrieval.ArtifactStore import has_artifacts, open_artifacts
+from src.retrieval.Search import FAISS_K
+from src.utils.Profiling import latency_summary, timed
+from scripts.benchmark_query_embedding import SAMPLE_QUERIES
+
+
+def load_texts(artifacts_dir: str, n_chunks: int):
+    texts = list(SAMPLE_QUERIES)
+    if n_chunks > 0 and has_artifacts(artifacts_dir):
+        chunks = open_artifacts(artifacts_dir).chunks
+        texts += [chunks.text(i) for i in range(min(n_chunks, len(chunks)))]
+    return texts
+
+
+def run_backend(backend, texts, batch, repeats):
+    models = [load_embeddings(PRIMARY_EMBEDDING_MODEL, backend), load_embeddings(ALTERNATIVE_EMBEDDING_MODEL, backend)]
+    for model in models:
+        model.embed_documents(texts[:2])  # warm-up
+    single_ms = []
+    for _ in range(repeats):
+        for text in SAMPLE_QUERIES:
+            with timed(single_ms):
+                for model in models:
+                    model.embed_query(text)
+    vectors = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        vectors = [np.vstack([np.asarray(model.embed_documents(texts[b:b + batch]), dtype="float32")
+                              for b in range(0, len(texts), batch)]) for model in models]
+    throughput = repeats * len(texts) / (time.perf_counter() - start)
+    del models
+    gc.collect()
+    return vectors, latency_summary(single_ms), throughput
+
+
+def cosine_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return 1.0 - (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--artifacts", default="./data/retrieval_artifacts")
+    parser.add_argument("--index", default="./data/faiss_index_D.idx")
+    parser.add_argument("--chunks", type=int, default=256, help="Corpus chunks embedded besides the sample queries")
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--k", type=int, default=FAISS_K)
+    args = parser.parse_args()
+
+    texts = load_texts(args.artifacts, args.chunks)
+    index = faiss.read_index(args.index)
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    print(f"✅ {len(texts)} texts, recall@{args.k} against '{args.index}' ({index.ntotal} vectors)")
+
+    reference_ids = None
+    print(f"{'backend':<11} {'max cos Δ':>10} {'tolerance':>10} {'recall':>7} {'query ms':>9} {'p99 ms':>8} {'texts/s':>8}")
+    for backend in backends:
+        try:
+            vectors, single, throughput = run_backend(backend, texts, args.batch, args.repeats)
+        except (ImportError, OSError) as e:
+            print(f"⚠ Skipping backend '{backend}': {e}")
+            if backend == "torch":
+                print("❌ The torch backend is the reference; nothing to compare against.")
+                return
+            continue
+        # Same fusion as QueryEmbedding: the mean of both encoders' vectors.
+        fused = np.ascontiguousarray((vectors[0] + vectors[1]) / 2.0, dtype="float32")
+        _, ids = index.search(fused, args.k)
+        if reference_ids is None:
+            reference_vectors, reference_ids = vectors, ids
+        max_delta = max(float(cosine_distance(v, r).max()) for v, r in zip(vectors, reference_vectors))
+        recall = np.mean([len(set(a.tolist()) & set(b.tolist())) / args.k for a, b in zip(ids, reference_ids)])
+        tolerance = EMBEDDING_COSINE_TOLERANCE[backend]
+        status = "✅" if max_delta <= tolerance or backend == "torch" else "❌"
+        print(f"{backend:<11} {max_delta:>10.2e} {tolerance:>10.0e} {recall:>7.3f} {single['mean']:>9.1f} "
+              f"{single['p99']:>8.1f} {throughput:>8.1f} {status}")
+
+
+if __name__ == "__main__":
+    main()
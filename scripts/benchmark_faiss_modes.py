@@ -0,0 +1,91 @@
+"""
+Compare FAISS index modes on recall, latency and resident memory.
+
+Each mode is loaded in a fresh process, so memory numbers are not polluted by
+other modes. Queries are stored vectors with a small perturbation unless a
+.npy file of real query embeddings is given. Recall@k is measured against the
+exact flat index.
+
+    rss       total resident memory added by loading the index and searching
+    anon      private (non-shareable) part of it
+    file      file-backed part, shared by every replica that maps the same file
+
+Usage:
+    python -m scripts.benchmark_faiss_modes --modes flat flat_mmap ivf hnsw ivfpq sq8
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+import numpy as np
+import faiss
+
+from src.retrieval.VectorIndex import INDEX_MODES, index_path_for, load_index, reconstruct_vectors
+from src.utils.Profiling import format_bytes, latency_summary, memory_usage
+
+
+def run_mode(mode, index_path, queries, ground_truth, k, nprobe, ef_search, results):
+    before = memory_usage()
+    index = load_index(index_path, mode, nprobe=nprobe, ef_search=ef_search)
+    latencies, found = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+    after = memory_usage()
+    recall = float(np.mean([len(set(f) & set(gt)) / k for f, gt in zip(found, ground_truth)]))
+    results.put({
+        "mode": mode,
+        "recall": recall,
+        **latency_summary(latencies),
+        **{key: after[key] - before[key] for key in ("rss", "rss_anon", "rss_file")},
+        "disk": os.path.getsize(index_path_for(index_path, mode)),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="./data/faiss_index_D.idx")
+    parser.add_argument("--modes", nargs="+", default=list(INDEX_MODES), choices=INDEX_MODES)
+    parser.add_argument("--queries", help="Optional .npy file with query embeddings (n, d)")
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=60)
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    args = parser.parse_args()
+
+    exact = faiss.read_index(args.index)
+    if args.queries:
+        queries = np.load(args.queries).astype("float32")
+    else:
+        rng = np.random.default_rng(0)
+        vectors = reconstruct_vectors(exact)
+        picked = vectors[rng.choice(len(vectors), min(args.n_queries, len(vectors)), replace=False)]
+        queries = (picked + rng.normal(0, 0.01, picked.shape)).astype("float32")
+    _, ground_truth = exact.search(queries, args.k)
+    del exact
+
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    rows = []
+    for mode in args.modes:
+        if not os.path.exists(index_path_for(args.index, mode)):
+            print(f"⚠ Skipping {mode}: build it with `python -m scripts.build_faiss_indexes --modes {mode}`")
+            continue
+        proc = ctx.Process(target=run_mode, args=(mode, args.index, queries, ground_truth, args.k,
+                                                  args.nprobe, args.ef_search, results))
+        proc.start()
+        rows.append(results.get())
+        proc.join()
+
+    print(f"\n{'mode':<10} {f'recall@{args.k}':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'rss':>10} {'anon':>10} {'file':>10} {'disk':>10}")
+    for row in rows:
+        print(f"{row['mode']:<10} {row['recall']:>10.4f} {row['p50']:>8.2f} {row['p99']:>8.2f} "
+              f"{format_bytes(row['rss']):>10} {format_bytes(row['rss_anon']):>10} "
+              f"{format_bytes(row['rss_file']):>10} {format_bytes(row['disk']):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Latency and candidate overlap of the hybrid fusion methods.
+
+Embeds the queries once, runs one batched FAISS search, then fuses the same
+hits with every method in FUSION_METHODS. Reports the fusion time per query
+and how many of each method's candidates the raw method also selects.
+
+Usage:
+    python -m scripts.benchmark_fusion --queries queries.txt --bm25-k 60
+"""
+import argparse
+
+import faiss
+import numpy as np
+
+from src.models.LoadEmbeddingModel import preload_retrieval_models
+from src.retrieval.DataLoader import bm25, chunks, faiss_index
+from src.retrieval.Fusion import FUSION_METHODS, dense_similarity, fuse_scores, split_rows
+from src.retrieval.Search import CANDIDATES_K, FAISS_K, build_query_contexts
+from src.utils.Profiling import latency_summary, timed
+from scripts.benchmark_query_embedding import SAMPLE_QUERIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="Text file with one query per line")
+    parser.add_argument("--bm25-k", type=int, default=FAISS_K)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = SAMPLE_QUERIES
+
+    preload_retrieval_models()
+    contexts = build_query_contexts(queries)
+    distances, indices = faiss_index.search(np.vstack([ctx.embedding_array() for ctx in contexts]), FAISS_K)
+    similarity = dense_similarity(distances, faiss_index.metric_type == faiss.METRIC_INNER_PRODUCT)
+    tokens = [ctx.tokens for ctx in contexts]
+
+    baseline = None
+    for method in FUSION_METHODS:
+        samples = []
+        for _ in range(args.repeats):
+            with timed(samples):
+                ids, scores = fuse_scores(indices, similarity, bm25, tokens, CANDIDATES_K, n_docs=len(chunks),
+                                          method=method, bm25_k=args.bm25_k)
+        rows = [set(row_ids) for row_ids, _ in split_rows(ids, scores)]
+        baseline = baseline or rows
+        overlap = np.mean([len(a & b) / max(len(b), 1) for a, b in zip(rows, baseline)])
+        per_query = latency_summary([s / len(queries) for s in samples])
+        print(f"{method:<7} {per_query['mean']:8.3f}ms/query  overlap with raw {overlap:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
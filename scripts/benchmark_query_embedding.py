@@ -0,0 +1,63 @@
+"""
+Micro-benchmark sequential vs concurrent dual-model query embedding.
+
+Runs every sample query through both encoders one after the other and then
+on the two-thread pool, checks that the fused vectors are identical and
+reports per-query latency for each path.
+
+Usage:
+    python -m scripts.benchmark_query_embedding --repeats 5
+"""
+import argparse
+import numpy as np
+
+from src.models.LoadEmbeddingModel import get_alternative_embeddings_model, get_primary_embeddings_model
+from src.retrieval.QueryEmbedding import compute_query_embedding
+from src.utils.Profiling import latency_summary, timed
+
+SAMPLE_QUERIES = [
+    "shortness of breath and chest pain for three days",
+    "persistent productive cough with fever and night sweats",
+    "bilateral lower extremity edema and orthopnea",
+    "chest x-ray findings pleural effusion cardiomegaly",
+    "sudden onset pleuritic chest pain after long flight",
+    "wheezing dyspnea history of asthma",
+    "hemoptysis weight loss smoker",
+    "fever hypoxia consolidation right lower lobe",
+]
+
+
+def run(queries, concurrent: bool, repeats: int):
+    samples, outputs = [], []
+    for _ in range(repeats):
+        for q in queries:
+            with timed(samples):
+                outputs.append(compute_query_embedding(q, concurrent=concurrent))
+    return samples, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    get_primary_embeddings_model()
+    get_alternative_embeddings_model()
+    # Warm both paths (thread pool start-up, lazy torch initialisation) before timing.
+    run(SAMPLE_QUERIES[:2], False, 1)
+    run(SAMPLE_QUERIES[:2], True, 1)
+
+    seq_ms, seq_out = run(SAMPLE_QUERIES, False, args.repeats)
+    con_ms, con_out = run(SAMPLE_QUERIES, True, args.repeats)
+
+    max_diff = max(float(np.abs(a - b).max()) for a, b in zip(seq_out, con_out))
+    identical = all(np.array_equal(a, b) for a, b in zip(seq_out, con_out))
+    seq, con = latency_summary(seq_ms), latency_summary(con_ms)
+    print(f"{'path':<12} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    print(f"{'sequential':<12} {seq['mean']:>9.1f} {seq['p50']:>9.1f} {seq['p99']:>9.1f}")
+    print(f"{'concurrent':<12} {con['mean']:>9.1f} {con['p50']:>9.1f} {con['p99']:>9.1f}")
+    print(f"speedup: {seq['mean'] / con['mean']:.2f}x | identical fused vectors: {identical} (max |Δ| = {max_diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Accuracy and latency of the query normalization modes.
+
+Normalizes the sample queries plus "query + patient history" strings built the
+way TextReport.generate_final_diagnosis builds them, with every mode in
+NORMALIZATION_MODES. Each mode is compared against "full" (the previous
+behaviour) by exact-match rate and mean token Jaccard similarity, and timed
+one query at a time, batched through `nlp.pipe`, and memoized (second call).
+
+Usage:
+    python -m scripts.benchmark_query_normalization --histories 32 --repeats 3
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from src.retrieval.QueryNormalization import NORMALIZATION_MODES, normalization_cache, normalize_queries, normalize_query
+from src.utils.Profiling import latency_summary, timed
+from scripts.benchmark_query_embedding import SAMPLE_QUERIES
+
+
+def load_texts(history_path: str, n_histories: int):
+    texts = list(SAMPLE_QUERIES)
+    if n_histories > 0:
+        histories = pd.read_pickle(history_path)["combined_text"].dropna().astype(str)
+        for i, history in enumerate(histories.head(n_histories)):
+            query = SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]
+            texts.append(f"User Query: {query}. Patient History: {history}")
+    return texts
+
+
+def jaccard(a: str, b: str) -> float:
+    a, b = set(a.split()), set(b.split())
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default="./data/merged_df_diagnosis.pkl")
+    parser.add_argument("--histories", type=int, default=32, help="Query + history strings added to the sample queries")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = load_texts(args.history, args.histories)
+    print(f"✅ {len(texts)} texts ({len(SAMPLE_QUERIES)} queries, {len(texts) - len(SAMPLE_QUERIES)} with history)")
+
+    reference = None
+    print(f"{'mode':<6} {'exact':>7} {'jaccard':>8} {'single ms':>10} {'p99 ms':>9} {'pipe ms':>9} {'memo ms':>9}")
+    for mode in NORMALIZATION_MODES:
+        try:
+            # Loads the pipeline and warms it up before timing.
+            normalize_queries(texts[:2], mode, use_cache=False)
+        except (ImportError, OSError) as e:
+            print(f"⚠ Skipping mode '{mode}': {e}")
+            continue
+
+        single_ms, outputs = [], []
+        for _ in range(args.repeats):
+            outputs = []
+            for text in texts:
+                with timed(single_ms):
+                    outputs.append(normalize_query(text, mode, use_cache=False))
+
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            batched = normalize_queries(texts, mode, use_cache=False)
+        pipe_ms = (time.perf_counter() - start) * 1000 / (args.repeats * len(texts))
+
+        normalization_cache.clear()
+        normalize_queries(texts, mode)
+        start = time.perf_counter()
+        memoized = normalize_queries(texts, mode)
+        memo_ms = (time.perf_counter() - start) * 1000 / len(texts)
+
+        if batched != outputs or memoized != outputs:
+            print(f"⚠ Mode '{mode}': batched or memoized output differs from single-query output")
+        if reference is None:
+            reference = outputs
+            if mode != "full":
+                print(f"⚠ 'full' did not load; accuracy is relative to '{mode}'.")
+        exact = sum(a == b for a, b in zip(outputs, reference)) / len(texts)
+        mean_jaccard = sum(jaccard(a, b) for a, b in zip(outputs, reference)) / len(texts)
+        single = latency_summary(single_ms)
+        print(f"{mode:<6} {exact:>7.1%} {mean_jaccard:>8.3f} {single['mean']:>10.2f} {single['p99']:>9.2f} "
+              f"{pipe_ms:>9.2f} {memo_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Rerank latency with and without the precomputed ColBERT store.
+
+For each query the fused FAISS/BM25 candidates are reranked twice: by
+RAGatouille, which encodes every candidate on the fly, and by the store,
+which only encodes the query. Reports mean/p50/p99 latency and how often
+both return the same ranking.
+
+Usage:
+    python -m scripts.benchmark_rerank --queries queries.txt
+"""
+import argparse
+
+import numpy as np
+
+from src.models.LoadEmbeddingModel import get_colbert_reranker, preload_retrieval_models
+from src.retrieval.ColBERTStore import encode_query
+from src.retrieval.DataLoader import chunks, colbert_store, faiss_index
+from src.retrieval.Search import FAISS_K, RERANK_K, build_query_contexts, fuse_candidates
+from src.utils.Profiling import latency_summary, timed
+from scripts.benchmark_query_embedding import SAMPLE_QUERIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="Text file with one query per line")
+    args = parser.parse_args()
+
+    if colbert_store is None:
+        raise SystemExit("❌ No ColBERT store loaded. Build it with `python -m scripts.build_colbert_store`.")
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = SAMPLE_QUERIES
+
+    preload_retrieval_models()
+    reranker = get_colbert_reranker()
+    contexts = build_query_contexts(queries)
+    distances, indices = faiss_index.search(np.vstack([ctx.embedding_array() for ctx in contexts]), FAISS_K)
+
+    on_the_fly, precomputed, same_order, top1 = [], [], 0, 0
+    for ctx, (candidate_ids, _) in zip(contexts, fuse_candidates(contexts, indices, distances)):
+        texts = [chunks[idx].page_content for idx in candidate_ids]
+        k = min(RERANK_K, len(candidate_ids))
+        with timed(on_the_fly):
+            expected = [candidate_ids[res["result_index"]] for res in reranker.rerank(ctx.text, texts, k=k)]
+        with timed(precomputed):
+            got = [idx for idx, _ in colbert_store.rerank(encode_query(reranker, ctx.text), candidate_ids, k)]
+        same_order += expected == got
+        top1 += expected[:1] == got[:1]
+
+    for name, samples in (("ragatouille", on_the_fly), ("colbert store", precomputed)):
+        summary = latency_summary(samples)
+        print(f"{name:<14} mean {summary['mean']:8.1f}ms  p50 {summary['p50']:8.1f}ms  p99 {summary['p99']:8.1f}ms")
+    print(f"identical rankings: {same_order}/{len(queries)}, identical top-1: {top1}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Throughput of per-query `search` vs batched `search_many`.
+
+Reads queries from a text file (one per line) or uses the built-in samples,
+runs them through both paths and reports queries/second and whether the
+returned chunks agree.
+
+Usage:
+    python -m scripts.benchmark_search_many --queries queries.txt --batch-size 32
+"""
+import argparse
+import time
+
+from src.models.LoadEmbeddingModel import preload_retrieval_models
+from src.retrieval.Search import search, search_many
+from scripts.benchmark_query_embedding import SAMPLE_QUERIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="Text file with one query per line")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = SAMPLE_QUERIES * 4
+
+    preload_retrieval_models()
+    search(queries[0])
+
+    start = time.perf_counter()
+    single = [search(q) for q in queries]
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(queries), args.batch_size):
+        batched.extend(search_many(queries[i:i + args.batch_size]))
+    batched_s = time.perf_counter() - start
+
+    agree = sum(a[1] == b[1] for a, b in zip(single, batched))
+    print(f"search      : {len(queries) / single_s:8.2f} queries/s")
+    print(f"search_many : {len(queries) / batched_s:8.2f} queries/s ({single_s / batched_s:.2f}x)")
+    print(f"identical chunk lists: {agree}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
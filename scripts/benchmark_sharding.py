@@ -0,0 +1,100 @@
+"""
+Throughput and exactness of sharded retrieval versus one process.
+
+Cuts the retrieval artifacts and exact FAISS index into 1, 2, 4, ... shards,
+serves each shard from its own process and runs the candidate stage of search
+(FAISS search plus hybrid fusion) through the coordinator. Queries are
+perturbed chunk vectors with words drawn from the chunks, so no model is
+loaded. Every shard count must return exactly the ids and scores of the
+single-process run; throughput is reported against it.
+
+Usage:
+    python -m scripts.benchmark_sharding --shards 1 2 4 8 --threads-per-shard 1
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from src.retrieval.ArtifactStore import open_artifacts
+from src.retrieval.Fusion import FUSION_METHODS, dense_similarity, fuse_scores
+from src.retrieval.Search import CANDIDATES_K, FAISS_K
+from src.retrieval.Sharding import ShardPool, build_shards
+from src.retrieval.VectorIndex import reconstruct_vectors
+
+
+def make_queries(vectors, chunks, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), n_queries)
+    noise = rng.standard_normal((n_queries, vectors.shape[1])).astype("float32")
+    queries = vectors[picks] + 0.1 * np.linalg.norm(vectors[picks], axis=1, keepdims=True) * noise / np.sqrt(vectors.shape[1])
+    tokens = []
+    for i in picks.tolist():
+        words = chunks.text(i).split()
+        tokens.append([words[j] for j in rng.choice(len(words), min(5, len(words)), replace=False)] if words else [])
+    return np.ascontiguousarray(queries, dtype="float32"), tokens
+
+
+def run(index, bm25, n_docs, queries, tokens, batch, method, bm25_k):
+    ids, scores = [], []
+    start = time.perf_counter()
+    for b in range(0, len(queries), batch):
+        distances, indices = index.search(queries[b:b + batch], FAISS_K)
+        batch_ids, batch_scores = fuse_scores(
+            indices, dense_similarity(distances, index.metric_type == faiss.METRIC_INNER_PRODUCT), bm25,
+            tokens[b:b + batch], CANDIDATES_K, n_docs=n_docs, method=method, bm25_k=bm25_k,
+        )
+        ids.append(batch_ids)
+        scores.append(batch_scores)
+    return time.perf_counter() - start, np.vstack(ids), np.vstack(scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artifacts", default="./data/retrieval_artifacts")
+    parser.add_argument("--index", default="./data/faiss_index_D.idx")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads-per-shard", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--method", default="raw", choices=FUSION_METHODS)
+    parser.add_argument("--bm25-k", type=int, default=FAISS_K)
+    parser.add_argument("--workdir", help="Where shards are written (default: a temporary directory)")
+    args = parser.parse_args()
+
+    artifacts = open_artifacts(args.artifacts)
+    exact = faiss.read_index(args.index)
+    vectors = reconstruct_vectors(exact)
+    queries, tokens = make_queries(vectors, artifacts.chunks, args.queries)
+    n_docs = len(artifacts.chunks)
+    print(f"✅ {n_docs} chunks, {args.queries} queries in batches of {args.batch}, fusion '{args.method}'")
+
+    faiss.omp_set_num_threads(args.threads_per_shard)
+    base_time, base_ids, base_scores = run(exact, artifacts.bm25, n_docs, queries, tokens,
+                                           args.batch, args.method, args.bm25_k)
+    print(f"{'single process':<16} {args.queries / base_time:9.1f} q/s")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="shard-benchmark-")
+    for n_shards in args.shards:
+        path = os.path.join(workdir, f"shards-{n_shards}")
+        build_shards(artifacts.chunks, artifacts.bm25, vectors, path, n_shards, metric=exact.metric_type,
+                     signatures=artifacts.minhash, source_build_id=artifacts.version)
+        pool = ShardPool(path, index_mode="flat", omp_threads=args.threads_per_shard).start()
+        try:
+            corpus = pool.connect()
+            run(corpus.faiss_index, corpus.bm25, n_docs, queries[:args.batch], tokens[:args.batch],
+                args.batch, args.method, args.bm25_k)  # warm up connections and page cache
+            elapsed, ids, scores = run(corpus.faiss_index, corpus.bm25, n_docs, queries, tokens,
+                                       args.batch, args.method, args.bm25_k)
+        finally:
+            pool.close()
+        exact_match = np.array_equal(ids, base_ids) and np.array_equal(scores, base_scores)
+        print(f"{f'{n_shards} shard(s)':<16} {args.queries / elapsed:9.1f} q/s  "
+              f"speedup {base_time / elapsed:5.2f}x  identical to single process: {exact_match}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Offline build step for the precomputed ColBERT document embeddings.
+
+Encodes every chunk once with the reranker's document encoder and writes the
+float16 token embeddings to a memory-mapped store, so reranking at query time
+only has to encode the query.
+
+Usage:
+    python -m scripts.build_colbert_store --out ./data/colbert_store
+"""
+import argparse
+import pickle
+import time
+
+from src.models.LoadEmbeddingModel import get_colbert_reranker
+from src.retrieval.ArtifactStore import has_artifacts, open_artifacts
+from src.retrieval.ColBERTStore import ColBERTStore, build_colbert_store
+from src.utils.Profiling import format_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artifacts", default="./data/retrieval_artifacts")
+    parser.add_argument("--chunks", default="./data/chunks.pkl", help="Used when no retrieval artifacts exist")
+    parser.add_argument("--out", default="./data/colbert_store")
+    parser.add_argument("--batch-docs", type=int, default=1024)
+    parser.add_argument("--bsize", type=int, default=32)
+    args = parser.parse_args()
+
+    if has_artifacts(args.artifacts):
+        artifacts = open_artifacts(args.artifacts)
+        texts, build_id = artifacts.chunks.texts, artifacts.version
+    else:
+        with open(args.chunks, "rb") as f:
+            texts, build_id = [chunk.page_content for chunk in pickle.load(f)], None
+    print(f"✅ Encoding {len(texts)} chunks")
+
+    start = time.perf_counter()
+    meta = build_colbert_store(texts, args.out, get_colbert_reranker(),
+                               batch_docs=args.batch_docs, bsize=args.bsize, build_id=build_id)
+    store = ColBERTStore.open(args.out)
+    print(f"✅ Wrote {meta['n_tokens']} token embeddings (doc_maxlen {meta['doc_maxlen']}, "
+          f"{format_bytes(store.embeddings.nbytes)}) to '{args.out}' in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
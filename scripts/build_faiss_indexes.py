@@ -0,0 +1,38 @@
+"""
+Build the approximate / compressed FAISS index modes from the exact index.
+
+Every mode is built from the vectors stored in the exact index, so results
+are directly comparable. Files are written next to it as
+faiss_index_D.<mode>.idx.
+
+Usage:
+    python -m scripts.build_faiss_indexes --modes ivf hnsw ivfpq sq8
+"""
+import argparse
+import time
+import faiss
+
+from src.retrieval.VectorIndex import INDEX_MODES, build_index, index_path_for, reconstruct_vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="./data/faiss_index_D.idx")
+    parser.add_argument("--modes", nargs="+", default=["ivf", "hnsw", "ivfpq", "sq8"],
+                        choices=[m for m in INDEX_MODES if m not in ("flat", "flat_mmap")])
+    args = parser.parse_args()
+
+    exact = faiss.read_index(args.index)
+    vectors = reconstruct_vectors(exact)
+    print(f"✅ Read {vectors.shape[0]} vectors of dimension {vectors.shape[1]} from '{args.index}'")
+
+    for mode in args.modes:
+        start = time.perf_counter()
+        index = build_index(vectors, mode, metric=exact.metric_type)
+        path = index_path_for(args.index, mode)
+        faiss.write_index(index, path)
+        print(f"✅ Built {mode} index '{path}' in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
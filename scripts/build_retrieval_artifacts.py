@@ -0,0 +1,39 @@
+"""
+Offline build step for the memory-mapped retrieval artifacts.
+
+Reads the pickled chunks, writes texts, metadata offsets and BM25 statistics
+to an artifact directory, then times how long a fresh open takes.
+
+Usage:
+    python -m scripts.build_retrieval_artifacts --chunks ./data/chunks.pkl --out ./data/retrieval_artifacts
+"""
+import argparse
+import pickle
+import time
+
+from src.retrieval.ArtifactStore import build_artifacts, open_artifacts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", default="./data/chunks.pkl")
+    parser.add_argument("--out", default="./data/retrieval_artifacts")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.chunks, "rb") as f:
+        chunks = pickle.load(f)
+    print(f"✅ Unpickled {len(chunks)} chunks in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    manifest = build_artifacts(chunks, args.out)
+    print(f"✅ Wrote artifacts (build {manifest['build_id']}, {manifest['bm25']['n_terms']} terms) "
+          f"to '{args.out}' in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    artifacts = open_artifacts(args.out)
+    print(f"✅ Re-opened {len(artifacts.chunks)} chunks in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
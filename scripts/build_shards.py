@@ -0,0 +1,48 @@
+"""
+Offline build step for sharded retrieval.
+
+Cuts the retrieval artifacts and the exact FAISS index into contiguous shards,
+each with its own chunk texts, BM25 postings (keeping the corpus-wide idf and
+length norms) and FAISS index. Serve them by setting RETRIEVAL_SHARDS_DIR.
+
+Usage:
+    python -m scripts.build_shards --shards 4 --out ./data/shards
+    python -m scripts.build_shards --shards 4 --modes hnsw   # also build an approximate index per shard
+"""
+import argparse
+import time
+
+import faiss
+
+from src.retrieval.ArtifactStore import has_artifacts, open_artifacts
+from src.retrieval.Sharding import build_shards
+from src.retrieval.VectorIndex import INDEX_MODES, reconstruct_vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artifacts", default="./data/retrieval_artifacts")
+    parser.add_argument("--index", default="./data/faiss_index_D.idx")
+    parser.add_argument("--out", default="./data/shards")
+    parser.add_argument("--shards", type=int, required=True)
+    parser.add_argument("--modes", nargs="*", default=[],
+                        choices=[m for m in INDEX_MODES if m not in ("flat", "flat_mmap")])
+    args = parser.parse_args()
+
+    if not has_artifacts(args.artifacts):
+        parser.error(f"no retrieval artifacts in '{args.artifacts}'; run `python -m scripts.build_retrieval_artifacts` first")
+    artifacts = open_artifacts(args.artifacts)
+    exact = faiss.read_index(args.index)
+    if exact.ntotal != len(artifacts.chunks):
+        parser.error(f"'{args.index}' holds {exact.ntotal} vectors but the artifacts hold {len(artifacts.chunks)} chunks")
+
+    start = time.perf_counter()
+    manifest = build_shards(artifacts.chunks, artifacts.bm25, reconstruct_vectors(exact), args.out, args.shards,
+                            metric=exact.metric_type, signatures=artifacts.minhash, index_modes=args.modes,
+                            source_build_id=artifacts.version)
+    print(f"✅ Wrote {manifest['n_shards']} shards of {manifest['n_docs']} chunks (build {manifest['build_id']}) "
+          f"to '{args.out}' in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+End-to-end check of the diagnosis service on the stub LLM backend.
+
+Starts a DiagnosisService with LLM_BACKEND=stub on a free local port and checks:
+- /readyz answers 503 before warmup and 200 after it
+- with SERVICE_WORKERS + SERVICE_MAX_QUEUE requests in flight, one more
+  POST /diagnose is rejected with 429
+- every admitted request answers 200 with the fields of a batch case result
+
+The retrieval models and indexes are loaded as in production and must be
+available locally; only the LLM is replaced. Exits with status 1 on failure.
+
+Usage:
+    python -m scripts.check_service
+    python -m scripts.check_service --workers 2 --max-queue 2 --stub-delay 1.0
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+
+# The stub must be chosen before src.models.LoadLLM is imported
+os.environ["LLM_BACKEND"] = "stub"
+
+# Fields every successful /diagnose response carries (src.reports.Batch.run_case plus the request id)
+RESULT_FIELDS = ("case_id", "query", "subject_id", "image", "report_seconds", "graph_seconds", "graph_diagnosis",
+                 "quality_score", "error", "latency_seconds", "timestamp", "request_id")
+
+
+def request(port: int, method: str, path: str, body=None, timeout: float = 600):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-queue", type=int, default=1)
+    parser.add_argument("--stub-delay", type=float, default=0.5,
+                        help="Seconds per stub LLM call, so admitted requests are still in flight for the 429 check")
+    parser.add_argument("--query", default="Persistent cough and fever")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for warmup and for the queue to fill")
+    args = parser.parse_args()
+    os.environ["LLM_STUB_DELAY"] = str(args.stub_delay)
+
+    from src.service.Server import DiagnosisService, make_server
+
+    failures = []
+
+    def check(ok: bool, message: str) -> None:
+        print(f"{'✅' if ok else '❌'} {message}")
+        if not ok:
+            failures.append(message)
+
+    service = DiagnosisService(args.workers, args.max_queue)
+    server = make_server(service, "127.0.0.1", 0, None)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, name="check-service", daemon=True).start()
+    try:
+        status, body = request(port, "GET", "/readyz")
+        check(status == 503, f"/readyz before warmup: {status} {body.get('status')}")
+        status, _ = request(port, "POST", "/diagnose", {"query": args.query})
+        check(status == 503, f"/diagnose before warmup: {status}")
+
+        start = time.perf_counter()
+        service.start_warmup().join(args.timeout)
+        status, body = request(port, "GET", "/readyz")
+        check(status == 200, f"/readyz after warmup: {status} {body.get('status')} "
+                             f"({time.perf_counter() - start:.1f}s)")
+        if status != 200:
+            sys.exit(1)
+
+        # Fill every worker and queue slot, then one more request must be turned away
+        capacity = service.workers + service.max_queue
+        results = [None] * capacity
+
+        def post(i: int) -> None:
+            results[i] = request(port, "POST", "/diagnose", {"query": args.query, "case_id": f"check-{i}"})
+
+        threads = [threading.Thread(target=post, args=(i,)) for i in range(capacity)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + args.timeout
+        while service.stats()["pending"] < capacity and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pending = service.stats()["pending"]
+        status, body = request(port, "POST", "/diagnose", {"query": args.query})
+        check(pending == capacity and status == 429,
+              f"/diagnose with {pending}/{capacity} slots taken: {status} {body.get('error', '')}")
+        for thread in threads:
+            thread.join()
+
+        for i, (status, body) in enumerate(results):
+            missing = [field for field in RESULT_FIELDS if field not in body]
+            check(status == 200 and not missing and body["error"] is None and body["case_id"] == f"check-{i}",
+                  f"/diagnose check-{i}: {status}" + (f", missing {', '.join(missing)}" if missing else "")
+                  + (f", error {body.get('error')}" if body.get("error") else ""))
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+
+    if failures:
+        print(f"\n❌ {len(failures)} service check(s) failed")
+        sys.exit(1)
+    print("\n✅ Service checks passed")
+
+
+if __name__ == "__main__":
+    main()
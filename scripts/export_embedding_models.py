@@ -0,0 +1,48 @@
+"""
+Export the query encoders to ONNX for EMBEDDING_BACKEND=onnx / onnx_int8.
+
+Writes the fp32 graph and a dynamically int8-quantized copy (tuned for
+EMBEDDING_ONNX_QUANTIZATION) of each encoder under EMBEDDING_ONNX_DIR.
+Needs the optional ONNX dependencies: uv pip install -e ".[onnx]".
+
+Usage:
+    python -m scripts.export_embedding_models
+    EMBEDDING_ONNX_QUANTIZATION=avx512_vnni python -m scripts.export_embedding_models
+"""
+import argparse
+import time
+
+from src.models.LoadEmbeddingModel import (
+    ALTERNATIVE_EMBEDDING_MODEL,
+    EMBEDDING_ONNX_QUANTIZATION,
+    PRIMARY_EMBEDDING_MODEL,
+    onnx_file_name,
+    onnx_model_dir,
+)
+
+
+def export(model_name: str, quantize: bool) -> None:
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    start = time.perf_counter()
+    output_dir = onnx_model_dir(model_name)
+    model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+    model.save(output_dir)
+    print(f"✅ Exported '{model_name}' to '{output_dir}/{onnx_file_name('onnx')}'")
+    if quantize:
+        export_dynamic_quantized_onnx_model(model, EMBEDDING_ONNX_QUANTIZATION, output_dir)
+        print(f"✅ Quantized '{model_name}' to '{output_dir}/{onnx_file_name('onnx_int8')}'")
+    print(f"   done in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=[PRIMARY_EMBEDDING_MODEL, ALTERNATIVE_EMBEDDING_MODEL])
+    parser.add_argument("--no-quantize", action="store_true", help="Only export the fp32 graphs")
+    args = parser.parse_args()
+    for model_name in args.models:
+        export(model_name, not args.no_quantize)
+
+
+if __name__ == "__main__":
+    main()
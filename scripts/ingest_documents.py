@@ -0,0 +1,73 @@
+"""
+Add, delete and compact chunks without rebuilding the retrieval indexes.
+
+New chunks are written as a segment under SEGMENTS_DIR and published in its
+manifest; running processes pick them up on their next refresh
+(SEGMENTS_REFRESH_SECONDS). Deleted ids are tombstoned until the next compaction.
+
+Usage:
+    python -m scripts.ingest_documents add new_chunks.jsonl   # {"page_content": ..., "metadata": {...}} per line
+    python -m scripts.ingest_documents add new_chunks.pkl     # pickled list of Documents
+    python -m scripts.ingest_documents delete 17 42
+    python -m scripts.ingest_documents compact
+    python -m scripts.ingest_documents verify "chest pain" "pleural effusion"   # BM25 vs a full rebuild
+"""
+import argparse
+import json
+import pickle
+import sys
+import time
+
+from langchain_core.documents import Document
+
+from src.retrieval.DataLoader import corpus
+from src.retrieval.Ingest import add_documents, compact, delete_documents
+from src.retrieval.Segments import GLOBAL_BM25_RTOL, GlobalBM25
+
+
+def load_documents(path: str):
+    if path.endswith(".pkl"):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [Document(page_content=row["page_content"], metadata=row.get("metadata", {})) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Append chunks as a new segment")
+    add.add_argument("path", help=".jsonl or .pkl file of chunks")
+    delete = commands.add_parser("delete", help="Tombstone chunks by global id")
+    delete.add_argument("ids", type=int, nargs="+")
+    commands.add_parser("compact", help="Merge all segments and drop tombstones")
+    verify = commands.add_parser("verify", help="Compare BM25 scores of the live corpus with a full rebuild")
+    verify.add_argument("queries", nargs="+", help="Query texts, tokenized on whitespace like the index")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "add":
+        documents = load_documents(args.path)
+        ids = add_documents(corpus, documents)
+        if ids:
+            print(f"✅ Assigned ids {ids[0]}-{ids[-1]} in {time.perf_counter() - start:.1f}s")
+    elif args.command == "delete":
+        print(f"✅ Tombstoned {delete_documents(corpus, args.ids)} chunk(s)")
+    elif args.command == "verify":
+        with corpus.reading() as snapshot:
+            if not isinstance(snapshot.bm25, GlobalBM25):
+                print("✅ No segments or tombstones; BM25 is the base index itself")
+                return
+            error = snapshot.bm25.rebuild_error([query.split() for query in args.queries])
+        if error > GLOBAL_BM25_RTOL:
+            print(f"❌ BM25 scores differ from a full rebuild by {error:.3g} (tolerance {GLOBAL_BM25_RTOL:g})")
+            sys.exit(1)
+        print(f"✅ BM25 scores match a full rebuild within {error:.3g} (tolerance {GLOBAL_BM25_RTOL:g})")
+    else:
+        path = compact(corpus)
+        print(f"✅ New base at '{path}'" if path else "✅ Nothing to compact")
+
+
+if __name__ == "__main__":
+    main()
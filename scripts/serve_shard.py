@@ -0,0 +1,33 @@
+"""
+Serve one retrieval shard on a local AF_UNIX socket.
+
+Started by `src.retrieval.Sharding.ShardPool` (one process per shard); the
+connection authkey is passed hex-encoded in SHARD_AUTHKEY. The server exits
+together with the process that started it.
+
+Usage:
+    SHARD_AUTHKEY=<hex> python -m scripts.serve_shard ./data/shards/shard-00 --address /tmp/shard-00.sock
+"""
+import argparse
+import os
+
+from src.retrieval.Sharding import serve_shard
+from src.retrieval.VectorIndex import INDEX_MODES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("shard", help="Shard directory written by scripts.build_shards")
+    parser.add_argument("--address", required=True, help="Path of the AF_UNIX socket to listen on")
+    parser.add_argument("--mode", choices=INDEX_MODES, help="FAISS index mode (default FAISS_INDEX_MODE)")
+    parser.add_argument("--threads", type=int, default=0, help="FAISS OpenMP threads (0 = FAISS default)")
+    args = parser.parse_args()
+
+    authkey = os.environ.get("SHARD_AUTHKEY")
+    if not authkey:
+        parser.error("SHARD_AUTHKEY is not set")
+    serve_shard(args.shard, args.address, bytes.fromhex(authkey), index_mode=args.mode, omp_threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()
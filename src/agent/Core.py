@@ -1,5 +1,6 @@
-from typing import Optional
+from typing import List, Optional
 from langgraph.graph import StateGraph, END
+import asyncio
 import re
 import os
 import datetime
@@ -8,15 +9,17 @@ import io
 import requests
 from PIL import Image as im
 
-from src.agent.Models import AgentAction, Plan, AgentState, create_scratchpad
-from src.agent.Planning import execute_planning
+from src.agent.Models import AgentAction, Plan, AgentState
+from src.agent.Scratchpad import Scratchpad
+from src.agent.Planning import aexecute_planning, execute_planning
 from src.schema.Tools import search_schema, final_answer_schema, xray_detection_schema, get_system_tools_prompt
 from src.imaging.DetectXRAY import detect_chest_xray
 from src.models.LoadLLM import llm
 from src.agent.Roles import get_role_prompt, get_role_name
-from src.agent.Reflection import execute_reflection, execute_refinement
+from src.agent.Reflection import aexecute_reflection, aexecute_refinement, execute_reflection, execute_refinement
 
 from src.retrieval.Search import search, final_answer
+from src.retrieval.ContextAssembler import assemble_context
 
 # Helper functions for role-based prompts
 def get_system_prompt_with_plan(agent_role: str, plan: Optional[Plan] = None) -> str:
@@ -34,15 +37,28 @@ def get_system_prompt_with_plan(agent_role: str, plan: Optional[Plan] = None) ->
 
 # Graph node implementations
 
-def call_llm_with_history(state: AgentState) -> AgentAction:
-    """Call LLM with appropriate context and tools based on agent role"""
+def current_scratchpad(state: AgentState, intermediate_steps: Optional[List[AgentAction]] = None) -> Scratchpad:
+    """The state's scratchpad, extended with the steps it has not taken in yet"""
+    steps = state["intermediate_steps"] if intermediate_steps is None else intermediate_steps
+    return (state.get("scratchpad") or Scratchpad()).extend(steps)
+
+
+def _with_steps(state: AgentState, *actions: AgentAction) -> dict:
+    # State update appending steps; the scratchpad only processes the new ones
+    intermediate_steps = state["intermediate_steps"] + list(actions)
+    return {"intermediate_steps": intermediate_steps, "scratchpad": current_scratchpad(state, intermediate_steps)}
+
+
+def build_oracle_messages(state: AgentState) -> List[dict]:
+    """Messages of an oracle turn: role prompt with tools, chat history, user input and scratchpad"""
     user_input = state["input"]
     chat_history = state["chat_history"]
-    intermediate_steps = state["intermediate_steps"]
     agent_role = state.get("agent_role", "executor")
     plan = state.get("plan")
     
-    scratchpad = create_scratchpad(intermediate_steps)
+    # Kept in state by the nodes that add steps; only steps added elsewhere are processed here
+    pad = current_scratchpad(state)
+    scratchpad = pad.to_messages()
     
     # Create a role-appropriate continuation message
     if scratchpad:
@@ -72,15 +88,29 @@ def call_llm_with_history(state: AgentState) -> AgentAction:
         *scratchpad,
     ]
     
-    print(f"\n📝 LLM Invocation - Role: {get_role_name(agent_role)}")
+    print(f"\n📝 LLM Invocation - Role: {get_role_name(agent_role)} "
+          f"(scratchpad: {len(pad.entries)} step(s), {pad.tokens} tokens, {pad.compactions} compacted)")
     
-    res = llm._call([{k: v for k, v in m.items() if k != "role_tag"} for m in messages])
+    return [{k: v for k, v in m.items() if k != "role_tag"} for m in messages]
+
+
+def parse_oracle_response(res: str) -> AgentAction:
     content = re.sub(r'^```json\s*|\s*```$', '', res.strip(), flags=re.DOTALL)
     # print("LLM response:", content)
     
     return AgentAction.from_ollama(content)
 
 
+def call_llm_with_history(state: AgentState) -> AgentAction:
+    """Call LLM with appropriate context and tools based on agent role"""
+    return parse_oracle_response(llm._call(build_oracle_messages(state)))
+
+
+async def acall_llm_with_history(state: AgentState) -> AgentAction:
+    """Awaitable `call_llm_with_history`"""
+    return parse_oracle_response(await llm._acall(build_oracle_messages(state)))
+
+
 def handle_tool_error(state: AgentState) -> dict:
     error_message = "Error encountered during tool execution. Please check the input and try again."
     fallback_action = AgentAction(
@@ -88,7 +118,7 @@ def handle_tool_error(state: AgentState) -> dict:
         tool_input={"answer": error_message},
         tool_output=error_message
     )
-    return {"intermediate_steps": state["intermediate_steps"] + [fallback_action]}
+    return _with_steps(state, fallback_action)
 
 
 # LangGraph node functions
@@ -98,22 +128,34 @@ def run_planner(state: AgentState) -> dict:
     return execute_planning(state)
 
 
+def _oracle_update(state: AgentState, action: AgentAction) -> dict:
+    # If we have a plan and just completed a step, advance the plan
+    plan = state.get("plan")
+    if plan and action.tool_name == "final_answer" and not plan.is_complete():
+        plan.advance()
+        return {
+            **_with_steps(state, action),
+            "plan": plan
+        }
+    
+    return _with_steps(state, action)
+
+
 def run_oracle(state: AgentState) -> dict:
     """Oracle node that performs the core agent action"""
     print(f"run_oracle with role: {state.get('agent_role', 'executor')}")
     try:
-        action = call_llm_with_history(state)
-        
-        # If we have a plan and just completed a step, advance the plan
-        plan = state.get("plan")
-        if plan and action.tool_name == "final_answer" and not plan.is_complete():
-            plan.advance()
-            return {
-                "intermediate_steps": state["intermediate_steps"] + [action],
-                "plan": plan
-            }
-        
-        return {"intermediate_steps": state["intermediate_steps"] + [action]}
+        return _oracle_update(state, call_llm_with_history(state))
+    except Exception as e:
+        print(f"Error in oracle: {str(e)}")
+        return handle_tool_error(state)
+
+
+async def arun_oracle(state: AgentState) -> dict:
+    """Awaitable `run_oracle`"""
+    print(f"run_oracle with role: {state.get('agent_role', 'executor')}")
+    try:
+        return _oracle_update(state, await acall_llm_with_history(state))
     except Exception as e:
         print(f"Error in oracle: {str(e)}")
         return handle_tool_error(state)
@@ -129,6 +171,20 @@ def run_refiner(state: AgentState) -> dict:
     return execute_refinement(state)
 
 
+# Async variants of the LLM nodes, used by `build_graph(use_async=True)` and `ainvoke`
+
+async def arun_planner(state: AgentState) -> dict:
+    return await aexecute_planning(state)
+
+
+async def arun_critic(state: AgentState) -> dict:
+    return await aexecute_reflection(state)
+
+
+async def arun_refiner(state: AgentState) -> dict:
+    return await aexecute_refinement(state)
+
+
 def process_input(state: AgentState) -> dict:
     """Process the input and set up initial state"""
     # Initialize any missing state components
@@ -155,6 +211,12 @@ def process_input(state: AgentState) -> dict:
     if "plan" not in state:
         update["plan"] = None
         
+    if "query_context" not in state:
+        update["query_context"] = None
+        
+    if "scratchpad" not in state:
+        update["scratchpad"] = None
+        
     return update
 
 
@@ -195,8 +257,14 @@ def router(state: AgentState) -> str:
     return "oracle"
 
 
+def search_tool(query) -> str:
+    """Agent search tool: the retrieved chunks packed into the agent's context budget."""
+    _, rag_chunks = search(query)
+    return str(assemble_context(getattr(query, "text", query), rag_chunks, "agent"))
+
+
 tool_str_to_func = {
-    "search": search,
+    "search": search_tool,
     "final_answer": final_answer,
     "detect_chest_xray": detect_chest_xray
 }
@@ -209,7 +277,13 @@ def run_tool(state: AgentState) -> dict:
         tool_args = state["intermediate_steps"][-1].tool_input
         print(f"run_tool | {tool_name}.invoke(input={tool_args})")
         
-        out = tool_str_to_func[tool_name](**tool_args)
+        call_args = tool_args
+        query_context = state.get("query_context")
+        if tool_name == "search" and query_context is not None and tool_args.get("query") == query_context.text:
+            # The agent is searching for the user's own query: reuse its cleaned text and embedding
+            call_args = {**tool_args, "query": query_context}
+        
+        out = tool_str_to_func[tool_name](**call_args)
         
         action_out = AgentAction(
             tool_name=tool_name,
@@ -220,26 +294,37 @@ def run_tool(state: AgentState) -> dict:
         if tool_name == "final_answer":
             return {"output": out}
         else:
-            return {"intermediate_steps": state["intermediate_steps"] + [action_out]}
+            return _with_steps(state, action_out)
     except Exception as e:
         print(f"Tool execution error: {str(e)}")
         return handle_tool_error(state)
 
 
+async def arun_tool(state: AgentState) -> dict:
+    """`run_tool` on a worker thread; the tools (search, X-ray detection) are CPU-bound"""
+    return await asyncio.to_thread(run_tool, state)
+
+
 # Build the agent graph
-def build_graph() -> StateGraph:
-    """Build the enhanced agent graph with all components"""
+def build_graph(use_async: bool = False) -> StateGraph:
+    """
+    Build the enhanced agent graph with all components
+    
+    Args:
+        use_async (bool): Use the awaitable nodes, so the compiled graph is run
+            with `ainvoke` and LLM calls share the pooled async client
+    """
     graph = StateGraph(AgentState)
     
     # Add all nodes
     graph.add_node("process_input", process_input)
-    graph.add_node("planner", run_planner)
-    graph.add_node("oracle", run_oracle)
-    graph.add_node("critic", run_critic)
-    graph.add_node("refiner", run_refiner)
-    graph.add_node("search", run_tool)
-    graph.add_node("final_answer", run_tool)
-    graph.add_node("detect_chest_xray", run_tool)
+    graph.add_node("planner", arun_planner if use_async else run_planner)
+    graph.add_node("oracle", arun_oracle if use_async else run_oracle)
+    graph.add_node("critic", arun_critic if use_async else run_critic)
+    graph.add_node("refiner", arun_refiner if use_async else run_refiner)
+    graph.add_node("search", arun_tool if use_async else run_tool)
+    graph.add_node("final_answer", arun_tool if use_async else run_tool)
+    graph.add_node("detect_chest_xray", arun_tool if use_async else run_tool)
     
     # Set entry point
     graph.set_entry_point("process_input")
@@ -1,6 +1,9 @@
 from typing import List, TypedDict, Union, Dict, Any, Optional
 from pydantic import BaseModel
 
+from src.agent.Scratchpad import Scratchpad
+from src.retrieval.QueryContext import QueryContext
+
 class AgentAction(BaseModel):
     tool_name: str
     tool_input: dict
@@ -92,4 +95,6 @@ class AgentState(TypedDict):
     plan: Optional[Plan]  # The current execution plan
     reflection: Optional[Dict[str, Any]]  # Reflections on actions and outputs
     agent_role: str  # Current active agent role
-    agent_outcome: Optional[Dict[str, Any]]  # Outcome evaluation
\ No newline at end of file
+    agent_outcome: Optional[Dict[str, Any]]  # Outcome evaluation
+    query_context: Optional[QueryContext]  # Prepared user query, reused by the search tool
+    scratchpad: Optional[Scratchpad]  # Oracle scratchpad, extended with each step and compacted
\ No newline at end of file
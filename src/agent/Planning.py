@@ -1,11 +1,11 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import json
 from ollama import chat
 from pydantic import BaseModel
 import re
 
 from src.agent.Models import Plan, AgentState
-from src.models.LoadLLM import llm
+from src.models.LoadLLM import is_json_object, llm
 from src.agent.Roles import get_role_prompt
 
 class PlanningOutput(BaseModel):
@@ -36,10 +36,8 @@ The output format MUST be. DONT include any other text or explanations.
 Format your response as valid JSON with these exact keys.
 """
 
-def execute_planning(state: AgentState) -> Dict:
-    """Create an execution plan for the agent"""
-    print("\n🧠 Creating diagnosis plan...")
-    
+def create_planning_messages(state: AgentState) -> Tuple[str, List[Dict[str, str]]]:
+    """Planning prompt for the state's input and the planner messages that carry it"""
     planning_prompt = create_planning_prompt(state["input"])
     
     # Set up planning agent with proper system prompt
@@ -48,44 +46,65 @@ def execute_planning(state: AgentState) -> Dict:
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": planning_prompt}
     ]
+    return planning_prompt, messages
+
+def parse_planning_response(state: AgentState, planning_prompt: str, response: str) -> Dict:
+    """Turn the planner's response into the state update, or the fallback plan"""
+    content = re.sub(r'^```json\s*|\s*```$', '', response.strip(), flags=re.DOTALL)
+    print("Diagnosis plan response:", content)
     
+    # Parse the plan from the response
     try:
-        response = llm._call(messages)
-        content = re.sub(r'^```json\s*|\s*```$', '', response.strip(), flags=re.DOTALL)
-        print("Diagnosis plan response:", content)
+        plan_data = json.loads(content)
+        
+        # Create a Plan object
+        plan = Plan(
+            steps=plan_data.get("steps", []),
+            reasoning=plan_data.get("reasoning", "No reasoning provided"),
+            current_step_index=0
+        )
+        
+        # Print the plan for visibility
+        print("\n📋 Diagnosis Plan:")
+        for i, step in enumerate(plan.steps):
+            print(f"{i+1}. {step}")
+        print(f"\nReasoning: {plan.reasoning}")
         
-        # Parse the plan from the response
-        try:
-            plan_data = json.loads(content)
-            
-            # Create a Plan object
-            plan = Plan(
-                steps=plan_data.get("steps", []),
-                reasoning=plan_data.get("reasoning", "No reasoning provided"),
-                current_step_index=0
-            )
-            
-            # Print the plan for visibility
-            print("\n📋 Diagnosis Plan:")
-            for i, step in enumerate(plan.steps):
-                print(f"{i+1}. {step}")
-            print(f"\nReasoning: {plan.reasoning}")
-            
-            # Update the state with the new plan
-            return {
-                "plan": plan,
-                "agent_role": "executor",  # Switch to executor role after planning
-                "chat_history": state["chat_history"] + [
-                    {"role": "user", "content": planning_prompt},
-                    {"role": "assistant", "content": content}
-                ]
-            }
-            
-        except json.JSONDecodeError as e:
-            print(f"Error parsing planning response: {e}")
-            # Create a fallback plan
-            return create_fallback_plan(state)
-            
+        # Update the state with the new plan
+        return {
+            "plan": plan,
+            "agent_role": "executor",  # Switch to executor role after planning
+            "chat_history": state["chat_history"] + [
+                {"role": "user", "content": planning_prompt},
+                {"role": "assistant", "content": content}
+            ]
+        }
+        
+    except json.JSONDecodeError as e:
+        print(f"Error parsing planning response: {e}")
+        # Create a fallback plan
+        return create_fallback_plan(state)
+
+def execute_planning(state: AgentState, use_cache: bool = True) -> Dict:
+    """Create an execution plan for the agent (plans for an identical input are served from the LLM cache)"""
+    print("\n🧠 Creating diagnosis plan...")
+    
+    planning_prompt, messages = create_planning_messages(state)
+    
+    try:
+        return parse_planning_response(state, planning_prompt, llm._call(messages, cache=use_cache, validate=is_json_object))
+    except Exception as e:
+        print(f"Error during planning: {e}")
+        return create_fallback_plan(state)
+
+async def aexecute_planning(state: AgentState, use_cache: bool = True) -> Dict:
+    """Awaitable `execute_planning`"""
+    print("\n🧠 Creating diagnosis plan...")
+    
+    planning_prompt, messages = create_planning_messages(state)
+    
+    try:
+        return parse_planning_response(state, planning_prompt, await llm._acall(messages, cache=use_cache, validate=is_json_object))
     except Exception as e:
         print(f"Error during planning: {e}")
         return create_fallback_plan(state)
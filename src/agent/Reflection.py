@@ -1,11 +1,11 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
 from ollama import chat
 from pydantic import BaseModel
 import re
 
 from src.agent.Core import AgentState
-from src.models.LoadLLM import llm
+from src.models.LoadLLM import is_json_object, llm
 from src.agent.Roles import get_role_prompt
 
 class EvaluationMetrics(BaseModel):
@@ -56,10 +56,8 @@ Format your response as valid JSON with these exact keys. DONT include any other
 """
 
 
-def execute_reflection(state: AgentState) -> Dict:
-    """Generate a reflection on the current diagnosis output"""
-    print("\n🔍 Evaluating diagnosis quality...")
-    
+def create_critique_messages(state: AgentState) -> Tuple[str, List[Dict[str, str]]]:
+    """Critique prompt for the current diagnosis and the critic messages that carry it"""
     # Extract the diagnosis from state
     diagnosis = state.get("output", {}).get("answer", "No diagnosis available")
     
@@ -71,58 +69,82 @@ def execute_reflection(state: AgentState) -> Dict:
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": critique_prompt}
     ]
+    return critique_prompt, messages
+
+
+def parse_critique_response(state: AgentState, critique_prompt: str, response: str) -> Dict:
+    """Turn the critic's response into the reflection state update, or the fallback reflection"""
+    content = re.sub(r'^```json\s*|\s*```$', '', response.strip(), flags=re.DOTALL)
+    # print("Critique response:", content)
+    # Parse the evaluation metrics
+    try:
+        
+        metrics_data = json.loads(content)
+        
+        # Create evaluation metrics object
+        metrics = EvaluationMetrics(
+            factual_correctness=metrics_data.get("factual_correctness", 0.0),
+            completeness=metrics_data.get("completeness", 0.0),
+            evidence_basis=metrics_data.get("evidence_basis", 0.0),
+            logical_coherence=metrics_data.get("logical_coherence", 0.0),
+            alternative_considerations=metrics_data.get("alternative_considerations", 0.0),
+            overall_score=metrics_data.get("overall_score", 0.0),
+            improvements=metrics_data.get("improvements", ["No specific improvements provided"])
+        )
+        
+        # Print evaluation for visibility
+        print("\n📊 Evaluation Results:")
+        print(f"✓ Factual Correctness: {metrics.factual_correctness:.2f}")
+        print(f"✓ Completeness: {metrics.completeness:.2f}")
+        print(f"✓ Evidence Basis: {metrics.evidence_basis:.2f}")
+        print(f"✓ Logical Coherence: {metrics.logical_coherence:.2f}")
+        print(f"✓ Alternative Considerations: {metrics.alternative_considerations:.2f}")
+        print(f"✓ Overall Score: {metrics.overall_score:.2f}")
+        print("\n🔧 Suggested Improvements:")
+        for i, improvement in enumerate(metrics.improvements):
+            print(f"{i+1}. {improvement}")
+        
+        # Update the state with reflection
+        return {
+            "reflection": {
+                "metrics": metrics.dict(),
+                "critique": content,
+                "needs_refinement": not metrics.passed_threshold(0.7)
+            },
+            "agent_role": "refiner" if not metrics.passed_threshold(0.7) else "executor",
+            "chat_history": state["chat_history"] + [
+                {"role": "user", "content": critique_prompt},
+                {"role": "assistant", "content": content}
+            ]
+        }
+        
+    except json.JSONDecodeError as e:
+        print(f"Error parsing critique response: {e}")
+        # Create a fallback evaluation
+        return create_fallback_reflection(state)
+
+
+def execute_reflection(state: AgentState, use_cache: bool = True) -> Dict:
+    """Generate a reflection on the current diagnosis output (critiques of an identical diagnosis are cached)"""
+    print("\n🔍 Evaluating diagnosis quality...")
+    
+    critique_prompt, messages = create_critique_messages(state)
+    
+    try:
+        return parse_critique_response(state, critique_prompt, llm._call(messages, cache=use_cache, validate=is_json_object))
+    except Exception as e:
+        print(f"Error during reflection: {e}")
+        return create_fallback_reflection(state)
+
+
+async def aexecute_reflection(state: AgentState, use_cache: bool = True) -> Dict:
+    """Awaitable `execute_reflection`"""
+    print("\n🔍 Evaluating diagnosis quality...")
+    
+    critique_prompt, messages = create_critique_messages(state)
     
     try:
-        response = llm._call(messages)
-        content = re.sub(r'^```json\s*|\s*```$', '', response.strip(), flags=re.DOTALL)
-        # print("Critique response:", content)
-        # Parse the evaluation metrics
-        try:
-            
-            metrics_data = json.loads(content)
-            
-            # Create evaluation metrics object
-            metrics = EvaluationMetrics(
-                factual_correctness=metrics_data.get("factual_correctness", 0.0),
-                completeness=metrics_data.get("completeness", 0.0),
-                evidence_basis=metrics_data.get("evidence_basis", 0.0),
-                logical_coherence=metrics_data.get("logical_coherence", 0.0),
-                alternative_considerations=metrics_data.get("alternative_considerations", 0.0),
-                overall_score=metrics_data.get("overall_score", 0.0),
-                improvements=metrics_data.get("improvements", ["No specific improvements provided"])
-            )
-            
-            # Print evaluation for visibility
-            print("\n📊 Evaluation Results:")
-            print(f"✓ Factual Correctness: {metrics.factual_correctness:.2f}")
-            print(f"✓ Completeness: {metrics.completeness:.2f}")
-            print(f"✓ Evidence Basis: {metrics.evidence_basis:.2f}")
-            print(f"✓ Logical Coherence: {metrics.logical_coherence:.2f}")
-            print(f"✓ Alternative Considerations: {metrics.alternative_considerations:.2f}")
-            print(f"✓ Overall Score: {metrics.overall_score:.2f}")
-            print("\n🔧 Suggested Improvements:")
-            for i, improvement in enumerate(metrics.improvements):
-                print(f"{i+1}. {improvement}")
-            
-            # Update the state with reflection
-            return {
-                "reflection": {
-                    "metrics": metrics.dict(),
-                    "critique": content,
-                    "needs_refinement": not metrics.passed_threshold(0.7)
-                },
-                "agent_role": "refiner" if not metrics.passed_threshold(0.7) else "executor",
-                "chat_history": state["chat_history"] + [
-                    {"role": "user", "content": critique_prompt},
-                    {"role": "assistant", "content": content}
-                ]
-            }
-            
-        except json.JSONDecodeError as e:
-            print(f"Error parsing critique response: {e}")
-            # Create a fallback evaluation
-            return create_fallback_reflection(state)
-            
+        return parse_critique_response(state, critique_prompt, await llm._acall(messages, cache=use_cache, validate=is_json_object))
     except Exception as e:
         print(f"Error during reflection: {e}")
         return create_fallback_reflection(state)
@@ -156,10 +178,8 @@ def create_fallback_reflection(state: AgentState) -> Dict:
     }
 
 
-def execute_refinement(state: AgentState) -> Dict:
-    """Refine the diagnosis based on reflection feedback"""
-    print("\n🔄 Refining diagnosis based on feedback...")
-    
+def create_refinement_messages(state: AgentState) -> Tuple[str, List[Dict[str, str]]]:
+    """Refinement prompt built from the diagnosis and its critique, and the refiner messages"""
     # Extract the original diagnosis and reflection
     diagnosis = state.get("output", {}).get("answer", "No diagnosis available")
     reflection = state.get("reflection", {})
@@ -187,27 +207,55 @@ The refined diagnosis should be complete, evidence-based, and logically coherent
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": refinement_prompt}
     ]
+    return refinement_prompt, messages
+
+
+def parse_refinement_response(state: AgentState, refinement_prompt: str, response: str) -> Dict:
+    """State update carrying the refined diagnosis"""
+    refined_diagnosis = response.strip()
+    
+    print("\n✍️ Refined Diagnosis Created")
+    
+    # Update the state with the refined output
+    return {
+        "output": {"answer": refined_diagnosis},
+        "agent_role": "critic",  # Switch back to critic for re-evaluation
+        "chat_history": state["chat_history"] + [
+            {"role": "user", "content": refinement_prompt},
+            {"role": "assistant", "content": refined_diagnosis}
+        ]
+    }
+
+
+def create_fallback_refinement(state: AgentState) -> Dict:
+    """Keep the original output when refinement fails"""
+    return {
+        "agent_role": "executor",  # Switch back to executor
+        "chat_history": state["chat_history"]  # Keep the existing chat history
+    }
+
+
+def execute_refinement(state: AgentState) -> Dict:
+    """Refine the diagnosis based on reflection feedback"""
+    print("\n🔄 Refining diagnosis based on feedback...")
+    
+    refinement_prompt, messages = create_refinement_messages(state)
     
     try:
-        response = llm._call(messages)
-        refined_diagnosis = response.strip()
-        
-        print("\n✍️ Refined Diagnosis Created")
-        
-        # Update the state with the refined output
-        return {
-            "output": {"answer": refined_diagnosis},
-            "agent_role": "critic",  # Switch back to critic for re-evaluation
-            "chat_history": state["chat_history"] + [
-                {"role": "user", "content": refinement_prompt},
-                {"role": "assistant", "content": refined_diagnosis}
-            ]
-        }
-            
+        return parse_refinement_response(state, refinement_prompt, llm._call(messages))
     except Exception as e:
         print(f"Error during refinement: {e}")
-        # Keep the original output if refinement fails
-        return {
-            "agent_role": "executor",  # Switch back to executor
-            "chat_history": state["chat_history"]  # Keep the existing chat history
-        }
\ No newline at end of file
+        return create_fallback_refinement(state)
+
+
+async def aexecute_refinement(state: AgentState) -> Dict:
+    """Awaitable `execute_refinement`"""
+    print("\n🔄 Refining diagnosis based on feedback...")
+    
+    refinement_prompt, messages = create_refinement_messages(state)
+    
+    try:
+        return parse_refinement_response(state, refinement_prompt, await llm._acall(messages))
+    except Exception as e:
+        print(f"Error during refinement: {e}")
+        return create_fallback_refinement(state)
@@ -0,0 +1,152 @@
+import json
+import os
+from typing import Callable, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+# The oracle's scratchpad (its earlier tool calls and their outputs) lives in the graph
+# state and is extended with each new step, instead of being rebuilt and re-serialized
+# from every step on every turn. Once the tool outputs in it exceed SCRATCHPAD_TOKEN_BUDGET
+# tokens, the oldest ones are replaced by short references (tool, step, size and their
+# first SCRATCHPAD_SUMMARY_WORDS words) until it fits again; the SCRATCHPAD_KEEP_RECENT
+# latest outputs are always kept whole. If the references themselves outgrow the budget,
+# they are folded into a single note, so the prompt stays bounded however long the run.
+# Full outputs stay in `intermediate_steps`.
+SCRATCHPAD_TOKEN_BUDGET = int(os.environ.get("SCRATCHPAD_TOKEN_BUDGET", "3000"))
+SCRATCHPAD_KEEP_RECENT = int(os.environ.get("SCRATCHPAD_KEEP_RECENT", "1"))
+SCRATCHPAD_SUMMARY_WORDS = int(os.environ.get("SCRATCHPAD_SUMMARY_WORDS", "40"))
+
+TokenCounter = Callable[[Sequence[str]], List[int]]
+
+
+def _default_token_counter() -> TokenCounter:
+    # Same tokenizer as the context budgets of the prompts
+    from src.models.LoadLLM import get_llm_tokenizer
+    from src.retrieval.ContextAssembler import llm_token_counter
+    return llm_token_counter(get_llm_tokenizer())
+
+
+class ScratchpadEntry(BaseModel):
+    """One tool step as the oracle sees it: the call and its (possibly compacted) output"""
+    step: int  # Index of the step in intermediate_steps
+    tool_name: str
+    call: str  # The tool call as the assistant message sent it ("" for a folded note)
+    output: str
+    tokens: int  # Tokens of `output`
+    compacted: bool = False
+    last_step: Optional[int] = None  # Last step folded into this note, if it is one
+
+
+def fold_note(first_step: int, last_step: int, tools: Sequence[str]) -> str:
+    """One note standing in for the compacted steps first_step..last_step"""
+    return (f"[Earlier steps {first_step + 1}-{last_step + 1} ({', '.join(tools)}) were compacted to save context; "
+            f"rely on the findings of the later steps.]")
+
+
+def compact_reference(entry: ScratchpadEntry, summary_words: int = SCRATCHPAD_SUMMARY_WORDS) -> str:
+    """Short stand-in for a tool output dropped from the scratchpad"""
+    words = entry.output.split()
+    opening = " ".join(words[:summary_words]) + (" ..." if len(words) > summary_words else "")
+    return (f"[Output of step {entry.step + 1} ({entry.tool_name}, {entry.tokens} tokens) compacted to save context. "
+            f"It began: {opening}]")
+
+
+class Scratchpad(BaseModel):
+    """
+    Incrementally maintained oracle scratchpad.
+
+    `extend` returns a new scratchpad with the steps added since the last call,
+    so it can be stored in the graph state; entries already in it are reused
+    as they are and every tool output is tokenized once.
+    """
+    entries: List[ScratchpadEntry] = []
+    steps: int = 0  # Steps of intermediate_steps already taken in
+    compactions: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return sum(entry.tokens for entry in self.entries)
+
+    def extend(self, intermediate_steps: Sequence, count_tokens: Optional[TokenCounter] = None,
+               budget: Optional[int] = None) -> "Scratchpad":
+        """
+        Scratchpad with the new steps of `intermediate_steps`, compacted to `budget` tokens.
+
+        Args:
+            intermediate_steps: All AgentActions of the run so far
+            count_tokens: Batched token counter; defaults to the LLM tokenizer
+            budget: Token budget of the tool outputs (default SCRATCHPAD_TOKEN_BUDGET)
+
+        Returns:
+            Scratchpad: `self` when there is nothing new
+        """
+        base = self if len(intermediate_steps) >= self.steps else Scratchpad()  # steps were reset
+        new_steps = [(i, action) for i, action in enumerate(intermediate_steps[base.steps:], start=base.steps)
+                     if action.tool_output is not None]
+        if not new_steps:
+            return base if len(intermediate_steps) == base.steps else base.copy(update={"steps": len(intermediate_steps)})
+        count_tokens = count_tokens or _default_token_counter()
+        counts = count_tokens([action.tool_output for _, action in new_steps])
+        added = [
+            ScratchpadEntry(
+                step=i,
+                tool_name=action.tool_name,
+                call=json.dumps({"name": action.tool_name, "parameters": action.tool_input}),
+                output=action.tool_output,
+                tokens=n,
+            )
+            for (i, action), n in zip(new_steps, counts)
+        ]
+        scratchpad = Scratchpad(entries=base.entries + added, steps=len(intermediate_steps),
+                                compactions=base.compactions)
+        return scratchpad.compact(count_tokens, SCRATCHPAD_TOKEN_BUDGET if budget is None else budget)
+
+    def compact(self, count_tokens: TokenCounter, budget: int = SCRATCHPAD_TOKEN_BUDGET,
+                keep_recent: int = SCRATCHPAD_KEEP_RECENT) -> "Scratchpad":
+        """Replace the oldest tool outputs by references until the outputs fit `budget` tokens."""
+        total = self.tokens
+        if total <= budget:
+            return self
+        entries = list(self.entries)
+        compacted = 0
+        for i in range(max(0, len(entries) - keep_recent)):
+            if total <= budget:
+                break
+            entry = entries[i]
+            if entry.compacted:
+                continue
+            reference = compact_reference(entry)
+            reference_tokens = count_tokens([reference])[0]
+            if reference_tokens >= entry.tokens:
+                continue
+            total += reference_tokens - entry.tokens
+            entries[i] = entry.copy(update={"output": reference, "tokens": reference_tokens, "compacted": True})
+            compacted += 1
+        if total > budget:
+            entries, total = self._fold(entries, count_tokens)
+        if compacted:
+            print(f"🗜 Compacted {compacted} earlier tool output(s); scratchpad now {total} tokens (budget {budget})")
+        return Scratchpad(entries=entries, steps=self.steps, compactions=self.compactions + compacted)
+
+    @staticmethod
+    def _fold(entries: List[ScratchpadEntry], count_tokens: TokenCounter):
+        # Merge every compacted entry, an earlier note included, into one note in front
+        folded = [entry for entry in entries if entry.compacted]
+        if len(folded) > 1:
+            first_step = folded[0].step
+            last_step = max(entry.last_step if entry.last_step is not None else entry.step for entry in folded)
+            tools = sorted({tool for entry in folded for tool in entry.tool_name.split(", ")})
+            note = fold_note(first_step, last_step, tools)
+            merged = ScratchpadEntry(step=first_step, tool_name=", ".join(tools), call="", output=note,
+                                     tokens=count_tokens([note])[0], compacted=True, last_step=last_step)
+            entries = [merged] + [entry for entry in entries if not entry.compacted]
+        return entries, sum(entry.tokens for entry in entries)
+
+    def to_messages(self) -> List[dict]:
+        """Assistant tool call and user tool output message pairs, oldest first"""
+        messages = []
+        for entry in self.entries:
+            if entry.call:
+                messages.append({"role": "assistant", "content": entry.call})
+            messages.append({"role": "user", "content": entry.output})
+        return messages
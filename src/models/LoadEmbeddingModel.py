@@ -1,27 +1,191 @@
-import torch
-from langchain_huggingface import HuggingFaceEmbeddings
-import spacy
-import en_core_sci_scibert
-from sentence_transformers import CrossEncoder
-
-# Load NLP model
-nlp = en_core_sci_scibert.load()
-
-# Initialize device
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
-# Create embedding models
-primary_embeddings_model = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-large-en-v1.5",
-    model_kwargs={"device": device},
-    encode_kwargs={"normalize_embeddings": True},
-)
-
-alternative_embeddings_model = HuggingFaceEmbeddings(
-    model_name="Zybg/synthetic-clinical-embedding-model",
-    model_kwargs={"device": device},
-    encode_kwargs={"normalize_embeddings": True},
-)
-
-# Initialize cross encoder
-cross_encoder = CrossEncoder("microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract-fulltext")
\ No newline at end of file
+import os
+
+from src.models.ModelRegistry import registry, get_device
+
+# Models are registered here and loaded on first use through the registry.
+# `from src.models.LoadEmbeddingModel import nlp` still works (see __getattr__),
+# but it loads the model at import time; prefer the get_* accessors.
+
+PRIMARY_EMBEDDING_MODEL = "BAAI/bge-large-en-v1.5"
+ALTERNATIVE_EMBEDDING_MODEL = "Zybg/synthetic-clinical-embedding-model"
+# Small non-transformer scispaCy pipeline used by the "lite" query normalization mode
+LITE_NLP_MODEL = "en_core_sci_sm"
+
+# Query normalization (lemmatize, drop stopwords) runs one of three spaCy pipelines:
+#   full  en_core_sci_scibert with every component (previous behaviour)
+#   fast  en_core_sci_scibert without parser and NER, which influence neither lemmas
+#         nor stopwords, so the output is the same as full
+#   lite  the small non-transformer en_core_sci_sm without parser and NER
+QUERY_NORMALIZATION = os.environ.get("QUERY_NORMALIZATION", "fast")
+QUERY_NLP_MODELS = {"full": "nlp", "fast": "nlp_fast", "lite": "nlp_lite"}
+if QUERY_NORMALIZATION not in QUERY_NLP_MODELS:
+    raise ValueError(f"❌ Unknown QUERY_NORMALIZATION '{QUERY_NORMALIZATION}'. Choose one of {', '.join(QUERY_NLP_MODELS)}.")
+_NORMALIZATION_EXCLUDE = ["parser", "ner"]
+
+# Inference backend of the two query encoders:
+#   torch       sentence-transformers on torch (previous behaviour)
+#   torch_int8  torch with the Linear layers dynamically quantized to int8 (CPU)
+#   onnx        ONNX Runtime, fp32 graph (CPU)
+#   onnx_int8   ONNX Runtime, dynamically int8-quantized graph (CPU)
+# ONNX graphs are read from EMBEDDING_ONNX_DIR as written by
+# `python -m scripts.export_embedding_models`; fp32 graphs are otherwise exported at load.
+# EMBEDDING_ONNX_QUANTIZATION is the instruction set the int8 graph was tuned for
+# (arm64, avx2, avx512 or avx512_vnni).
+EMBEDDING_BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+if EMBEDDING_BACKEND not in EMBEDDING_BACKENDS:
+    raise ValueError(f"❌ Unknown EMBEDDING_BACKEND '{EMBEDDING_BACKEND}'. Choose one of {', '.join(EMBEDDING_BACKENDS)}.")
+EMBEDDING_ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", "./data/onnx_models")
+EMBEDDING_ONNX_QUANTIZATION = os.environ.get("EMBEDDING_ONNX_QUANTIZATION", "avx2")
+# Largest cosine distance (1 - cos) to the torch vectors a backend may produce for the
+# same text, checked by `python -m scripts.benchmark_embedding_backends`.
+EMBEDDING_COSINE_TOLERANCE = {"torch": 0.0, "torch_int8": 0.02, "onnx": 1e-4, "onnx_int8": 0.02}
+
+# Cross-encoder of the optional last rerank stage (CROSS_ENCODER_M in Search.py). It must
+# be a checkpoint trained for relevance scoring; a plain BERT checkpoint such as
+# PubMedBERT loads with a randomly initialised classification head and scores noise.
+CROSS_ENCODER_MODEL = os.environ.get("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+
+def _load_nlp():
+    import en_core_sci_scibert
+    return en_core_sci_scibert.load()
+
+
+def _load_nlp_fast():
+    import en_core_sci_scibert
+    return en_core_sci_scibert.load(exclude=_NORMALIZATION_EXCLUDE)
+
+
+def _load_nlp_lite():
+    import spacy
+    return spacy.load(LITE_NLP_MODEL, exclude=_NORMALIZATION_EXCLUDE)
+
+
+def onnx_model_dir(model_name: str) -> str:
+    """Directory the exported ONNX graphs of `model_name` are written to."""
+    return os.path.join(EMBEDDING_ONNX_DIR, model_name.replace("/", "__"))
+
+
+def onnx_file_name(backend: str) -> str:
+    """Graph file of an ONNX backend, relative to the model directory."""
+    return "onnx/model.onnx" if backend == "onnx" else f"onnx/model_qint8_{EMBEDDING_ONNX_QUANTIZATION}.onnx"
+
+
+def load_embeddings(model_name: str, backend: str = EMBEDDING_BACKEND):
+    """
+    Load a query encoder on one of EMBEDDING_BACKENDS.
+
+    Args:
+        model_name (str): Hugging Face model id
+        backend (str): One of EMBEDDING_BACKENDS
+
+    Returns:
+        HuggingFaceEmbeddings: Encoder with normalized output vectors
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"❌ Unknown embedding backend '{backend}'. Choose one of {', '.join(EMBEDDING_BACKENDS)}.")
+    source = model_name
+    # The quantized and ONNX Runtime backends are CPU-only.
+    model_kwargs = {"device": get_device() if backend == "torch" else "cpu"}
+    if backend.startswith("onnx"):
+        file_name = onnx_file_name(backend)
+        if os.path.exists(os.path.join(onnx_model_dir(model_name), file_name)):
+            source = onnx_model_dir(model_name)
+        elif backend == "onnx_int8":
+            raise FileNotFoundError(f"❌ No int8 ONNX graph for '{model_name}' in '{EMBEDDING_ONNX_DIR}'. "
+                                    "Export it with `python -m scripts.export_embedding_models`.")
+        else:
+            print(f"⚠ No exported ONNX graph for '{model_name}' in '{EMBEDDING_ONNX_DIR}'; exporting at load. "
+                  "Run `python -m scripts.export_embedding_models` for a fast start.")
+        model_kwargs.update(backend="onnx", model_kwargs={"file_name": file_name, "provider": "CPUExecutionProvider"})
+    embeddings = HuggingFaceEmbeddings(
+        model_name=source,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"normalize_embeddings": True},
+    )
+    if backend == "torch_int8":
+        import torch
+        transformer = embeddings._client[0].auto_model
+        torch.quantization.quantize_dynamic(transformer, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return embeddings
+
+
+def _load_cross_encoder():
+    from sentence_transformers import CrossEncoder
+    model = CrossEncoder(CROSS_ENCODER_MODEL)
+    architectures = getattr(model.config, "architectures", None) or []
+    if not any(name.endswith("ForSequenceClassification") for name in architectures):
+        print(f"⚠ Cross-encoder '{CROSS_ENCODER_MODEL}' is not a trained sequence classifier "
+              f"(architectures: {', '.join(architectures) or 'unknown'}); its scores are not meaningful. "
+              "Set CROSS_ENCODER_MODEL to a trained reranker or CROSS_ENCODER_M=0.")
+    return model
+
+
+def _load_colbert_reranker():
+    from ragatouille import RAGPretrainedModel
+    return RAGPretrainedModel.from_pretrained("colbert-ir/colbertv2.0")
+
+
+registry.register("nlp", _load_nlp, "scispaCy en_core_sci_scibert pipeline")
+registry.register("nlp_fast", _load_nlp_fast, "scispaCy en_core_sci_scibert pipeline without parser/NER")
+registry.register("nlp_lite", _load_nlp_lite, f"scispaCy {LITE_NLP_MODEL} pipeline without parser/NER")
+registry.register("primary_embeddings", lambda: load_embeddings(PRIMARY_EMBEDDING_MODEL),
+                  f"{PRIMARY_EMBEDDING_MODEL} query encoder ({EMBEDDING_BACKEND})")
+registry.register("alternative_embeddings", lambda: load_embeddings(ALTERNATIVE_EMBEDDING_MODEL),
+                  f"{ALTERNATIVE_EMBEDDING_MODEL} query encoder ({EMBEDDING_BACKEND})")
+registry.register("colbert_reranker", _load_colbert_reranker, "ColBERTv2 reranker")
+registry.register("cross_encoder", _load_cross_encoder, f"{CROSS_ENCODER_MODEL} cross-encoder")
+
+# Models the retrieval pipeline needs on every search
+RETRIEVAL_MODELS = (QUERY_NLP_MODELS[QUERY_NORMALIZATION], "primary_embeddings", "alternative_embeddings", "colbert_reranker")
+
+
+def get_nlp():
+    return registry.get("nlp")
+
+
+def get_query_nlp(mode: str = QUERY_NORMALIZATION):
+    """spaCy pipeline of a query normalization mode (a key of QUERY_NLP_MODELS)."""
+    return registry.get(QUERY_NLP_MODELS[mode])
+
+
+def get_primary_embeddings_model():
+    return registry.get("primary_embeddings")
+
+
+def get_alternative_embeddings_model():
+    return registry.get("alternative_embeddings")
+
+
+def get_colbert_reranker():
+    return registry.get("colbert_reranker")
+
+
+def get_cross_encoder():
+    return registry.get("cross_encoder")
+
+
+def preload_retrieval_models():
+    """Warm every model used by search, e.g. at service start, and print the load report."""
+    registry.preload(RETRIEVAL_MODELS)
+    print(registry.report())
+
+
+# Backwards-compatible module attributes, resolved lazily
+_LAZY_ATTRIBUTES = {
+    "nlp": "nlp",
+    "primary_embeddings_model": "primary_embeddings",
+    "alternative_embeddings_model": "alternative_embeddings",
+    "colbert_reranker": "colbert_reranker",
+    "cross_encoder": "cross_encoder",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return registry.get(_LAZY_ATTRIBUTES[name])
+    if name == "device":
+        return get_device()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
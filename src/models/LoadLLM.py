@@ -1,25 +1,213 @@
 from langchain.llms.base import LLM
 from ollama import chat
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+import asyncio
+import httpx
+import json
 import os
-import torch
+import re
+import threading
+import time
+import weakref
+
+from src.models.ModelRegistry import registry
+from src.utils.Cache import LRUCache, SQLiteCacheStore, make_cache_key
+from src.utils.Profiling import latency_summary
+
+# Hugging Face tokenizer matching the served LLM, used to measure prompt sizes locally.
+# With LLM_BACKEND=stub, tokens are whitespace-separated words, so nothing is downloaded.
+LLM_TOKENIZER = os.environ.get("LLM_TOKENIZER", "deepseek-ai/DeepSeek-V3-0324")
+
+
+class WhitespaceTokenizer:
+    """Tokenizer-compatible word splitter: tokenizer(texts)["input_ids"] lists the words of each text."""
+
+    def __call__(self, texts, add_special_tokens: bool = False) -> Dict[str, list]:
+        return {"input_ids": [text.split() for text in ([texts] if isinstance(texts, str) else texts)]}
+
+
+def _load_llm_tokenizer():
+    if LLM_BACKEND == "stub":
+        return WhitespaceTokenizer()
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(LLM_TOKENIZER)
+
+
+registry.register("llm_tokenizer", _load_llm_tokenizer, f"{LLM_TOKENIZER} tokenizer")
+
+
+def get_llm_tokenizer():
+    return registry.get("llm_tokenizer")
+
+
+# The LLM is served through an OpenAI-compatible endpoint (OPENAI_BASE_URL, OPENAI_API_KEY).
+# Calls go through one pooled HTTP client per process (one per event loop for `_acall`),
+# at most LLM_MAX_CONCURRENCY requests are in flight (per process for `_call`, per event
+# loop for `_acall`), and each call times out after LLM_TIMEOUT seconds unless the caller
+# passes its own timeout.
+LLM_MODEL = os.environ.get("LLM_MODEL", "deepseek/deepseek-chat-v3-0324:free")
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "120"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", str(max(LLM_MAX_CONCURRENCY, 10))))
+# Time to first token and total latency of the last LLM_LATENCY_SAMPLES calls, reported by
+# `llm.latency_stats()`. A non-streaming call's first token arrives with the whole completion.
+LLM_LATENCY_SAMPLES = int(os.environ.get("LLM_LATENCY_SAMPLES", "1000"))
+
+# Responses of calls made with cache=True (prompts fully determined by their input, e.g.
+# planning, critiques, image summaries) are cached by model, messages and sampling
+# parameters. LLM_CACHE_PATH adds a SQLite tier shared across restarts and processes,
+# LLM_CACHE_MAX_ENTRIES bounds it; LLM_CACHE_SIZE=0 without a path disables caching.
+# Callers that parse the reply pass `validate` (e.g. is_json_object), so a malformed
+# plan or critique is retried on the next call instead of being served from the cache.
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "0")) or None
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH")
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "100000"))
+
+# LLM_BACKEND=stub replaces the endpoint with canned, prompt-shaped responses (valid plans,
+# critiques and tool calls) produced in-process after LLM_STUB_DELAY seconds, so the reports,
+# the agent graph and the service run end to end without network access or API keys.
+LLM_BACKENDS = ("openai", "stub")
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openai")
+if LLM_BACKEND not in LLM_BACKENDS:
+    raise ValueError(f"❌ Unknown LLM_BACKEND '{LLM_BACKEND}'; expected one of {', '.join(LLM_BACKENDS)}.")
+LLM_STUB_DELAY = float(os.environ.get("LLM_STUB_DELAY", "0"))
+
+NO_RESPONSE = "No response generated."
+
+llm_cache = LRUCache(
+    LLM_CACHE_SIZE,
+    ttl=LLM_CACHE_TTL,
+    disk=SQLiteCacheStore(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES) if LLM_CACHE_PATH else None,
+    name="llm_response",
+)
+
+
+def is_json_object(response: str) -> bool:
+    """Whether a reply (optionally fenced as ```json) parses to a JSON object; a cache `validate` callback."""
+    content = re.sub(r'^```json\s*|\s*```$', '', response.strip(), flags=re.DOTALL)
+    try:
+        return isinstance(json.loads(content), dict)
+    except json.JSONDecodeError:
+        return False
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+
 
 # os.environ["OLLAMA_HOST"] = "http://127.0.0.1:11434"
 # os.environ["CUDA_VISIBLE_DEVICES"] = "6"
 class OllamaLLM():
     def __init__(self, model: str = "llama3.2:3b"):
-        self.client = OpenAI(
-
-        )
-        self.model = "deepseek/deepseek-chat-v3-0324:free"
+        self.client = self._make_client()
+        self.model = LLM_MODEL
         # self.model = model
-    
-    def _call(self, prompt):
-        """Make a direct call to the Ollama API."""
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=prompt,
+        self._slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+        # AsyncOpenAI clients and their in-flight limits are bound to the event loop that created them
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
+        self._latency = {"ttft": deque(maxlen=LLM_LATENCY_SAMPLES), "total": deque(maxlen=LLM_LATENCY_SAMPLES)}
+        self._latency_lock = threading.Lock()
+
+    @staticmethod
+    def _make_client():
+        return OpenAI(
+            timeout=LLM_TIMEOUT,
+            http_client=DefaultHttpxClient(limits=_http_limits()),
         )
+
+    @staticmethod
+    def _content(response) -> str:
+        try:
+            return response.choices[0].message.content
+        except (KeyError, IndexError, TypeError):
+            return NO_RESPONSE
+
+    @staticmethod
+    def _delta(chunk) -> str:
+        try:
+            return chunk.choices[0].delta.content or ""
+        except (AttributeError, IndexError, TypeError):
+            return ""
+
+    def _record(self, start: float, first_token: Optional[float]) -> None:
+        end = time.perf_counter()
+        with self._latency_lock:
+            self._latency["ttft"].append(((first_token or end) - start) * 1000)
+            self._latency["total"].append((end - start) * 1000)
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Mean, p50 and p99 (ms) of time to first token and total latency over recent calls."""
+        with self._latency_lock:
+            return {name: latency_summary(list(samples)) for name, samples in self._latency.items()}
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """Hit/miss counters of the response cache."""
+        return llm_cache.stats()
+
+    def _cache_key(self, prompt, params: Dict) -> str:
+        return make_cache_key("llm", self.model, prompt, params)
+
+    def _cached(self, key: str, on_token: Optional[Callable[[str], None]],
+                validate: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        response = llm_cache.get(key)
+        if response is not None and validate is not None and not validate(response):
+            response = None  # Stored before the caller validated its responses
+        if response is not None and on_token is not None:
+            on_token(response)
+        return response
+
+    @staticmethod
+    def _store(key: str, response: Optional[str], validate: Optional[Callable[[str], bool]] = None) -> None:
+        # Failed, empty or invalid completions are retried next time rather than cached
+        if response and response != NO_RESPONSE and (validate is None or validate(response)):
+            llm_cache.set(key, response)
+
+    def _call(self, prompt, timeout: Optional[float] = None, on_token: Optional[Callable[[str], None]] = None,
+              cache: bool = False, validate: Optional[Callable[[str], bool]] = None, **params):
+        """
+        Make a direct, blocking call to the LLM API.
+
+        Args:
+            prompt (list): Chat messages
+            timeout (float): Seconds before the request is abandoned (default LLM_TIMEOUT)
+            on_token (callable): Streams the completion, calling on_token(text) per
+                token as it arrives; the assembled text is still returned
+            cache (bool): Serve and store the response in `llm_cache`; only for calls
+                whose response is fully determined by the prompt and `params`
+            validate (callable): With `cache`, only responses for which validate(text)
+                is true are stored or served, e.g. `is_json_object` for replies the
+                caller parses
+            **params: Sampling parameters passed to the API (temperature, max_tokens, ...)
+        """
+        if not cache:
+            return self._complete(prompt, timeout, on_token, params)
+        key = self._cache_key(prompt, params)
+        response = self._cached(key, on_token, validate)
+        if response is None:
+            response = self._complete(prompt, timeout, on_token, params)
+            self._store(key, response, validate)
+        return response
+
+    def _complete(self, prompt, timeout: Optional[float], on_token: Optional[Callable[[str], None]], params: Dict) -> str:
+        if on_token is not None:
+            tokens = []
+            for token in self.stream(prompt, timeout, **params):
+                on_token(token)
+                tokens.append(token)
+            return "".join(tokens)
+        start = time.perf_counter()
+        with self._slots:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=prompt,
+                timeout=timeout or LLM_TIMEOUT,
+                **params,
+            )
         
         # response = chat(
         #     model=self.model,
@@ -31,19 +219,240 @@ class OllamaLLM():
         
         # except (KeyError, IndexError, TypeError):
         #     return "❌ No response generated."
+        self._record(start, None)
+        return self._content(response)
+
+    def stream(self, prompt, timeout: Optional[float] = None, **params) -> Iterator[str]:
+        """Blocking call that yields the completion token by token as it arrives."""
+        start, first_token = time.perf_counter(), None
+        with self._slots:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=prompt,
+                timeout=timeout or LLM_TIMEOUT,
+                stream=True,
+                **params,
+            )
+            try:
+                for chunk in response:
+                    token = self._delta(chunk)
+                    if token:
+                        first_token = first_token or time.perf_counter()
+                        yield token
+            finally:
+                response.close()
+                self._record(start, first_token)
+
+    def _async_client(self) -> Tuple[AsyncOpenAI, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            entry = self._async_clients.get(loop)
+            if entry is None:
+                client = AsyncOpenAI(
+                    timeout=LLM_TIMEOUT,
+                    http_client=DefaultAsyncHttpxClient(limits=_http_limits()),
+                )
+                entry = self._async_clients[loop] = (client, asyncio.Semaphore(LLM_MAX_CONCURRENCY))
+        return entry
+
+    async def _acall(self, prompt, timeout: Optional[float] = None, on_token: Optional[Callable[[str], None]] = None,
+                     cache: bool = False, validate: Optional[Callable[[str], bool]] = None, **params):
+        """
+        Awaitable `_call` on the pooled async client of the running event loop.
+
+        The timeout covers waiting for a free slot and the request itself;
+        cancelling the awaiting task aborts the HTTP request. Streaming and
+        caching work as in `_call`.
+
+        Raises:
+            TimeoutError: If no response arrived within `timeout` seconds
+        """
+        if not cache:
+            return await self._acomplete(prompt, timeout, on_token, params)
+        key = self._cache_key(prompt, params)
+        response = self._cached(key, on_token, validate)
+        if response is None:
+            response = await self._acomplete(prompt, timeout, on_token, params)
+            self._store(key, response, validate)
+        return response
+
+    async def _acomplete(self, prompt, timeout: Optional[float], on_token: Optional[Callable[[str], None]],
+                         params: Dict) -> str:
+        if on_token is not None:
+            tokens = []
+            async for token in self.astream(prompt, timeout, **params):
+                on_token(token)
+                tokens.append(token)
+            return "".join(tokens)
+        client, slots = self._async_client()
+        start = time.perf_counter()
+        timeout = timeout or LLM_TIMEOUT
+
+        async def request():
+            async with slots:
+                return await client.chat.completions.create(model=self.model, messages=prompt, timeout=timeout, **params)
+
         try:
-            return response.choices[0].message.content
-        except (KeyError, IndexError, TypeError):
-            return "No response generated."
+            response = await asyncio.wait_for(request(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"❌ LLM call timed out after {timeout:g}s")
+        self._record(start, None)
+        return self._content(response)
+
+    async def astream(self, prompt, timeout: Optional[float] = None, **params) -> AsyncIterator[str]:
+        """
+        Async generator over the completion's tokens.
+
+        Raises:
+            TimeoutError: If the stream did not start within `timeout` seconds
+        """
+        client, slots = self._async_client()
+        timeout = timeout or LLM_TIMEOUT
+        start, first_token = time.perf_counter(), None
+
+        async def request():
+            await slots.acquire()
+            try:
+                return await client.chat.completions.create(model=self.model, messages=prompt, timeout=timeout,
+                                                            stream=True, **params)
+            except BaseException:
+                slots.release()
+                raise
+
+        try:
+            response = await asyncio.wait_for(request(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"❌ LLM call timed out after {timeout:g}s")
+        try:
+            async for chunk in response:
+                token = self._delta(chunk)
+                if token:
+                    first_token = first_token or time.perf_counter()
+                    yield token
+        finally:
+            slots.release()
+            await response.close()
+            self._record(start, first_token)
+
+    async def aclose(self) -> None:
+        """Close the async client of the running event loop, e.g. before the loop shuts down."""
+        with self._async_lock:
+            entry = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].close()
     
     @property
     def _llm_type(self) -> str:
         return "ollama_llama3.2"
     
+def stub_response(prompt) -> str:
+    """
+    Canned response of the stub backend, shaped after the prompt: a JSON plan for
+    planning prompts, a passing JSON critique for critiques, a final_answer tool
+    call for oracle turns, and a short text otherwise.
+    """
+    messages = prompt if isinstance(prompt, list) else [{"role": "user", "content": str(prompt)}]
+    last = messages[-1]["content"] if messages else ""
+    if "create a medical diagnosis plan" in last:
+        return json.dumps({
+            "steps": ["Search for clinical evidence on the reported findings", "Provide the final diagnosis"],
+            "reasoning": "Stub plan.",
+        })
+    if "evaluate the following medical diagnosis" in last:
+        return json.dumps({
+            "factual_correctness": 0.8, "completeness": 0.8, "evidence_basis": 0.8, "logical_coherence": 0.8,
+            "alternative_considerations": 0.8, "overall_score": 0.8, "improvements": [],
+        })
+    if messages and "Tools:" in messages[0]["content"]:
+        return json.dumps({"name": "final_answer", "parameters": {"answer": "Stub diagnosis based on the retrieved evidence."}})
+    return f"Stub response ({len(last.split())} prompt words)."
+
+
+class StubLLM(OllamaLLM):
+    """
+    In-process stand-in for the LLM endpoint (LLM_BACKEND=stub).
+
+    Same interface, caching, concurrency limit and latency accounting as
+    `OllamaLLM`; completions come from `stub_response` after LLM_STUB_DELAY
+    seconds and stream word by word.
+    """
+
+    def __init__(self, delay: float = LLM_STUB_DELAY):
+        super().__init__()
+        self.model = "stub"
+        self.delay = delay
+
+    @staticmethod
+    def _make_client():
+        return None
+
+    @staticmethod
+    def _tokens(text: str) -> Iterator[str]:
+        for i, word in enumerate(text.split(" ")):
+            yield word if i == 0 else " " + word
+
+    def _complete(self, prompt, timeout: Optional[float], on_token: Optional[Callable[[str], None]], params: Dict) -> str:
+        if on_token is not None:
+            return super()._complete(prompt, timeout, on_token, params)
+        start = time.perf_counter()
+        with self._slots:
+            time.sleep(self.delay)
+        self._record(start, None)
+        return stub_response(prompt)
+
+    def stream(self, prompt, timeout: Optional[float] = None, **params) -> Iterator[str]:
+        start = time.perf_counter()
+        with self._slots:
+            time.sleep(self.delay)
+            first_token = time.perf_counter()
+            try:
+                yield from self._tokens(stub_response(prompt))
+            finally:
+                self._record(start, first_token)
+
+    def _async_client(self):
+        raise RuntimeError("❌ The stub LLM backend has no HTTP client.")
+
+    def _slots_for_loop(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            slots = self._async_clients.get(loop)
+            if slots is None:
+                slots = self._async_clients[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        return slots
+
+    async def _acomplete(self, prompt, timeout: Optional[float], on_token: Optional[Callable[[str], None]],
+                         params: Dict) -> str:
+        if on_token is not None:
+            return await super()._acomplete(prompt, timeout, on_token, params)
+        start = time.perf_counter()
+        async with self._slots_for_loop():
+            await asyncio.sleep(self.delay)
+        self._record(start, None)
+        return stub_response(prompt)
+
+    async def astream(self, prompt, timeout: Optional[float] = None, **params) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        async with self._slots_for_loop():
+            await asyncio.sleep(self.delay)
+            first_token = time.perf_counter()
+            try:
+                for token in self._tokens(stub_response(prompt)):
+                    yield token
+            finally:
+                self._record(start, first_token)
+
+    async def aclose(self) -> None:
+        with self._async_lock:
+            self._async_clients.pop(asyncio.get_running_loop(), None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+
 # Initialize LLM
 os.environ["OLLAMA_HOST"] = "http://127.0.0.1:11434"
 os.environ["CUDA_VISIBLE_DEVICES"] = "6"
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"🔄 Using device: {device}")
 
-llm = OllamaLLM(model="llama3.2:3b")
\ No newline at end of file
+llm = StubLLM() if LLM_BACKEND == "stub" else OllamaLLM(model="llama3.2:3b")
\ No newline at end of file
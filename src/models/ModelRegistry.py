@@ -0,0 +1,140 @@
+import sys
+import threading
+import time
+import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.utils.Profiling import format_bytes, memory_usage
+
+
+class ModelStats:
+    """Load-time statistics of a registered model."""
+
+    def __init__(self, name: str, load_seconds: float, rss_delta: int, gpu_bytes: int = 0):
+        self.name = name
+        self.load_seconds = load_seconds
+        self.rss_delta = rss_delta
+        self.gpu_bytes = gpu_bytes
+        self.loaded_at = datetime.datetime.now().isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "load_seconds": self.load_seconds,
+            "rss_delta": self.rss_delta,
+            "gpu_bytes": self.gpu_bytes,
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """
+    Registry of lazily loaded models.
+
+    Models are registered with a zero-argument loader and only built on the
+    first `get`. Loading is guarded per model, so concurrent callers wait for
+    a single load instead of loading twice. `preload` warms models explicitly,
+    e.g. at service start, and `stats` reports the time and memory each load took.
+    Memory is measured as the process RSS delta around the loader, so it is
+    only exact when models are not loaded concurrently.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._descriptions: Dict[str, str] = {}
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, ModelStats] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], description: str = "") -> None:
+        """Register a loader; re-registering an unloaded name replaces its loader."""
+        with self._lock:
+            if name in self._models:
+                raise ValueError(f"❌ Model '{name}' is already loaded and cannot be re-registered.")
+            self._loaders[name] = loader
+            self._descriptions[name] = description
+            self._locks.setdefault(name, threading.Lock())
+
+    def names(self) -> List[str]:
+        return list(self._loaders)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str) -> Any:
+        """Return the model, loading it on first use."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._loaders:
+            raise KeyError(f"❌ Unknown model '{name}'. Registered: {', '.join(self._loaders)}")
+
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            before = memory_usage()["rss"]
+            gpu_before = _gpu_allocated()
+            start = time.perf_counter()
+            model = self._loaders[name]()
+            stats = ModelStats(
+                name,
+                time.perf_counter() - start,
+                memory_usage()["rss"] - before,
+                _gpu_allocated() - gpu_before,
+            )
+            self._stats[name] = stats
+            self._models[name] = model
+        print(f"✅ Loaded {name} in {stats.load_seconds:.1f}s (+{format_bytes(stats.rss_delta)} RSS)")
+        return model
+
+    def preload(self, names: Optional[Iterable[str]] = None) -> Dict[str, ModelStats]:
+        """Load the given models (all registered ones by default) and return their stats."""
+        for name in (list(names) if names is not None else self.names()):
+            self.get(name)
+        return dict(self._stats)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Load statistics of every registered model; unloaded models have no timings."""
+        rows = []
+        for name in self._loaders:
+            row = {"name": name, "description": self._descriptions[name], "loaded": name in self._stats}
+            if name in self._stats:
+                row.update(self._stats[name].to_dict())
+            rows.append(row)
+        return rows
+
+    def report(self) -> str:
+        """Human-readable table of `stats`."""
+        lines = [f"{'model':<24} {'loaded':>7} {'seconds':>8} {'rss':>10}"]
+        for row in self.stats():
+            if row["loaded"]:
+                lines.append(f"{row['name']:<24} {'yes':>7} {row['load_seconds']:>8.1f} {format_bytes(row['rss_delta']):>10}")
+            else:
+                lines.append(f"{row['name']:<24} {'no':>7} {'-':>8} {'-':>10}")
+        return "\n".join(lines)
+
+
+def _gpu_allocated() -> int:
+    # Only consult torch if something already imported it; never import it just to measure.
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return 0
+    return int(torch.cuda.memory_allocated())
+
+
+_device: Optional[str] = None
+
+
+def get_device() -> str:
+    """Torch device for local models; torch is only imported when a model actually needs it."""
+    global _device
+    if _device is None:
+        import torch
+        _device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"🔄 Using device: {_device}")
+    return _device
+
+
+# Process-wide registry shared by every module that needs a local model
+registry = ModelRegistry()
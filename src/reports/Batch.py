@@ -0,0 +1,184 @@
+import csv
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from src.agent.Core import AgentState
+from src.reports.Session import ReportSession
+from src.utils.Profiling import latency_summary
+
+# Cases processed concurrently by `python main.py --batch` (each with its own
+# ReportSession and graph thread_id; models, indexes and caches are shared)
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "4"))
+
+# Graph steps allowed per case; a case whose critic/refiner loop does not
+# converge fails with GraphRecursionError instead of holding a worker
+GRAPH_RECURSION_LIMIT = int(os.environ.get("GRAPH_RECURSION_LIMIT", "25"))
+
+# Accepted column names of the case fields
+_CASE_FIELDS = {
+    "case_id": ("case_id", "id"),
+    "query": ("query", "user_query"),
+    "subject_id": ("subject_id", "patient_id"),
+    "image": ("image", "image_path", "xray_image"),
+}
+
+
+def normalize_case(row: Dict[str, Any], line: int) -> Dict[str, Any]:
+    """A case from a JSONL/CSV row or request body; `line` names cases without a case_id."""
+    case = {}
+    for field, names in _CASE_FIELDS.items():
+        value = next((row[name] for name in names if row.get(name) not in (None, "")), None)
+        case[field] = str(value).strip() if value is not None else ""
+    if not case["case_id"]:
+        case["case_id"] = f"case-{line}"
+    return case
+
+
+def load_cases(path: str) -> List[Dict[str, str]]:
+    """
+    Read batch cases from a JSONL or CSV file (by extension).
+
+    Every case has a `query` and optionally `subject_id` (patient history),
+    `image` (chest X-ray path) and `case_id` (default "case-<line>").
+
+    Returns:
+        list: cases as dicts with case_id, query, subject_id and image
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ Batch file '{path}' not found.")
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(enumerate(csv.DictReader(f), start=2))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [(line, json.loads(text)) for line, text in enumerate(f, start=1) if text.strip()]
+    cases = [normalize_case(row, line) for line, row in rows]
+    ids = [case["case_id"] for case in cases]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"❌ Duplicate case IDs in '{path}'; every case needs its own graph thread.")
+    return cases
+
+
+def new_agent_state(report: str, query_context=None) -> AgentState:
+    """Initial graph state of the diagnostic workflow on a report"""
+    return AgentState(
+        input=report,
+        chat_history=[],
+        intermediate_steps=[],
+        output={},
+        plan=None,
+        reflection=None,
+        agent_role="planner",
+        agent_outcome=None,
+        query_context=query_context,
+        scratchpad=None
+    )
+
+
+def summarize_graph_output(graph_output: Optional[dict]) -> Dict[str, Any]:
+    """Diagnosis and quality score of a finished graph run"""
+    if not graph_output or not graph_output.get("output"):
+        return {"graph_diagnosis": None, "quality_score": 0}
+    reflection = graph_output.get("reflection") or {}
+    return {
+        "graph_diagnosis": graph_output["output"].get("answer", "No diagnosis available"),
+        "quality_score": reflection.get("metrics", {}).get("overall_score", 0),
+    }
+
+
+def run_case(runnable, case: Dict[str, str], on_token=None, thread_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run one case through the report pipeline and the compiled graph.
+
+    The case gets its own ReportSession and graph thread (`thread_id`, default
+    "case-<case_id>"), so cases can run concurrently. Errors are recorded in
+    the result, not raised.
+
+    Returns:
+        dict: the case, its diagnoses, the graph diagnosis and quality score,
+              latencies in seconds and the error, if any
+    """
+    start = time.perf_counter()
+    result: Dict[str, Any] = dict(case)
+    session = ReportSession(case["case_id"])
+    try:
+        if not case["query"]:
+            raise ValueError("Query cannot be empty!")
+        query_context = session.process_query(case["query"])
+        session.load_patient_history(case["subject_id"])
+        report = session.generate_combined_report(xray_image=case["image"], on_token=on_token)
+        result["report_seconds"] = time.perf_counter() - start
+
+        graph_start = time.perf_counter()
+        graph_output = runnable.invoke(new_agent_state(report, query_context),
+                                       {"configurable": {"thread_id": thread_id or f"case-{case['case_id']}"},
+                                        "recursion_limit": GRAPH_RECURSION_LIMIT})
+        result["graph_seconds"] = time.perf_counter() - graph_start
+        result.update(session.diagnosis_data)
+        result.update(summarize_graph_output(graph_output))
+        result["error"] = None
+    except Exception as e:
+        print(f"❌ Case {case['case_id']} failed: {e}")
+        result.update(session.diagnosis_data)
+        result["error"] = str(e)
+    result["latency_seconds"] = time.perf_counter() - start
+    result["timestamp"] = datetime.datetime.now().isoformat()
+    return result
+
+
+def run_batch(runnable, cases_path: str, output_path: Optional[str] = None,
+              workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Run every case of `cases_path` with `workers` concurrent cases.
+
+    Results are appended to `output_path` (JSONL, default
+    data/diagnosis_results/batch_<timestamp>.jsonl) as each case finishes, so a
+    partial run keeps its results. Progress is printed per case.
+
+    Returns:
+        dict: output path, case/failure counts, wall time, throughput and
+              per-case latency summary (seconds)
+    """
+    cases = load_cases(cases_path)
+    workers = max(1, workers or BATCH_WORKERS)
+    if output_path is None:
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = os.path.join(os.getcwd(), "data", "diagnosis_results", f"batch_{timestamp}.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    print(f"📋 Running {len(cases)} case(s) from '{cases_path}' with {workers} worker(s)")
+
+    latencies: List[float] = []
+    failed = 0
+    start = time.perf_counter()
+    with open(output_path, "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-case") as executor:
+        futures = [executor.submit(run_case, runnable, case) for case in cases]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            latencies.append(result["latency_seconds"])
+            failed += result["error"] is not None
+            elapsed = time.perf_counter() - start
+            status = "❌" if result["error"] else "✅"
+            print(f"{status} [{done}/{len(cases)}] {result['case_id']} in {result['latency_seconds']:.1f}s "
+                  f"| {done / elapsed * 60:.1f} cases/min")
+
+    seconds = time.perf_counter() - start
+    summary = {
+        "output": output_path,
+        "cases": len(cases),
+        "failed": failed,
+        "seconds": seconds,
+        "cases_per_minute": len(cases) / seconds * 60 if seconds else 0.0,
+        "latency": {k: v / 1000 for k, v in latency_summary([s * 1000 for s in latencies]).items()},
+    }
+    print(f"\n💾 Batch results saved to: {output_path}")
+    print(f"⏱ {len(cases) - failed}/{len(cases)} case(s) succeeded in {seconds:.1f}s "
+          f"({summary['cases_per_minute']:.1f} cases/min) | case latency: mean {summary['latency']['mean']:.1f}s, "
+          f"p50 {summary['latency']['p50']:.1f}s, p99 {summary['latency']['p99']:.1f}s")
+    return summary
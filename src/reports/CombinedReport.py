@@ -1,49 +1,10 @@
-import os
-from src.reports.ImageReport import process_xray_image
-from src.reports.TextReport import generate_final_diagnosis
-from src.models.LoadLLM import llm
+def _default_session():
+    # Imported lazily: the session is built on the helpers of this module
+    from src.reports.Session import default_session
+    return default_session
 
-# Initialize variables
-text_insights = None
-final_diagnosis_history = None
-final_combined_diagnosis = None
-final_diagnosis_explanation = None
-final_followup = None
-diagnosis_data = {}
-
-def generate_combined_report(query_text=None, xray_image=None, patient_history=None):
-    """
-    Generate a combined medical report using text and image data
-    
-    Args:
-        query_text (str): The clinical query text
-        xray_image (str): Path to X-ray image, if any
-        patient_history (str): Patient history text if available
-    """
-    global text_insights, final_diagnosis_history, final_combined_diagnosis
-    global final_diagnosis_explanation, final_followup, diagnosis_data
-    
-    # Initialize final_diagnosis_image with default value
-    final_diagnosis_image = "No image provided."
-    
-    # Process X-ray image if provided
-    if xray_image:
-        try:
-            _, final_diagnosis_image = process_xray_image(xray_image)
-            print(f"X-ray processed successfully: {xray_image}")
-        except Exception as e:
-            print(f"Error processing X-ray image: {str(e)}")
-            final_diagnosis_image = "Error processing X-ray image."
-    
-    # Generate text insights and diagnosis if we have a query
-    if query_text:
-        try:
-            final_diagnosis_history = generate_final_diagnosis(query_text, patient_history)
-            print("Generated final diagnosis from text and history")
-        except Exception as e:
-            print(f"Error generating diagnosis: {str(e)}")
-            final_diagnosis_history = "Error generating diagnosis."
-    
+def build_combined_messages(final_diagnosis_image, final_diagnosis_history):
+    """Chat messages of the prompt that combines the image and text diagnoses"""
     # Create combined diagnosis prompt
     combined_diagnosis_prompt = f"""
 You are a clinical diagnostic assistant.
@@ -58,10 +19,14 @@ Weight the contributions approximately as follows: 60% from image diagnosis (if
 Provide a fully integrated final diagnosis report.
 Write plainy and clearly. Do NOT incude symbols in the report.
 """
-    final_combined_diagnosis_message = [{"role": "user", "content": combined_diagnosis_prompt}]
-    final_combined_diagnosis = llm._call(final_combined_diagnosis_message)
-    print("\n✅ Final Combined Diagnosis (Image + Query+History):")
-    print(final_combined_diagnosis)
+    return [{"role": "user", "content": combined_diagnosis_prompt}]
+
+def finalize_combined_report(final_diagnosis_image, final_diagnosis_history, final_combined_diagnosis,
+                             text_insights=None, streamed=False):
+    """Print the combined diagnosis (unless streamed) and build the report text"""
+    if not streamed:
+        print("\n✅ Final Combined Diagnosis (Image + Query+History):")
+        print(final_combined_diagnosis)
 
     diagnosis_report = f"""
 ===============================
@@ -83,12 +48,55 @@ Combined Final Diagnosis:
 """.strip()
     print("\n📄 Diagnosis Report:")
     print(diagnosis_report)
+    return diagnosis_report
 
-    # Export diagnosis data to JSON file
-    diagnosis_data.update({
-        "image_diagnosis": final_diagnosis_image,
-        "diagnosis_with_history": final_diagnosis_history,
-        "combined_final_diagnosis": final_combined_diagnosis,
-    })
+def generate_combined_report(query_text=None, xray_image=None, patient_history=None, query_context=None,
+                             on_token=None):
+    """
+    Generate a combined medical report using text and image data
+    
+    Wrapper over `ReportSession.generate_combined_report` of the default session;
+    concurrent callers use a session each. The image branch (X-ray detection,
+    RAG search, summary) and the text branch (RAG search, diagnosis) are
+    independent and run concurrently as stages of a `StagePipeline`; the
+    combination prompt joins them. Stage timings and the critical path are
+    printed and kept in `report_timings`.
     
-    return diagnosis_report
\ No newline at end of file
+    Args:
+        query_text (str): The clinical query text
+        xray_image (str): Path to X-ray image, if any
+        patient_history (str): Patient history text if available
+        query_context (QueryContext): Prepared query from `process_query`, reused for retrieval
+        on_token (callable): Streams every LLM completion as on_token(section, token),
+            section being "image_diagnosis", "diagnosis_with_history" or
+            "combined_final_diagnosis"; the full report is still returned
+    """
+    return _default_session().generate_combined_report(query_text, xray_image, patient_history, query_context,
+                                                       on_token)
+
+async def agenerate_combined_report(query_text=None, xray_image=None, patient_history=None, query_context=None,
+                                    on_token=None):
+    """Awaitable `generate_combined_report`; every LLM call goes through the pooled async client."""
+    return await _default_session().agenerate_combined_report(query_text, xray_image, patient_history, query_context,
+                                                              on_token)
+
+def stream_combined_report(query_text=None, xray_image=None, patient_history=None, query_context=None):
+    """
+    Generator form of `generate_combined_report`: yields (section, token) as each
+    completion streams in, then ("done", diagnosis_report).
+    """
+    return _default_session().stream_combined_report(query_text, xray_image, patient_history, query_context)
+
+# Never set; kept for callers of the former module globals
+final_diagnosis_explanation = None
+final_followup = None
+
+# Session state formerly kept in module globals, read from the default session
+_SESSION_ATTRIBUTES = {
+    "text_insights", "final_diagnosis_history", "final_combined_diagnosis", "diagnosis_data", "report_timings",
+}
+
+def __getattr__(name):
+    if name in _SESSION_ATTRIBUTES:
+        return getattr(_default_session(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
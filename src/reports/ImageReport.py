@@ -1,11 +1,6 @@
 from src.imaging.DetectXRAY import detect_chest_xray
 from src.retrieval.Search import search
-from src.models.LoadLLM import llm
-
-# Initialize global variables
-xray_context = ""
-image_insights = ""
-final_diagnosis_image = "No image provided."
+from src.retrieval.ContextAssembler import assemble_context
 
 def get_xray_input():
     """
@@ -13,48 +8,83 @@ def get_xray_input():
     """
     return input("\n🖼️ Enter chest X‑ray image file path (or press Enter to skip): ").strip()
 
-def process_xray_image(xray_image=None):
+def retrieve_image_context(xray_image, context_budget=None):
+    """
+    Detect chest X-ray findings and retrieve their RAG context
+    
+    Returns:
+        tuple: (xray_context, image_context) - the findings line and the packed RAG context
+    """
+    # Process image and detect chest X‑ray findings
+    xray_results = detect_chest_xray(xray_image)
+    xray_context = "Chest X‑ray Findings: " + ", ".join(xray_results)
+    print("\n🔍 Chest X‑ray Detection Results:")
+    print(xray_context)
+    
+    # Retrieve image-specific context via RAG
+    _, image_rag_chunks = search(xray_context)
+    image_context = str(assemble_context(xray_context, image_rag_chunks, "image_report", context_budget))
+    # print("\n📦 Retrieved RAG Chunks for Image:")
+    # for idx, chunk in enumerate(image_rag_chunks):
+    #     print(f"Chunk {idx+1}: {chunk}\n")
+    print("Extracted image context from RAG")
+    return xray_context, image_context
+
+def build_image_insight_messages(image_context):
+    """Chat messages asking the LLM to summarize the image RAG context"""
+    # Extract key insights from image context
+    image_insights_prompt = f"""
+You are a clinical data assistant.
+Using the following chest X‑ray context from RAG results, summarize the key findings. Write plainy and clearly. Do NOT incude symbols in the report.:
+{image_context}
+"""
+    return [{"role": "user", "content": image_insights_prompt}]
+
+def _default_session():
+    # Imported lazily: the session is built on the helpers of this module
+    from src.reports.Session import default_session
+    return default_session
+
+def process_xray_image(xray_image=None, context_budget=None, on_token=None, use_cache=True):
     """
     Process an X-ray image and generate diagnosis
     
+    Wrapper over `ReportSession.process_xray_image` of the default session.
+    
     Args:
         xray_image (str): Path to the X-ray image. If None, will prompt user.
+        context_budget (int): Token budget of the RAG context in the prompt;
+            defaults to CONTEXT_BUDGETS["image_report"].
+        on_token (callable): Streams the summary as on_token("image_diagnosis", token)
+            instead of printing it once complete
+        use_cache (bool): Serve the summary of an identical findings context from
+            the LLM response cache
         
     Returns:
         tuple: (xray_context, final_diagnosis)
     """
-    global xray_context, image_insights, final_diagnosis_image
-    
     if xray_image is None:
         xray_image = get_xray_input()
-        
-    if xray_image:
-        # Process image and detect chest X‑ray findings
-        xray_results = detect_chest_xray(xray_image)
-        xray_context = "Chest X‑ray Findings: " + ", ".join(xray_results)
-        print("\n🔍 Chest X‑ray Detection Results:")
-        print(xray_context)
-        
-        # Retrieve image-specific context via RAG
-        image_context, image_rag_chunks = search(xray_context)
-        # print("\n📦 Retrieved RAG Chunks for Image:")
-        # for idx, chunk in enumerate(image_rag_chunks):
-        #     print(f"Chunk {idx+1}: {chunk}\n")
-        print("Extracted image context from RAG")
-        
-        # Extract key insights from image context
-        image_insights_prompt = f"""
-You are a clinical data assistant.
-Using the following chest X‑ray context from RAG results, summarize the key findings. Write plainy and clearly. Do NOT incude symbols in the report.:
-{image_context}
-"""
-        image_insight_message = [{"role": "user", "content": image_insights_prompt}]
-        final_diagnosis_image = llm._call(image_insight_message)
-        
-        print("\n✅ Final Image Diagnosis:")
-        print(final_diagnosis_image)
-    else:
-        xray_context = ""
-        final_diagnosis_image = "No image provided."
-        
-    return xray_context, final_diagnosis_image
\ No newline at end of file
+    return _default_session().process_xray_image(xray_image, context_budget, on_token, use_cache)
+
+async def aprocess_xray_image(xray_image, context_budget=None, on_token=None, use_cache=True):
+    """
+    Awaitable `process_xray_image`. Detection and retrieval run on a worker
+    thread; the image is never prompted for.
+    """
+    return await _default_session().aprocess_xray_image(xray_image, context_budget, on_token, use_cache)
+
+def stream_xray_image(xray_image, context_budget=None):
+    """
+    Generator form of `process_xray_image`: yields ("image_diagnosis", token)
+    as the summary streams in, then ("done", (xray_context, final_diagnosis)).
+    """
+    return _default_session().stream_xray_image(xray_image, context_budget)
+
+# Session state formerly kept in module globals, read from the default session
+_SESSION_ATTRIBUTES = {"xray_context", "image_insights", "final_diagnosis_image"}
+
+def __getattr__(name):
+    if name in _SESSION_ATTRIBUTES:
+        return getattr(_default_session(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
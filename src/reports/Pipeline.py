@@ -0,0 +1,159 @@
+import asyncio
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Report stages whose dependencies are met run concurrently on a thread pool (or as
+# asyncio tasks in `arun`). REPORT_CONCURRENCY=0 runs them one after another in
+# dependency order, which is the previous behaviour.
+REPORT_CONCURRENCY = os.environ.get("REPORT_CONCURRENCY", "1") != "0"
+
+
+class StageTiming:
+    """Start and end of a stage in seconds since the pipeline started."""
+
+    def __init__(self, name: str, start: float, end: float):
+        self.name = name
+        self.start = start
+        self.end = end
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "start": self.start, "end": self.end, "seconds": self.seconds}
+
+
+class PipelineRun:
+    """Results and timings of one pipeline run."""
+
+    def __init__(self, results: Dict[str, Any], timings: Dict[str, StageTiming],
+                 deps: Dict[str, Sequence[str]], seconds: float):
+        self.results = results
+        self.timings = timings
+        self.deps = deps
+        self.seconds = seconds
+
+    @property
+    def critical_path(self) -> List[str]:
+        """
+        Stages that determined the end-to-end latency: from the stage that
+        finished last, back through the dependency that finished last.
+        """
+        if not self.timings:
+            return []
+        path = [max(self.timings.values(), key=lambda t: t.end).name]
+        while self.deps[path[-1]]:
+            path.append(max(self.deps[path[-1]], key=lambda d: self.timings[d].end))
+        return path[::-1]
+
+    def report(self) -> str:
+        """One line per stage (start offset and duration) plus the critical path."""
+        critical = set(self.critical_path)
+        lines = [f"{'*' if t.name in critical else ' '} {t.name:<10} +{t.start:6.2f}s {t.seconds:7.2f}s"
+                 for t in sorted(self.timings.values(), key=lambda t: t.start)]
+        lines.append(f"  critical path: {' → '.join(self.critical_path)} ({self.seconds:.2f}s end to end)")
+        return "\n".join(lines)
+
+
+class StagePipeline:
+    """
+    A small DAG of report stages.
+
+    Each stage is a function of the results of the stages before it (a dict by
+    stage name) and runs as soon as all of its dependencies have finished, so
+    independent branches overlap. The first stage that raises stops the run
+    and its exception propagates once running stages have finished.
+    """
+
+    def __init__(self, concurrent: Optional[bool] = None):
+        self.concurrent = REPORT_CONCURRENCY if concurrent is None else concurrent
+        self._stages: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._deps: Dict[str, Sequence[str]] = {}
+
+    def add(self, name: str, fn: Callable[[Dict[str, Any]], Any], deps: Sequence[str] = ()) -> "StagePipeline":
+        """Add a stage; its dependencies must already be added."""
+        if name in self._stages:
+            raise ValueError(f"❌ Stage '{name}' is already defined.")
+        missing = [d for d in deps if d not in self._stages]
+        if missing:
+            raise ValueError(f"❌ Stage '{name}' depends on unknown stage(s): {', '.join(missing)}")
+        self._stages[name] = fn
+        self._deps[name] = tuple(deps)
+        return self
+
+    def _ready(self, done: Dict[str, Any], started: set) -> List[str]:
+        return [name for name in self._stages
+                if name not in started and all(d in done for d in self._deps[name])]
+
+    def run(self) -> PipelineRun:
+        """Run every stage, concurrently on threads where the DAG allows."""
+        origin = time.perf_counter()
+        results: Dict[str, Any] = {}
+        timings: Dict[str, StageTiming] = {}
+
+        def execute(name: str):
+            start = time.perf_counter() - origin
+            try:
+                return self._stages[name](results)
+            finally:
+                timings[name] = StageTiming(name, start, time.perf_counter() - origin)
+
+        if not self.concurrent:
+            # Insertion order is a topological order, since dependencies are added first.
+            for name in self._stages:
+                results[name] = execute(name)
+            return PipelineRun(results, timings, self._deps, time.perf_counter() - origin)
+
+        started: set = set()
+        with ThreadPoolExecutor(max_workers=max(1, len(self._stages)), thread_name_prefix="report-stage") as executor:
+            running = {}
+            while len(results) < len(self._stages):
+                for name in self._ready(results, started):
+                    started.add(name)
+                    running[executor.submit(execute, name)] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    # Raises the stage's exception; the executor waits for the running stages.
+                    results[name] = future.result()
+        return PipelineRun(results, timings, self._deps, time.perf_counter() - origin)
+
+    async def arun(self) -> PipelineRun:
+        """
+        Awaitable `run`: coroutine stages run as tasks on the current event loop,
+        plain functions on worker threads.
+        """
+        origin = time.perf_counter()
+        results: Dict[str, Any] = {}
+        timings: Dict[str, StageTiming] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def execute(name: str):
+            await asyncio.gather(*(tasks[d] for d in self._deps[name]))
+            start = time.perf_counter() - origin
+            try:
+                fn = self._stages[name]
+                if asyncio.iscoroutinefunction(fn):
+                    results[name] = await fn(results)
+                else:
+                    results[name] = await asyncio.to_thread(fn, results)
+            finally:
+                timings[name] = StageTiming(name, start, time.perf_counter() - origin)
+
+        if not self.concurrent:
+            for name in self._stages:
+                tasks[name] = asyncio.ensure_future(execute(name))
+                await tasks[name]
+        else:
+            for name in self._stages:
+                tasks[name] = asyncio.ensure_future(execute(name))
+            try:
+                await asyncio.gather(*tasks.values())
+            except BaseException:
+                for task in tasks.values():
+                    task.cancel()
+                raise
+        return PipelineRun(results, timings, self._deps, time.perf_counter() - origin)
@@ -0,0 +1,350 @@
+import asyncio
+import itertools
+
+from src.models.LoadLLM import llm
+from src.reports.CombinedReport import build_combined_messages, finalize_combined_report
+from src.reports.ImageReport import build_image_insight_messages, retrieve_image_context
+from src.reports.Pipeline import StagePipeline
+from src.reports.TextReport import (
+    _history_diagnosis_error,
+    _start_diagnosis,
+    build_diagnosis_messages,
+    finalize_diagnosis,
+    find_patient_history,
+    retrieve_clinical_context,
+)
+from src.retrieval.Search import build_query_context
+from src.utils.Streaming import iterate_tokens, streaming_section
+
+_session_ids = itertools.count(1)
+
+
+class ReportSession:
+    """
+    State of one patient's report: query, patient history, image and text
+    diagnoses, the combined report and its stage timings.
+
+    The models, indexes and caches behind it are shared by every session, so
+    many sessions can run concurrently in one process (one per case or request)
+    on the same warm models. The module-level functions of TextReport,
+    ImageReport and CombinedReport are wrappers over `default_session`.
+    """
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id if session_id is not None else f"session-{next(_session_ids)}"
+        # Query (process_query)
+        self.user_query = None
+        self.cleaned_query = None
+        self.query_embedding = None
+        self.query_context = None
+        # Patient history (load_patient_history)
+        self.patient_id = None
+        self.patient_history_text = ""
+        self.patient_history_available = False
+        # Image branch (process_xray_image)
+        self.xray_context = ""
+        self.image_insights = ""
+        self.final_diagnosis_image = "No image provided."
+        # Text branch (generate_final_diagnosis)
+        self.clinical_context_query = None
+        self.text_insights = None
+        self.final_diagnosis_history = None
+        # Combined report (generate_combined_report)
+        self.final_combined_diagnosis = None
+        self.diagnosis_report = None
+        self.diagnosis_data = {}
+        self.report_timings = None  # PipelineRun of the last report
+
+    def __repr__(self):
+        return f"ReportSession({self.session_id!r})"
+
+    def process_query(self, query_text):
+        """
+        Clean and embed the query once for every later search of the session
+
+        Returns:
+            QueryContext: cleaned text, tokens and embedding
+        """
+        self.user_query = query_text
+        self.query_context = build_query_context(query_text)
+        self.cleaned_query = self.query_context.cleaned
+        self.query_embedding = self.query_context.embedding_array()
+        return self.query_context
+
+    def load_patient_history(self, patient_id):
+        """
+        Look up the patient's history; an empty ID skips history integration
+
+        Returns:
+            tuple: (patient_history_text, patient_history_available)
+        """
+        self.patient_id = patient_id or None
+        self.patient_history_text, self.patient_history_available = find_patient_history(patient_id)
+        return self.patient_history_text, self.patient_history_available
+
+    # Image branch
+
+    def _image_started(self, xray_image):
+        if not xray_image:
+            self.xray_context = ""
+            self.final_diagnosis_image = "No image provided."
+            return False
+        return True
+
+    def _image_finished(self, on_token):
+        if on_token is None:
+            print("\n✅ Final Image Diagnosis:")
+            print(self.final_diagnosis_image)
+        return self.xray_context, self.final_diagnosis_image
+
+    def process_xray_image(self, xray_image, context_budget=None, on_token=None, use_cache=True):
+        """
+        Detect chest X-ray findings and summarize their RAG context
+
+        Args:
+            xray_image (str): Path to the X-ray image; empty when there is none
+            context_budget (int): Token budget of the RAG context in the prompt;
+                defaults to CONTEXT_BUDGETS["image_report"].
+            on_token (callable): Streams the summary as on_token("image_diagnosis", token)
+                instead of printing it once complete
+            use_cache (bool): Serve the summary of an identical findings context from
+                the LLM response cache
+
+        Returns:
+            tuple: (xray_context, final_diagnosis)
+        """
+        if not self._image_started(xray_image):
+            return self.xray_context, self.final_diagnosis_image
+        self.xray_context, image_context = retrieve_image_context(xray_image, context_budget)
+        with streaming_section(on_token, "image_diagnosis") as emit:
+            self.final_diagnosis_image = llm._call(build_image_insight_messages(image_context), on_token=emit,
+                                                   cache=use_cache)
+        return self._image_finished(on_token)
+
+    async def aprocess_xray_image(self, xray_image, context_budget=None, on_token=None, use_cache=True):
+        """Awaitable `process_xray_image`; detection and retrieval run on a worker thread."""
+        if not self._image_started(xray_image):
+            return self.xray_context, self.final_diagnosis_image
+        self.xray_context, image_context = await asyncio.to_thread(retrieve_image_context, xray_image, context_budget)
+        with streaming_section(on_token, "image_diagnosis") as emit:
+            self.final_diagnosis_image = await llm._acall(build_image_insight_messages(image_context), on_token=emit,
+                                                          cache=use_cache)
+        return self._image_finished(on_token)
+
+    def stream_xray_image(self, xray_image, context_budget=None):
+        """
+        Generator form of `process_xray_image`: yields ("image_diagnosis", token)
+        as the summary streams in, then ("done", (xray_context, final_diagnosis)).
+        """
+        return iterate_tokens(lambda on_token: self.process_xray_image(xray_image, context_budget, on_token))
+
+    # Text branch
+
+    def _text_inputs(self, query_text, patient_history_text, query_context):
+        # Arguments left out fall back to what the session has collected
+        if query_text is None and query_context is None:
+            query_text, query_context = self.user_query, self.query_context
+        if patient_history_text is None:
+            patient_history_text = self.patient_history_text
+        return query_text, patient_history_text, query_context
+
+    def generate_final_diagnosis(self, query_text=None, patient_history_text=None, query_context=None,
+                                 context_budget=None, on_token=None):
+        """
+        Generate the final diagnosis, incorporating patient history if available
+
+        A `query_context` is searched directly when there is no patient history,
+        so the query is not cleaned and embedded a second time. The retrieved
+        clinical context is packed into `context_budget` tokens (default
+        CONTEXT_BUDGETS["text_report"]). With `on_token` the diagnosis is
+        streamed as on_token("diagnosis_with_history", token).
+        """
+        query_text, patient_history_text, query_context = self._text_inputs(
+            query_text, patient_history_text, query_context)
+        query_text = _start_diagnosis(query_text, patient_history_text, query_context)
+        self.final_diagnosis_history = ""
+        try:
+            self.clinical_context_query = retrieve_clinical_context(query_text, patient_history_text, query_context,
+                                                                    context_budget)
+            with streaming_section(on_token, "diagnosis_with_history") as emit:
+                response = llm._call(build_diagnosis_messages(query_text, patient_history_text,
+                                                              self.clinical_context_query), on_token=emit)
+            self.final_diagnosis_history = finalize_diagnosis(response, patient_history_text, on_token is not None)
+        except Exception as e:
+            if not patient_history_text:
+                raise
+            self.final_diagnosis_history = _history_diagnosis_error(e)
+        return self.final_diagnosis_history
+
+    async def agenerate_final_diagnosis(self, query_text=None, patient_history_text=None, query_context=None,
+                                        context_budget=None, on_token=None):
+        """Awaitable `generate_final_diagnosis`; retrieval runs on a worker thread."""
+        query_text, patient_history_text, query_context = self._text_inputs(
+            query_text, patient_history_text, query_context)
+        query_text = _start_diagnosis(query_text, patient_history_text, query_context)
+        self.final_diagnosis_history = ""
+        try:
+            self.clinical_context_query = await asyncio.to_thread(
+                retrieve_clinical_context, query_text, patient_history_text, query_context, context_budget
+            )
+            with streaming_section(on_token, "diagnosis_with_history") as emit:
+                response = await llm._acall(build_diagnosis_messages(query_text, patient_history_text,
+                                                                     self.clinical_context_query), on_token=emit)
+            self.final_diagnosis_history = finalize_diagnosis(response, patient_history_text, on_token is not None)
+        except Exception as e:
+            if not patient_history_text:
+                raise
+            self.final_diagnosis_history = _history_diagnosis_error(e)
+        return self.final_diagnosis_history
+
+    def stream_final_diagnosis(self, query_text=None, patient_history_text=None, query_context=None,
+                               context_budget=None):
+        """
+        Generator form of `generate_final_diagnosis`: yields ("diagnosis_with_history", token)
+        as the diagnosis streams in, then ("done", final_diagnosis).
+        """
+        return iterate_tokens(lambda on_token: self.generate_final_diagnosis(
+            query_text, patient_history_text, query_context, context_budget, on_token))
+
+    # Combined report
+
+    def _image_branch(self, xray_image, on_token=None):
+        # Process X-ray image if provided
+        if not xray_image:
+            return "No image provided."
+        try:
+            _, final_diagnosis_image = self.process_xray_image(xray_image, on_token=on_token)
+            print(f"X-ray processed successfully: {xray_image}")
+            return final_diagnosis_image
+        except Exception as e:
+            print(f"Error processing X-ray image: {str(e)}")
+            return "Error processing X-ray image."
+
+    def _text_branch(self, query_text, patient_history, query_context, on_token=None):
+        # Generate text insights and diagnosis if we have a query
+        if not query_text:
+            return self.final_diagnosis_history
+        try:
+            diagnosis = self.generate_final_diagnosis(query_text, patient_history, query_context, on_token=on_token)
+            print("Generated final diagnosis from text and history")
+            return diagnosis
+        except Exception as e:
+            print(f"Error generating diagnosis: {str(e)}")
+            return "Error generating diagnosis."
+
+    async def _aimage_branch(self, xray_image, on_token=None):
+        if not xray_image:
+            return "No image provided."
+        try:
+            _, final_diagnosis_image = await self.aprocess_xray_image(xray_image, on_token=on_token)
+            print(f"X-ray processed successfully: {xray_image}")
+            return final_diagnosis_image
+        except Exception as e:
+            print(f"Error processing X-ray image: {str(e)}")
+            return "Error processing X-ray image."
+
+    async def _atext_branch(self, query_text, patient_history, query_context, on_token=None):
+        if not query_text:
+            return self.final_diagnosis_history
+        try:
+            diagnosis = await self.agenerate_final_diagnosis(query_text, patient_history, query_context,
+                                                             on_token=on_token)
+            print("Generated final diagnosis from text and history")
+            return diagnosis
+        except Exception as e:
+            print(f"Error generating diagnosis: {str(e)}")
+            return "Error generating diagnosis."
+
+    def _report_inputs(self, query_text, patient_history, query_context):
+        # Arguments left out fall back to what the session has collected
+        if query_text is None:
+            query_text = self.user_query
+        if patient_history is None:
+            patient_history = self.patient_history_text
+        if query_context is None and query_text == self.user_query:
+            query_context = self.query_context
+        return query_text, patient_history, query_context
+
+    def _finish_pipeline(self, run, on_token):
+        self.final_diagnosis_history = run.results["text"]
+        self.final_combined_diagnosis = run.results["combine"]
+        self.report_timings = run
+        print("\n⏱ Report stages (* = critical path):")
+        print(run.report())
+        final_diagnosis_image = run.results["image"]
+        self.diagnosis_report = finalize_combined_report(final_diagnosis_image, self.final_diagnosis_history,
+                                                         self.final_combined_diagnosis, self.text_insights,
+                                                         on_token is not None)
+        # Export diagnosis data to JSON file
+        self.diagnosis_data.update({
+            "image_diagnosis": final_diagnosis_image,
+            "diagnosis_with_history": self.final_diagnosis_history,
+            "combined_final_diagnosis": self.final_combined_diagnosis,
+        })
+        return self.diagnosis_report
+
+    def generate_combined_report(self, query_text=None, xray_image=None, patient_history=None, query_context=None,
+                                 on_token=None):
+        """
+        Generate a combined medical report using text and image data
+
+        The image branch (X-ray detection, RAG search, summary) and the text
+        branch (RAG search, diagnosis) run concurrently as stages of a
+        `StagePipeline`; the combination prompt joins them. Stage timings and
+        the critical path are printed and kept in `report_timings`.
+
+        Args:
+            query_text (str): The clinical query text; defaults to the session's query
+            xray_image (str): Path to X-ray image, if any
+            patient_history (str): Patient history text; defaults to the session's history
+            query_context (QueryContext): Prepared query from `process_query`, reused for retrieval
+            on_token (callable): Streams every LLM completion as on_token(section, token),
+                section being "image_diagnosis", "diagnosis_with_history" or
+                "combined_final_diagnosis"; the full report is still returned
+
+        Returns:
+            str: The diagnosis report; `diagnosis_data` holds its sections
+        """
+        query_text, patient_history, query_context = self._report_inputs(query_text, patient_history, query_context)
+
+        def combine(results):
+            with streaming_section(on_token, "combined_final_diagnosis") as emit:
+                return llm._call(build_combined_messages(results["image"], results["text"]), on_token=emit)
+
+        pipeline = (
+            StagePipeline()
+            .add("image", lambda results: self._image_branch(xray_image, on_token))
+            .add("text", lambda results: self._text_branch(query_text, patient_history, query_context, on_token))
+            .add("combine", combine, deps=("image", "text"))
+        )
+        return self._finish_pipeline(pipeline.run(), on_token)
+
+    async def agenerate_combined_report(self, query_text=None, xray_image=None, patient_history=None,
+                                        query_context=None, on_token=None):
+        """Awaitable `generate_combined_report`; every LLM call goes through the pooled async client."""
+        query_text, patient_history, query_context = self._report_inputs(query_text, patient_history, query_context)
+
+        async def image(results):
+            return await self._aimage_branch(xray_image, on_token)
+
+        async def text(results):
+            return await self._atext_branch(query_text, patient_history, query_context, on_token)
+
+        async def combine(results):
+            with streaming_section(on_token, "combined_final_diagnosis") as emit:
+                return await llm._acall(build_combined_messages(results["image"], results["text"]), on_token=emit)
+
+        pipeline = StagePipeline().add("image", image).add("text", text).add("combine", combine, deps=("image", "text"))
+        return self._finish_pipeline(await pipeline.arun(), on_token)
+
+    def stream_combined_report(self, query_text=None, xray_image=None, patient_history=None, query_context=None):
+        """
+        Generator form of `generate_combined_report`: yields (section, token) as each
+        completion streams in, then ("done", diagnosis_report).
+        """
+        return iterate_tokens(lambda on_token: self.generate_combined_report(
+            query_text, xray_image, patient_history, query_context, on_token))
+
+
+# Session behind the module-level report functions (one interactive case per process)
+default_session = ReportSession("default")
@@ -1,9 +1,5 @@
-from src.retrieval.Search import (
-    search,
-    clean_query, 
-    compute_query_embedding
-)
-from src.models.LoadLLM import llm
+from src.retrieval.Search import search
+from src.retrieval.ContextAssembler import assemble_context
 from src.retrieval.DataLoader import df_history
 
 def get_user_query():
@@ -13,116 +9,169 @@ def get_user_query():
         raise ValueError("❌ Query cannot be empty!")
     return user_query
 
-# Initialize these variables when module is imported
-user_query = None
-cleaned_query = None
-query_embedding = None
+def get_patient_id():
+    """Ask for the patient ID whose history is integrated (empty to skip)"""
+    return input("\n🔍 Enter Patient ID (for history integration, or press Enter to skip): ").strip()
 
-# These will be set when process_query is called
-def process_query(query_text):
-    """Process a user query and prepare it for search"""
-    global user_query, cleaned_query, query_embedding
-    user_query = query_text
-    cleaned_query = clean_query(user_query)
-    query_embedding = compute_query_embedding(cleaned_query)
+def find_patient_history(patient_id):
+    """
+    Look up a patient's history text
+    
+    Returns:
+        tuple: (patient_history_text, patient_history_available)
+    """
+    if not patient_id:
+        return "", False
+    try:
+        patient_rows = df_history[df_history["subject_id"] == int(patient_id)]
+        if patient_rows.empty:
+            print(f"⚠ No history found for patient {patient_id}.")
+            return "", False
+        # Get the patient history text
+        print("✅ Patient history retrieved from history FAISS index.")
+        return str(patient_rows["combined_text"].iloc[0]), True
+    except Exception as e:
+        print(f"⚠ Failed to retrieve history for patient {patient_id}: {e}")
+        return "", False
 
-# Global variables for patient history
-patient_history_text = ""
-patient_history_available = False
+def _default_session():
+    # Imported lazily: the session is built on the helpers of this module
+    from src.reports.Session import default_session
+    return default_session
+
+def process_query(query_text):
+    """
+    Process a user query and prepare it for search.
+    
+    Wrapper over the default `ReportSession`; concurrent callers use a session each.
+    
+    Returns:
+        QueryContext: cleaned text, tokens and embedding, reusable by
+        `generate_final_diagnosis`, `search` and the agent's search tool
+    """
+    return _default_session().process_query(query_text)
 
 def get_patient_history():
-    """Get patient history if provided"""
-    global patient_history_text, patient_history_available
+    """Get patient history if provided (kept by the default `ReportSession`)"""
+    session = _default_session()
     
     # If we already have patient history, return it
-    if patient_history_available:
-        return patient_history_text, patient_history_available
-    
-    patient_history_text = ""
-    patient_history_available = False
-    patient_id = input("\n🔍 Enter Patient ID (for history integration, or press Enter to skip): ").strip()
-    if patient_id:
-        try:
-            patient_rows = df_history[df_history["subject_id"] == int(patient_id)]
-            if patient_rows.empty:
-                print(f"⚠ No history found for patient {patient_id}.")
-            else:
-                # Get the patient history text
-                patient_history_text = str(patient_rows["combined_text"].iloc[0])
-                patient_history_available = True
-                print("✅ Patient history retrieved from history FAISS index.")
-        except Exception as e:
-            print(f"⚠ Failed to retrieve history for patient {patient_id}: {e}")
-            
-    return patient_history_text, patient_history_available
-
-def generate_final_diagnosis(query_text=None, patient_history_text=None):
-    """Generate final diagnosis incorporating patient history if available"""
-    global user_query, text_insights, clinical_context_query, final_diagnosis_history
+    if session.patient_history_available:
+        return session.patient_history_text, session.patient_history_available
+    return session.load_patient_history(get_patient_id())
+
+def _start_diagnosis(query_text, patient_history_text, query_context):
+    if query_text is None and query_context is not None:
+        query_text = query_context.text
     
     print(f"📋 Starting diagnosis generation with query: '{query_text}'")
     print(f"📋 Patient history available: {'Yes' if patient_history_text else 'No'}")
-                
-    # Process patient history insights if available
-    final_diagnosis_history = ""
+    return query_text
+
+def retrieve_clinical_context(query_text, patient_history_text=None, query_context=None, context_budget=None):
+    """
+    Retrieve the clinical RAG context of the diagnosis prompt.
     
+    With patient history the query and history are searched together; otherwise
+    a `query_context` from `process_query` is searched directly, so the query is
+    not cleaned and embedded a second time. The chunks are packed into
+    `context_budget` tokens (default CONTEXT_BUDGETS["text_report"]).
+    """
     if patient_history_text:
-        try:
-            # Get clinical context through search
-            print("🔍 Searching for clinical context with patient history...")
-            clinical_context_query, _ = search(f"User Query: {query_text}. Patient History: {patient_history_text}")
-            
-            # Generate insights from patient history
-            print("📝 Generating diagnosis with history...")
-            diagnosis_prompt_history = f"""
+        # Get clinical context through search
+        print("🔍 Searching for clinical context with patient history...")
+        _, rag_chunks = search(f"User Query: {query_text}. Patient History: {patient_history_text}")
+    else:
+        _, rag_chunks = search(query_context if query_context is not None else f"User Query: {query_text}")
+    return str(assemble_context(query_text, rag_chunks, "text_report", context_budget))
+
+def build_diagnosis_messages(query_text, patient_history_text, clinical_context):
+    """Chat messages of the final diagnosis prompt, with or without patient history"""
+    if patient_history_text:
+        # Generate insights from patient history
+        print("📝 Generating diagnosis with history...")
+        diagnosis_prompt_history = f"""
 You are a clinical diagnostic assistant.
 Using the following information:
 - Preliminary Diagnosis from Query: {query_text}
 - Patient History: {patient_history_text}
-- Minimal Clinical Context: {clinical_context_query}
+- Minimal Clinical Context: {clinical_context}
 Provide a final, concise, and evidence‑based diagnosis that synthesizes all the information.
 Let's think step by step.
 """
-
-            insights_message = [{"role": "user", "content": diagnosis_prompt_history}]
-            # print(insights_message)
-            final_diagnosis_history = llm._call(insights_message)
-            print("\n✅ Final Diagnosis with Query + History:")
-            print(final_diagnosis_history)
-        except Exception as e:
-            print(f"❌ Error in diagnosis with history: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            final_diagnosis_history = "Could not generate diagnosis with history due to an error."
-    
     else:
-        
-        clinical_context_query, _ = search(f"User Query: {query_text}")
         diagnosis_prompt_history = f"""
 You are a clinical diagnostic assistant.
 Based on the preliminary diagnosis:
 {query_text}
 and the minimal clinical context:
-{clinical_context_query}
+{clinical_context}
 Provide a concise and clear final diagnosis.
 Let's think step by step.
 """
-    
-        diagnosis_message = [{"role": "user", "content": diagnosis_prompt_history}]
-        final_diagnosis_history = llm._call(diagnosis_message)
-        if "don't have any information" in final_diagnosis_history.lower() or not final_diagnosis_history.strip():
-            final_diagnosis_history = (
-                "Based on the current clinical context and patient history, there is insufficient evidence to reach a definitive diagnosis. Further evaluation is recommended."
-            )
+    return [{"role": "user", "content": diagnosis_prompt_history}]
+
+def finalize_diagnosis(response, patient_history_text, streamed=False):
+    """
+    Apply the no-information fallback (query-only diagnoses) and print the result,
+    unless it was `streamed` to the caller already (a replaced response is still printed).
+    """
+    if patient_history_text:
+        if not streamed:
+            print("\n✅ Final Diagnosis with Query + History:")
+            print(response)
+        return response
+    if "don't have any information" in response.lower() or not response.strip():
+        response = (
+            "Based on the current clinical context and patient history, there is insufficient evidence to reach a definitive diagnosis. Further evaluation is recommended."
+        )
+        streamed = False
+    if not streamed:
         print("\n✅ Final Diagnosis with Query:")
-        print(final_diagnosis_history)
-        
-    return final_diagnosis_history
-
-# Initialize global variables
-user_query = None
-cleaned_query = None
-query_embedding = None
-clinical_context_query = None
-text_insights = None
-final_diagnosis_history = None
\ No newline at end of file
+        print(response)
+    return response
+
+def _history_diagnosis_error(e):
+    print(f"❌ Error in diagnosis with history: {str(e)}")
+    import traceback
+    traceback.print_exc()
+    return "Could not generate diagnosis with history due to an error."
+
+def generate_final_diagnosis(query_text=None, patient_history_text=None, query_context=None, context_budget=None,
+                             on_token=None):
+    """
+    Generate final diagnosis incorporating patient history if available.
+    
+    Wrapper over `ReportSession.generate_final_diagnosis` of the default session.
+    A `query_context` from `process_query` is searched directly when there is
+    no patient history, so the query is not cleaned and embedded a second time.
+    The retrieved clinical context is packed into `context_budget` tokens
+    (default CONTEXT_BUDGETS["text_report"]). With `on_token` the diagnosis is
+    streamed as on_token("diagnosis_with_history", token).
+    """
+    return _default_session().generate_final_diagnosis(query_text, patient_history_text, query_context,
+                                                       context_budget, on_token)
+
+async def agenerate_final_diagnosis(query_text=None, patient_history_text=None, query_context=None, context_budget=None,
+                                    on_token=None):
+    """Awaitable `generate_final_diagnosis`; retrieval runs on a worker thread."""
+    return await _default_session().agenerate_final_diagnosis(query_text, patient_history_text, query_context,
+                                                              context_budget, on_token)
+
+def stream_final_diagnosis(query_text=None, patient_history_text=None, query_context=None, context_budget=None):
+    """
+    Generator form of `generate_final_diagnosis`: yields ("diagnosis_with_history", token)
+    as the diagnosis streams in, then ("done", final_diagnosis).
+    """
+    return _default_session().stream_final_diagnosis(query_text, patient_history_text, query_context, context_budget)
+
+# Session state formerly kept in module globals, read from the default session
+_SESSION_ATTRIBUTES = {
+    "user_query", "cleaned_query", "query_embedding", "query_context", "patient_history_text",
+    "patient_history_available", "clinical_context_query", "text_insights", "final_diagnosis_history",
+}
+
+def __getattr__(name):
+    if name in _SESSION_ATTRIBUTES:
+        return getattr(_default_session(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
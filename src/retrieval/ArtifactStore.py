@@ -0,0 +1,248 @@
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+import numpy as np
+from langchain_core.documents import Document
+
+from src.retrieval.BM25Index import BM25Index
+from src.retrieval.Dedup import MINHASH_PERMUTATIONS, SHINGLE_SIZE, minhash_signatures
+
+# On-disk layout of a retrieval artifact directory.
+#   manifest.json                 format version, build id, corpus and BM25 statistics
+#   texts.bin / text_offsets.npy  UTF-8 chunk texts, N + 1 byte offsets
+#   metadata.bin / metadata_offsets.npy   JSON chunk metadata, N + 1 byte offsets
+#   bm25_terms.bin / bm25_term_offsets.npy   sorted vocabulary
+#   bm25_*.npy                    CSR postings, idf, document lengths and norms
+#   minhash.npy                   (N, num_perm) uint32 MinHash signatures for near-duplicate suppression
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+class MappedStrings(Sequence[str]):
+    """Read-only sequence of UTF-8 strings stored back to back in a memory-mapped blob."""
+
+    def __init__(self, blob_path: str, offsets_path: str):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        self._file = open(blob_path, "rb")
+        # mmap refuses empty files; an empty blob only happens for all-empty strings.
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._blob[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+
+class SortedVocab:
+    """Dict-like term -> id lookup by binary search over a sorted, memory-mapped term list."""
+
+    def __init__(self, terms: MappedStrings):
+        self.terms = terms
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def get(self, term: str, default=None) -> Optional[int]:
+        i = bisect.bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return i
+        return default
+
+
+class ChunkStore(Sequence[Document]):
+    """
+    Lazily materialised view over the persisted chunks.
+
+    Indexing returns a `Document` just like the unpickled `chunks.pkl` list did,
+    but only the requested chunk is ever read from disk.
+    """
+
+    def __init__(self, texts: MappedStrings, metadata: MappedStrings):
+        self.texts = texts
+        self.metadata = metadata
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return Document(page_content=self.texts[i], metadata=json.loads(self.metadata[i]))
+
+    def __iter__(self) -> Iterator[Document]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def text(self, i: int) -> str:
+        """Return only the text of chunk `i`, skipping metadata decoding."""
+        return self.texts[i]
+
+
+class RetrievalArtifacts:
+    """Handle to an opened artifact directory."""
+
+    def __init__(self, path: str, manifest: Dict[str, Any], chunks: ChunkStore, bm25: BM25Index,
+                 minhash: Optional[np.ndarray] = None):
+        self.path = path
+        self.manifest = manifest
+        self.chunks = chunks
+        self.bm25 = bm25
+        self.minhash = minhash
+
+    @property
+    def version(self) -> str:
+        return self.manifest["build_id"]
+
+
+def _write_strings(strings: Iterable[str], blob_path: str, offsets_path: str, digest=None) -> int:
+    offsets = [0]
+    with open(blob_path, "wb") as f:
+        for s in strings:
+            data = s.encode("utf-8")
+            f.write(data)
+            if digest is not None:
+                digest.update(data)
+                digest.update(b"\0")
+            offsets.append(offsets[-1] + len(data))
+    np.save(offsets_path, np.asarray(offsets, dtype=np.int64))
+    return len(offsets) - 1
+
+
+def has_artifacts(path: str) -> bool:
+    """Check whether `path` holds a complete artifact directory."""
+    return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def build_artifacts(
+    chunks: Sequence[Any],
+    output_dir: str,
+    k1: float = 1.5,
+    b: float = 0.75,
+    epsilon: float = 0.25,
+    num_perm: int = MINHASH_PERMUTATIONS,
+    shingle_size: int = SHINGLE_SIZE,
+    bm25: Optional[BM25Index] = None,
+    signatures: Optional[np.ndarray] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Write chunk texts, metadata, BM25 statistics and MinHash signatures to `output_dir`.
+
+    The directory is assembled next to the target and swapped in at the end,
+    so readers never observe a half-written build.
+
+    Args:
+        chunks: Objects with `page_content` and `metadata` (e.g. the contents of chunks.pkl)
+        output_dir (str): Destination directory
+        bm25 (BM25Index): Precomputed index over `chunks` (e.g. a shard of a larger corpus)
+            written instead of one built from the texts
+        signatures (np.ndarray): Precomputed MinHash signatures aligned with `chunks`
+        extra (dict): Additional manifest entries
+
+    Returns:
+        dict: The written manifest
+    """
+    staging_dir = f"{output_dir.rstrip(os.sep)}.tmp"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    texts = [chunk.page_content for chunk in chunks]
+    digest = hashlib.sha1()
+    _write_strings(texts, os.path.join(staging_dir, "texts.bin"),
+                   os.path.join(staging_dir, "text_offsets.npy"), digest)
+    _write_strings((json.dumps(getattr(chunk, "metadata", {}) or {}, default=str) for chunk in chunks),
+                   os.path.join(staging_dir, "metadata.bin"), os.path.join(staging_dir, "metadata_offsets.npy"))
+
+    if bm25 is None:
+        bm25 = BM25Index.from_tokenized((text.split() for text in texts), k1=k1, b=b, epsilon=epsilon)
+    write_bm25(bm25, staging_dir)
+    if signatures is None:
+        signatures = minhash_signatures(texts, num_perm, shingle_size)
+    np.save(os.path.join(staging_dir, "minhash.npy"), np.asarray(signatures, dtype=np.uint32))
+
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "build_id": digest.hexdigest()[:16],
+        "created_at": datetime.datetime.now().isoformat(),
+        "n_chunks": len(texts),
+        "bm25": {"k1": bm25.k1, "b": bm25.b, "epsilon": epsilon, "avgdl": bm25.avgdl, "n_terms": len(bm25.vocab)},
+        "minhash": {"num_perm": int(signatures.shape[1]), "shingle_size": shingle_size},
+        **(extra or {}),
+    }
+    with open(os.path.join(staging_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.replace(staging_dir, output_dir)
+    return manifest
+
+
+def write_bm25(bm25: BM25Index, output_dir: str) -> None:
+    """Persist a BM25Index with its vocabulary re-numbered in sorted term order."""
+    terms: List[str] = sorted(bm25.vocab, key=bm25.vocab.get)
+    order = sorted(range(len(terms)), key=terms.__getitem__)
+    _write_strings((terms[i] for i in order), os.path.join(output_dir, "bm25_terms.bin"),
+                   os.path.join(output_dir, "bm25_term_offsets.npy"))
+
+    lengths = np.diff(bm25.indptr)[order]
+    indptr = np.zeros(len(order) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(lengths)
+    # Position of every postings entry in the old layout, in new (sorted-term) order.
+    gather = np.arange(indptr[-1], dtype=np.int64) + np.repeat(np.asarray(bm25.indptr)[order] - indptr[:-1], lengths)
+
+    np.save(os.path.join(output_dir, "bm25_indptr.npy"), indptr)
+    np.save(os.path.join(output_dir, "bm25_doc_ids.npy"), np.asarray(bm25.doc_ids)[gather])
+    np.save(os.path.join(output_dir, "bm25_term_freqs.npy"), np.asarray(bm25.term_freqs)[gather])
+    np.save(os.path.join(output_dir, "bm25_idf.npy"), np.asarray(bm25.idf)[order])
+    np.save(os.path.join(output_dir, "bm25_doc_len.npy"), np.asarray(bm25.doc_len))
+    np.save(os.path.join(output_dir, "bm25_norm.npy"), np.asarray(bm25.norm))
+
+
+def open_bm25(path: str, k1: float, b: float, avgdl: float) -> BM25Index:
+    """Open a persisted BM25Index; every array is memory-mapped, nothing is scanned."""
+    def load(name):
+        return np.load(os.path.join(path, f"bm25_{name}.npy"), mmap_mode="r")
+
+    vocab = SortedVocab(MappedStrings(os.path.join(path, "bm25_terms.bin"),
+                                      os.path.join(path, "bm25_term_offsets.npy")))
+    return BM25Index(vocab, load("indptr"), load("doc_ids"), load("term_freqs"), load("doc_len"),
+                     load("idf"), avgdl, k1=k1, b=b, norm=load("norm"))
+
+
+def open_artifacts(path: str) -> RetrievalArtifacts:
+    """
+    Memory-map an artifact directory written by `build_artifacts`.
+
+    Opening cost is independent of corpus size: only the manifest is parsed and
+    pages are faulted in (and shared between processes) as queries touch them.
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(
+            f"❌ Unsupported retrieval artifact format {manifest.get('format_version')} in '{path}'. "
+            "Rebuild with `python -m scripts.build_retrieval_artifacts`."
+        )
+
+    chunks = ChunkStore(
+        MappedStrings(os.path.join(path, "texts.bin"), os.path.join(path, "text_offsets.npy")),
+        MappedStrings(os.path.join(path, "metadata.bin"), os.path.join(path, "metadata_offsets.npy")),
+    )
+    stats = manifest["bm25"]
+    bm25 = open_bm25(path, stats["k1"], stats["b"], stats["avgdl"])
+    # Directories built before signatures were added simply have none.
+    minhash = np.load(os.path.join(path, "minhash.npy"), mmap_mode="r") if "minhash" in manifest else None
+    return RetrievalArtifacts(path, manifest, chunks, bm25, minhash)
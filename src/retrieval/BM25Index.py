@@ -0,0 +1,205 @@
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+def top_k_by_score(ids: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The `k` best (id, score) pairs by descending score, ties broken by ascending id.
+
+    Deterministic tie-breaking makes the top-k of a partitioned corpus (segments,
+    shards) identical to the top-k of one index over the same documents.
+    """
+    if len(ids) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        better = np.flatnonzero(scores > kth)
+        tied = np.flatnonzero(scores == kth)
+        tied = tied[np.argsort(ids[tied], kind="stable")][:k - len(better)]
+        keep = np.concatenate([better, tied])
+        ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))
+    return ids[order], scores[order]
+
+
+class BM25Index:
+    """
+    Okapi BM25 backed by a precomputed inverted index.
+
+    Postings are stored in CSR layout: the postings of term `t` are
+    `doc_ids[indptr[t]:indptr[t + 1]]` (sorted ascending) with matching term
+    frequencies in `term_freqs`. Only documents that contain a query term are
+    ever touched, so scoring cost follows the postings length instead of the
+    corpus size.
+
+    Scores are bit-for-bit identical to `rank_bm25.BM25Okapi.get_scores`
+    (same idf floor, same length normalisation, same per-term summation order).
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_len: np.ndarray,
+        idf: np.ndarray,
+        avgdl: float,
+        k1: float = 1.5,
+        b: float = 0.75,
+        norm: Optional[np.ndarray] = None,
+    ):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_len = doc_len
+        self.idf = idf
+        self.avgdl = avgdl
+        self.k1 = k1
+        self.b = b
+        self.corpus_size = len(doc_len)
+        # Per-document length normalisation, evaluated exactly as BM25Okapi does.
+        # Persisted indexes pass it in precomputed so opening stays O(1).
+        if norm is None:
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+        self.norm = norm
+
+    @classmethod
+    def from_tokenized(
+        cls,
+        tokenized_corpus: Iterable[Sequence[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ) -> "BM25Index":
+        """Build the inverted index from an already tokenized corpus."""
+        vocab: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        doc_len: List[int] = []
+
+        for doc_id, document in enumerate(tokenized_corpus):
+            doc_len.append(len(document))
+            frequencies: Dict[str, int] = {}
+            for word in document:
+                frequencies[word] = frequencies.get(word, 0) + 1
+            for word, freq in frequencies.items():
+                term_id = vocab.get(word)
+                if term_id is None:
+                    term_id = vocab[word] = len(postings)
+                    postings.append([])
+                postings[term_id].append((doc_id, freq))
+
+        if not doc_len:
+            raise ValueError("❌ Cannot build a BM25 index from an empty corpus.")
+
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in postings])
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        term_freqs = np.empty(indptr[-1], dtype=np.int32)
+        for term_id, plist in enumerate(postings):
+            start, end = indptr[term_id], indptr[term_id + 1]
+            doc_ids[start:end] = [d for d, _ in plist]
+            term_freqs[start:end] = [f for _, f in plist]
+
+        doc_len_arr = np.asarray(doc_len, dtype=np.int64)
+        corpus_size = len(doc_len_arr)
+        avgdl = int(doc_len_arr.sum()) / corpus_size
+        idf = cls.compute_idf(np.diff(indptr), corpus_size, epsilon)
+        return cls(vocab, indptr, doc_ids, term_freqs, doc_len_arr, idf, avgdl, k1=k1, b=b)
+
+    @staticmethod
+    def compute_idf(doc_freqs: np.ndarray, corpus_size: int, epsilon: float = 0.25) -> np.ndarray:
+        """ATIRE idf with BM25Okapi's `epsilon * average_idf` floor for negative values."""
+        idf = np.array(
+            [math.log(corpus_size - freq + 0.5) - math.log(freq + 0.5) for freq in doc_freqs.tolist()],
+            dtype=np.float64,
+        )
+        if len(idf):
+            # Same left-to-right summation as BM25Okapi so the floor matches exactly.
+            average_idf = sum(idf.tolist()) / len(idf)
+            idf[idf < 0] = epsilon * average_idf
+        return idf
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return None
+        idf = float(self.idf[term_id])
+        if not idf:
+            return None
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        return self.doc_ids[start:end], self.term_freqs[start:end], idf
+
+    def _contribution(self, tf: np.ndarray, docs: np.ndarray, idf: float) -> np.ndarray:
+        tf = tf.astype(np.int64)
+        return idf * (tf * (self.k1 + 1) / (tf + self.norm[docs]))
+
+    def score_candidates(self, query: Sequence[str], candidate_ids: Sequence[int]) -> np.ndarray:
+        """
+        Score only the given documents.
+
+        Args:
+            query: Query tokens (duplicates count once per occurrence, as in BM25Okapi).
+            candidate_ids: Document ids to score, in any order.
+
+        Returns:
+            np.ndarray: float64 scores aligned with `candidate_ids`.
+        """
+        candidates = np.asarray(candidate_ids, dtype=np.int64)
+        scores = np.zeros(len(candidates), dtype=np.float64)
+        if not len(candidates):
+            return scores
+        for term in query:
+            postings = self._term_postings(term)
+            if postings is None:
+                continue
+            docs, tfs, idf = postings
+            pos = np.searchsorted(docs, candidates)
+            pos[pos >= len(docs)] = 0
+            hit = docs[pos] == candidates
+            if hit.any():
+                scores[hit] += self._contribution(tfs[pos[hit]], candidates[hit], idf)
+        return scores
+
+    def top_k(self, query: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact lexical top-k over the whole corpus, touching only matching postings.
+
+        Returns:
+            tuple: (doc_ids, scores) sorted by descending score, ties by ascending
+            id. Documents that share no term with the query are never returned.
+        """
+        scores = np.zeros(self.corpus_size, dtype=np.float64)
+        touched = []
+        for term in query:
+            postings = self._term_postings(term)
+            if postings is None:
+                continue
+            docs, tfs, idf = postings
+            scores[docs] += self._contribution(tfs, docs, idf)
+            touched.append(docs)
+        if not touched or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        candidates = np.unique(np.concatenate(touched)).astype(np.int64)
+        return top_k_by_score(candidates, scores[candidates], k)
+
+    def score_candidates_many(self, queries: Sequence[Sequence[str]],
+                              candidate_ids: Sequence[Sequence[int]]) -> List[np.ndarray]:
+        """`score_candidates` for a batch of queries, each with its own candidates."""
+        return [self.score_candidates(query, ids) for query, ids in zip(queries, candidate_ids)]
+
+    def top_k_many(self, queries: Sequence[Sequence[str]], k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """`top_k` for a batch of queries."""
+        return [self.top_k(query, k) for query in queries]
+
+    def get_scores(self, query: Sequence[str]) -> np.ndarray:
+        """Dense scores for every document (drop-in for `BM25Okapi.get_scores`)."""
+        scores = np.zeros(self.corpus_size, dtype=np.float64)
+        for term in query:
+            postings = self._term_postings(term)
+            if postings is None:
+                continue
+            docs, tfs, idf = postings
+            scores[docs] += self._contribution(tfs, docs, idf)
+        return scores
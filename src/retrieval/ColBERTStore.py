@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import shutil
+import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+import numpy as np
+
+# On-disk layout of a ColBERT token-embedding store.
+#   meta.json          dimension, token count, doc_maxlen and checkpoint used to encode
+#   doc_offsets.npy    N + 1 token offsets; doc i owns rows offsets[i]:offsets[i + 1]
+#   doc_embs.f16       (n_tokens, dim) float16 L2-normalised token embeddings, memory-mapped
+COLBERT_STORE_META = "meta.json"
+
+
+def has_colbert_store(path: str) -> bool:
+    """Check whether `path` holds a complete ColBERT store."""
+    return os.path.exists(os.path.join(path, COLBERT_STORE_META))
+
+
+class ColBERTStore:
+    """
+    Precomputed ColBERT document token embeddings with late-interaction scoring.
+
+    Documents are encoded once offline; at query time only the query is encoded
+    and scored with MaxSim against the stored vectors, instead of re-encoding
+    every candidate chunk on each rerank.
+    """
+
+    def __init__(self, path: str, meta: dict, offsets: np.ndarray, embeddings: np.ndarray):
+        self.path = path
+        self.meta = meta
+        self.offsets = offsets
+        self.embeddings = embeddings
+
+    @classmethod
+    def open(cls, path: str) -> "ColBERTStore":
+        with open(os.path.join(path, COLBERT_STORE_META)) as f:
+            meta = json.load(f)
+        offsets = np.load(os.path.join(path, "doc_offsets.npy"), mmap_mode="r")
+        embeddings = np.memmap(os.path.join(path, "doc_embs.f16"), dtype=np.float16, mode="r",
+                               shape=(meta["n_tokens"], meta["dim"]))
+        return cls(path, meta, offsets, embeddings)
+
+    @property
+    def version(self) -> str:
+        return self.meta["build_id"]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def score(self, query_vectors: np.ndarray, doc_ids: Sequence[int]) -> np.ndarray:
+        """
+        ColBERT MaxSim scores of one query against the given documents.
+
+        Args:
+            query_vectors (np.ndarray): (Lq, dim) query token embeddings
+            doc_ids: Document ids to score
+
+        Returns:
+            np.ndarray: float32 scores aligned with `doc_ids`
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        scores = np.zeros(len(doc_ids), dtype=np.float32)
+        starts, ends = self.offsets[doc_ids], self.offsets[doc_ids + 1]
+        lengths = ends - starts
+        present = lengths > 0
+        if not present.any():
+            return scores
+
+        tokens = np.concatenate([self.embeddings[s:e] for s, e in zip(starts[present], ends[present])])
+        sims = tokens.astype(np.float32) @ np.asarray(query_vectors, dtype=np.float32).T
+        bounds = np.concatenate([[0], np.cumsum(lengths[present])[:-1]])
+        max_sims = np.maximum.reduceat(sims, bounds, axis=0)
+        # The in-memory reranker scores zero-padded document matrices, so a query
+        # token never scores below 0 against any document; mirror that floor.
+        scores[present] = np.maximum(max_sims, 0).sum(axis=1)
+        return scores
+
+    def rerank(self, query_vectors: np.ndarray, doc_ids: Sequence[int], k: int) -> List[Tuple[int, float]]:
+        """Top-k (doc_id, score) pairs of `doc_ids` by late-interaction score."""
+        scores = self.score(query_vectors, doc_ids)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(int(doc_ids[i]), float(scores[i])) for i in order]
+
+
+def encode_query(colbert_reranker: Any, query: str) -> np.ndarray:
+    """
+    Encode a query exactly as RAGPretrainedModel.rerank does (same query_maxlen
+    rule and [MASK] augmentation).
+
+    Returns:
+        np.ndarray: (Lq, dim) float32 query token embeddings
+    """
+    encoded = colbert_reranker.model._encode_index_free_queries(query)[0]
+    return encoded[0].float().cpu().numpy()
+
+
+def build_colbert_store(
+    texts: Sequence[str],
+    output_dir: str,
+    colbert_reranker: Any,
+    batch_docs: int = 1024,
+    bsize: int = 32,
+    build_id: Optional[str] = None,
+) -> dict:
+    """
+    Encode every chunk with the ColBERT document encoder and write the store.
+
+    Args:
+        texts: Chunk texts in corpus order (doc id = position)
+        output_dir (str): Destination directory, replaced atomically at the end
+        colbert_reranker: A loaded RAGPretrainedModel
+        batch_docs (int): Documents encoded per docFromText call
+        bsize (int): Encoder batch size
+        build_id (str): Identifier of the corpus; defaults to a hash of `texts`
+
+    Returns:
+        dict: The written metadata
+    """
+    ckpt = colbert_reranker.model.inference_ckpt
+    # Fix the document length for the whole corpus the same way rerank derives it per call.
+    colbert_reranker.model.inference_ckpt_len_set = False
+    colbert_reranker.model._set_inference_max_tokens(documents=list(texts), max_tokens="auto")
+
+    staging_dir = f"{output_dir.rstrip(os.sep)}.tmp"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    offsets = [0]
+    dim = None
+    digest = hashlib.sha1()
+    with open(os.path.join(staging_dir, "doc_embs.f16"), "wb") as f:
+        for start in range(0, len(texts), batch_docs):
+            batch = list(texts[start:start + batch_docs])
+            for text in batch:
+                digest.update(text.encode("utf-8"))
+                digest.update(b"\0")
+            encoded = ckpt.docFromText(batch, bsize=bsize, keep_dims=False, to_cpu=True)
+            for doc in encoded:
+                vectors = doc.float().numpy().astype(np.float16)
+                dim = vectors.shape[1] if dim is None else dim
+                f.write(vectors.tobytes())
+                offsets.append(offsets[-1] + len(vectors))
+            print(f"Encoded {min(start + batch_docs, len(texts))}/{len(texts)} chunks")
+
+    np.save(os.path.join(staging_dir, "doc_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    meta = {
+        "build_id": build_id or digest.hexdigest()[:16],
+        "created_at": datetime.datetime.now().isoformat(),
+        "checkpoint": getattr(colbert_reranker.model, "checkpoint", "colbert-ir/colbertv2.0"),
+        "doc_maxlen": int(ckpt.doc_tokenizer.doc_maxlen),
+        "n_docs": len(texts),
+        "n_tokens": offsets[-1],
+        "dim": dim or 128,
+        "dtype": "float16",
+    }
+    with open(os.path.join(staging_dir, COLBERT_STORE_META), "w") as f:
+        json.dump(meta, f, indent=4)
+    colbert_reranker.model.inference_ckpt_len_set = False
+
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.replace(staging_dir, output_dir)
+    return meta
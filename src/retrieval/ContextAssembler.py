@@ -0,0 +1,144 @@
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.models.LoadLLM import get_llm_tokenizer
+
+# Token budget of the retrieved context each call site puts into its prompt.
+# CONTEXT_TRIM_SENTENCES=1 keeps only the CONTEXT_MAX_SENTENCES sentences of each
+# chunk that best match the query, so more distinct chunks fit in the budget.
+CONTEXT_BUDGETS: Dict[str, int] = {
+    "image_report": int(os.environ.get("CONTEXT_BUDGET_IMAGE_REPORT", "1500")),
+    "text_report": int(os.environ.get("CONTEXT_BUDGET_TEXT_REPORT", "2000")),
+    "agent": int(os.environ.get("CONTEXT_BUDGET_AGENT", "1000")),
+}
+DEFAULT_CONTEXT_BUDGET = int(os.environ.get("CONTEXT_BUDGET", "2000"))
+CONTEXT_TRIM_SENTENCES = os.environ.get("CONTEXT_TRIM_SENTENCES", "0") != "0"
+CONTEXT_MAX_SENTENCES = int(os.environ.get("CONTEXT_MAX_SENTENCES", "3"))
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class AssembledContext:
+    """Chunks packed into a prompt budget, with the accounting that produced them."""
+
+    def __init__(self, text: str, chunks: List[str], tokens: int, budget: int, dropped: int, trimmed: int):
+        self.text = text
+        self.chunks = chunks
+        self.tokens = tokens
+        self.budget = budget
+        self.dropped = dropped
+        self.trimmed = trimmed
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in (part.strip() for part in _SENTENCE_SPLIT.split(text)) if s]
+
+
+def best_sentences(query: str, text: str, max_sentences: int) -> str:
+    """The `max_sentences` sentences of `text` sharing the most words with `query`, in original order."""
+    sentences = split_sentences(text)
+    if len(sentences) <= max_sentences:
+        return text
+    query_words = set(_WORD.findall(query.lower()))
+    overlap = [len(query_words & set(_WORD.findall(s.lower()))) for s in sentences]
+    keep = sorted(sorted(range(len(sentences)), key=lambda i: -overlap[i])[:max_sentences])
+    return " ".join(sentences[i] for i in keep)
+
+
+class ContextAssembler:
+    """
+    Pack reranked chunks, best first, into a token budget measured with the LLM tokenizer.
+
+    A chunk that does not fit is skipped and later (usually shorter) chunks are
+    still tried. With `trim_sentences`, each chunk is first cut down to its
+    best-matching sentences, and a chunk that still overflows is cut sentence by
+    sentence to the remaining budget instead of being skipped.
+    """
+
+    def __init__(self, budget_tokens: int, count_tokens: Callable[[Sequence[str]], List[int]],
+                 trim_sentences: bool = False, max_sentences: int = CONTEXT_MAX_SENTENCES, separator: str = "\n"):
+        self.budget_tokens = budget_tokens
+        self.count_tokens = count_tokens
+        self.trim_sentences = trim_sentences
+        self.max_sentences = max_sentences
+        self.separator = separator
+
+    def _fit_sentences(self, text: str, remaining: int) -> Tuple[Optional[str], int]:
+        # Longest prefix of whole sentences that fits; sentences are counted separately,
+        # so the joined text is re-counted and shortened if joining added tokens.
+        sentences = split_sentences(text)
+        counts = self.count_tokens(sentences) if sentences else []
+        used, kept = 0, []
+        for sentence, n in zip(sentences, counts):
+            if used + n > remaining:
+                break
+            kept.append(sentence)
+            used += n
+        while kept:
+            partial = " ".join(kept)
+            n = self.count_tokens([partial])[0]
+            if n <= remaining:
+                return partial, n
+            kept.pop()
+        return None, 0
+
+    def assemble(self, query: str, chunks: Sequence[str]) -> AssembledContext:
+        candidates = [best_sentences(query, c, self.max_sentences) if self.trim_sentences else c for c in chunks]
+        trimmed = sum(a != b for a, b in zip(candidates, chunks))
+        counts = self.count_tokens(candidates) if candidates else []
+        separator_tokens = self.count_tokens([self.separator])[0] if self.separator else 0
+
+        packed: List[str] = []
+        used = 0
+        for text, n in zip(candidates, counts):
+            cost = n + (separator_tokens if packed else 0)
+            if used + cost <= self.budget_tokens:
+                packed.append(text)
+                used += cost
+                continue
+            if self.trim_sentences:
+                separator_cost = separator_tokens if packed else 0
+                remaining = self.budget_tokens - used - separator_cost
+                partial, n = self._fit_sentences(text, remaining) if remaining > 0 else (None, 0)
+                if partial:
+                    packed.append(partial)
+                    used += n + separator_cost
+                    trimmed += 1
+        return AssembledContext(self.separator.join(packed), packed, used, self.budget_tokens,
+                                len(chunks) - len(packed), trimmed)
+
+
+def llm_token_counter(tokenizer: Any) -> Callable[[Sequence[str]], List[int]]:
+    """Batched token counting with a Hugging Face tokenizer (no special tokens)."""
+    def count(texts: Sequence[str]) -> List[int]:
+        return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+    return count
+
+
+def assemble_context(query: str, chunks: Sequence[str], site: Optional[str] = None,
+                     budget_tokens: Optional[int] = None, trim_sentences: Optional[bool] = None) -> AssembledContext:
+    """
+    Budgeted context for one call site.
+
+    Args:
+        query (str): Text the chunks were retrieved for, used to pick sentences
+        chunks: Reranked chunk texts, best first (the `rag_chunks` returned by `search`)
+        site (str): Key of CONTEXT_BUDGETS; unknown sites use DEFAULT_CONTEXT_BUDGET
+        budget_tokens (int): Explicit budget overriding the site's
+        trim_sentences (bool): Overrides CONTEXT_TRIM_SENTENCES
+
+    Returns:
+        AssembledContext: `str()` of it is the prompt-ready context
+    """
+    budget = budget_tokens if budget_tokens is not None else CONTEXT_BUDGETS.get(site, DEFAULT_CONTEXT_BUDGET)
+    assembler = ContextAssembler(
+        budget,
+        llm_token_counter(get_llm_tokenizer()),
+        trim_sentences=CONTEXT_TRIM_SENTENCES if trim_sentences is None else trim_sentences,
+    )
+    return assembler.assemble(query, chunks)
@@ -1,32 +1,116 @@
 import os
 import pickle
-from ragatouille import RAGPretrainedModel
-from rank_bm25 import BM25Okapi
 import pandas as pd
-import faiss
 import warnings
 
+from src.retrieval.BM25Index import BM25Index
+from src.retrieval.ArtifactStore import has_artifacts, open_artifacts
+from src.retrieval.ColBERTStore import ColBERTStore, has_colbert_store
+from src.retrieval.Segments import SEGMENTS_DIR, CorpusPart, SegmentedCorpus
+from src.retrieval.Sharding import ShardPool, has_shards
+from src.retrieval.VectorIndex import FAISS_INDEX_MODE, index_path_for, load_index
+from src.utils.Cache import make_cache_key
+
 warnings.filterwarnings("ignore")
 
 faiss_index_path = "./data/faiss_index_D.idx"
-if not os.path.exists(faiss_index_path):
-    raise FileNotFoundError(f"❌ FAISS index '{faiss_index_path}' not found.")
-faiss_index = faiss.read_index(faiss_index_path)
-print(f"✅ FAISS index loaded from '{faiss_index_path}'.")
-
+artifacts_dir = "./data/retrieval_artifacts"
 chunks_path = "./data/chunks.pkl"
-if not os.path.exists(chunks_path):
-    raise FileNotFoundError(f"❌ Pickle file '{chunks_path}' not found.")
-with open(chunks_path, "rb") as f:
-    chunks = pickle.load(f)
-print(f"✅ Loaded {len(chunks)} document chunks.")
 
-corpus = [chunk.page_content for chunk in chunks]
-tokenized_corpus = [doc.split() for doc in corpus]
-bm25 = BM25Okapi(tokenized_corpus)
+# With RETRIEVAL_SHARDS_DIR set (shards built by `python -m scripts.build_shards`), the
+# FAISS index, BM25 postings and chunk texts live in one server process per shard and
+# faiss_index, chunks and bm25 below are coordinator views over them.
+RETRIEVAL_SHARDS_DIR = os.environ.get("RETRIEVAL_SHARDS_DIR")
+shard_pool = None
+sharded_corpus = None
+if RETRIEVAL_SHARDS_DIR:
+    if not has_shards(RETRIEVAL_SHARDS_DIR):
+        raise FileNotFoundError(f"❌ No shards in '{RETRIEVAL_SHARDS_DIR}'. Build them with `python -m scripts.build_shards`.")
+    shard_pool = ShardPool(RETRIEVAL_SHARDS_DIR, index_mode=FAISS_INDEX_MODE).start()
+    sharded_corpus = shard_pool.connect()
+    faiss_index, chunks, bm25 = sharded_corpus.faiss_index, sharded_corpus.chunks, sharded_corpus.bm25
+    retrieval_artifacts = None
+    print(f"✅ Serving {len(chunks)} document chunks from {len(shard_pool.processes)} shard processes "
+          f"in '{RETRIEVAL_SHARDS_DIR}' (mode: {FAISS_INDEX_MODE}).")
+else:
+    faiss_index = load_index(faiss_index_path, FAISS_INDEX_MODE)
+    print(f"✅ FAISS index loaded from '{index_path_for(faiss_index_path, FAISS_INDEX_MODE)}' (mode: {FAISS_INDEX_MODE}).")
+
+    # Chunk texts and BM25 statistics come from the memory-mapped artifacts written by
+    # `python -m scripts.build_retrieval_artifacts`; chunks.pkl is only the fallback.
+    if has_artifacts(artifacts_dir):
+        retrieval_artifacts = open_artifacts(artifacts_dir)
+        chunks = retrieval_artifacts.chunks
+        bm25 = retrieval_artifacts.bm25
+        print(f"✅ Memory-mapped {len(chunks)} document chunks from '{artifacts_dir}' (build {retrieval_artifacts.version}).")
+    else:
+        if not os.path.exists(chunks_path):
+            raise FileNotFoundError(f"❌ Pickle file '{chunks_path}' not found.")
+        with open(chunks_path, "rb") as f:
+            chunks = pickle.load(f)
+        print(f"✅ Loaded {len(chunks)} document chunks.")
+        print(f"⚠ No retrieval artifacts in '{artifacts_dir}'; building BM25 in memory. "
+              "Run `python -m scripts.build_retrieval_artifacts` for a fast cold start.")
+        retrieval_artifacts = None
+        bm25 = BM25Index.from_tokenized(chunk.page_content.split() for chunk in chunks)
+
+# Precomputed ColBERT document embeddings written by `python -m scripts.build_colbert_store`.
+# Without them (or when they belong to another corpus) reranking encodes candidates per query.
+colbert_store_dir = "./data/colbert_store"
+colbert_store = None
+if has_colbert_store(colbert_store_dir):
+    colbert_store = ColBERTStore.open(colbert_store_dir)
+    if retrieval_artifacts is not None:
+        expected_build = retrieval_artifacts.version
+    elif sharded_corpus is not None:
+        expected_build = sharded_corpus.source_build_id
+    else:
+        expected_build = colbert_store.version
+    if len(colbert_store) != len(chunks) or colbert_store.version != expected_build:
+        print(f"⚠ ColBERT store in '{colbert_store_dir}' does not match the loaded chunks; ignoring it. "
+              "Rebuild with `python -m scripts.build_colbert_store`.")
+        colbert_store = None
+    else:
+        print(f"✅ Memory-mapped ColBERT embeddings of {len(colbert_store)} chunks from '{colbert_store_dir}'.")
+
+
+def _file_version(path: str) -> str:
+    stat = os.stat(path)
+    return f"{int(stat.st_mtime)}-{stat.st_size}"
 
-colbert_reranker = RAGPretrainedModel.from_pretrained("colbert-ir/colbertv2.0")
-print("✅ ColBERT reranker initialized.")
+# Identifies the base corpus and index a retrieval result came from
+if sharded_corpus is not None:
+    base_version = make_cache_key(sharded_corpus.version, FAISS_INDEX_MODE)[:16]
+    base_minhash = sharded_corpus.minhash
+else:
+    base_version = make_cache_key(
+        retrieval_artifacts.version if retrieval_artifacts is not None else _file_version(chunks_path),
+        FAISS_INDEX_MODE,
+        _file_version(index_path_for(faiss_index_path, FAISS_INDEX_MODE)),
+    )[:16]
+    base_minhash = retrieval_artifacts.minhash if retrieval_artifacts is not None else None
+
+# Documents added or deleted through src.retrieval.Ingest live in segments layered over
+# the base corpus. faiss_index, chunks and bm25 below are live views of the current
+# segment manifest, which is re-read every SEGMENTS_REFRESH_SECONDS (0 = only at start).
+# Sharded serving covers the base corpus only: ingest, compact and rebuild the shards.
+SEGMENTS_REFRESH_SECONDS = float(os.environ.get("SEGMENTS_REFRESH_SECONDS", "10"))
+corpus = SegmentedCorpus(
+    CorpusPart("base", chunks, bm25, faiss_index, base_minhash, base_version),
+    SEGMENTS_DIR if sharded_corpus is None else None,
+    base_faiss_path=faiss_index_path if sharded_corpus is None else None,
+    index_mode=FAISS_INDEX_MODE,
+)
+if SEGMENTS_REFRESH_SECONDS > 0 and sharded_corpus is None:
+    corpus.watch(SEGMENTS_REFRESH_SECONDS)
+faiss_index, chunks, bm25 = corpus.faiss_index, corpus.chunks, corpus.bm25
+
+
+def current_retrieval_version() -> str:
+    """Part of every retrieval cache key; changes with the corpus segments and the ColBERT store."""
+    return make_cache_key(corpus.version, colbert_store.version if colbert_store is not None else None)[:16]
+
+retrieval_version = current_retrieval_version()
 
 history_index_path = "./data/faiss_index_merged_df_diagnosis.idx"
 if not os.path.exists(history_index_path):
@@ -36,4 +120,11 @@ history_faiss_index = []
 print(f"✅ Patient history FAISS index loaded from '{history_index_path}'.")
 
 df_history = pd.read_pickle("./data/merged_df_diagnosis.pkl")
-print(f"✅ Loaded patient history data from 'merged_df_diagnosis.pkl' (Total records: {len(df_history)})")
\ No newline at end of file
+print(f"✅ Loaded patient history data from 'merged_df_diagnosis.pkl' (Total records: {len(df_history)})")
+
+def __getattr__(name):
+    # The ColBERT reranker now lives in the lazy model registry.
+    if name == "colbert_reranker":
+        from src.models.LoadEmbeddingModel import get_colbert_reranker
+        return get_colbert_reranker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,122 @@
+import threading
+import zlib
+from typing import Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+
+# MinHash over word shingles: the fraction of equal signature slots of two
+# chunks estimates the Jaccard similarity of their shingle sets.
+MINHASH_PERMUTATIONS = 64
+SHINGLE_SIZE = 3
+_PRIME = np.uint64(4294967291)  # largest prime below 2**32, so signatures fit in uint32
+
+
+def _permutations(num_perm: int, seed: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """32-bit hashes of the lower-cased word `size`-grams of `text` (the whole text if shorter)."""
+    words = text.lower().split()
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    grams = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash_signatures(texts: Iterable[str], num_perm: int = MINHASH_PERMUTATIONS,
+                       shingle_size: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    MinHash signatures of `texts`.
+
+    Returns:
+        np.ndarray: (n, num_perm) uint32; an empty text gets an all-max signature
+    """
+    a, b = _permutations(num_perm)
+    rows = []
+    for text in texts:
+        hashes = shingle_hashes(text, shingle_size)
+        if not len(hashes):
+            rows.append(np.full(num_perm, np.iinfo(np.uint32).max, dtype=np.uint32))
+            continue
+        permuted = (a[:, None] * hashes[None, :] % _PRIME + b[:, None]) % _PRIME
+        rows.append(permuted.min(axis=1).astype(np.uint32))
+    return np.vstack(rows) if rows else np.empty((0, num_perm), dtype=np.uint32)
+
+
+def near_duplicates(signatures: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Greedy near-duplicate filter over signatures given in rank order.
+
+    A row is dropped when its estimated Jaccard similarity to an earlier kept
+    row reaches `threshold`, so the best-ranked copy always survives.
+
+    Returns:
+        np.ndarray: Boolean keep mask aligned with `signatures`
+    """
+    signatures = np.asarray(signatures)
+    keep = np.ones(len(signatures), dtype=bool)
+    if len(signatures) < 2:
+        return keep
+    similarity = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+    for i in range(1, len(signatures)):
+        if (similarity[i, :i][keep[:i]] >= threshold).any():
+            keep[i] = False
+    return keep
+
+
+class DedupStats:
+    """Running totals of what near-duplicate suppression removed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.candidates = 0
+        self.dropped = 0
+        self.tokens_saved = 0
+
+    def record(self, candidates: int, dropped: int, tokens_saved: int) -> None:
+        with self._lock:
+            self.queries += 1
+            self.candidates += candidates
+            self.dropped += dropped
+            self.tokens_saved += tokens_saved
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "candidates": self.candidates,
+                "dropped": self.dropped,
+                "tokens_saved": self.tokens_saved,
+                "tokens_saved_per_query": self.tokens_saved / self.queries if self.queries else 0.0,
+            }
+
+
+def dedup_candidates(
+    candidate_ids: Sequence[int],
+    fused_scores: Sequence[float],
+    signatures: np.ndarray,
+    token_counts: Sequence[int],
+    threshold: float,
+) -> Tuple[List[int], List[float], int]:
+    """
+    Drop near-duplicate candidates, keeping the best-ranked copy.
+
+    Args:
+        candidate_ids: Candidate chunk ids, best first
+        fused_scores: Scores aligned with `candidate_ids`
+        signatures (np.ndarray): MinHash signatures aligned with `candidate_ids`
+        token_counts: Token counts aligned with `candidate_ids`
+        threshold (float): Estimated Jaccard similarity at which chunks count as duplicates
+
+    Returns:
+        Tuple[List[int], List[float], int]: Surviving ids, their scores and the tokens dropped
+    """
+    keep = near_duplicates(signatures, threshold)
+    tokens_saved = int(np.asarray(token_counts)[~keep].sum()) if len(keep) else 0
+    ids = [idx for idx, k in zip(candidate_ids, keep) if k]
+    scores = [score for score, k in zip(fused_scores, keep) if k]
+    return ids, scores, tokens_saved
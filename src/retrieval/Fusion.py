@@ -0,0 +1,164 @@
+from typing import List, Sequence, Tuple
+import numpy as np
+
+from src.retrieval.BM25Index import BM25Index
+
+# Hybrid score fusion methods:
+#   raw     dense similarity + raw BM25 over the FAISS hits only (previous behaviour)
+#           The baseline always added -distance. That is still the case for L2 indexes,
+#           but indexes with an inner-product metric now add +similarity:
+#           negating it would rank the least similar hits first.
+#   zscore  weighted sum of per-query z-scored dense and BM25 scores
+#   minmax  weighted sum of per-query min-max scaled dense and BM25 scores
+#   rrf     reciprocal rank fusion, sum of 1 / (rrf_k + rank) over both rankings
+# Every method except raw ranks the union of the FAISS hits and the BM25 top-k.
+FUSION_METHODS = ("raw", "zscore", "minmax", "rrf")
+
+
+def dense_similarity(distances: np.ndarray, higher_is_better: bool = False) -> np.ndarray:
+    """Turn FAISS distances into similarities (negated for L2, unchanged for inner product)."""
+    distances = np.asarray(distances, dtype=np.float64)
+    return distances if higher_is_better else -distances
+
+
+def _candidate_matrix(
+    dense_ids: np.ndarray,
+    dense_scores: np.ndarray,
+    bm25: BM25Index,
+    query_tokens: Sequence[Sequence[str]],
+    n_docs: int,
+    bm25_k: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per query candidate ids with their dense and lexical scores, padded to one matrix.
+
+    Padding has id -1 and NaN scores; candidates found only by BM25 have a NaN
+    dense score.
+    """
+    rows = []
+    for ids, scores in zip(dense_ids, dense_scores):
+        valid = (ids >= 0) & (ids < n_docs)
+        rows.append((ids[valid].astype(np.int64), scores[valid]))
+    if bm25_k > 0:
+        for r, (lexical_ids, _) in enumerate(bm25.top_k_many(query_tokens, bm25_k)):
+            ids, dense = rows[r]
+            extra = lexical_ids[~np.isin(lexical_ids, ids)]
+            rows[r] = (np.concatenate([ids, extra]), np.concatenate([dense, np.full(len(extra), np.nan)]))
+    # One batched call, so remote (sharded) indexes answer each batch in one round trip.
+    lexical_scores = bm25.score_candidates_many(query_tokens, [ids for ids, _ in rows])
+    rows = [(ids, dense, lex) for (ids, dense), lex in zip(rows, lexical_scores)]
+
+    width = max((len(ids) for ids, _, _ in rows), default=0)
+    cand_ids = np.full((len(rows), width), -1, dtype=np.int64)
+    dense = np.full((len(rows), width), np.nan)
+    lexical = np.full((len(rows), width), np.nan)
+    for r, (ids, d, lex) in enumerate(rows):
+        cand_ids[r, :len(ids)] = ids
+        dense[r, :len(ids)] = d
+        lexical[r, :len(ids)] = lex
+    return cand_ids, dense, lexical
+
+
+def _zscore(x: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nanmean(x, axis=1, keepdims=True)
+        std = np.nanstd(x, axis=1, keepdims=True)
+        z = np.where(std > 0, (x - mean) / std, 0.0)
+    return np.where(np.isnan(x), np.nan, z)
+
+
+def _minmax(x: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lo = np.nanmin(x, axis=1, keepdims=True)
+        span = np.nanmax(x, axis=1, keepdims=True) - lo
+        scaled = np.where(span > 0, (x - lo) / span, 0.0)
+    return np.where(np.isnan(x), np.nan, scaled)
+
+
+def _ranks(x: np.ndarray) -> np.ndarray:
+    """0-based descending rank of every entry within its row; NaN entries rank last."""
+    order = np.argsort(np.where(np.isnan(x), np.inf, -x), axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(x.shape[1])[None, :].repeat(len(x), axis=0), axis=1)
+    return ranks
+
+
+def _floor_missing(x: np.ndarray, present: np.ndarray) -> np.ndarray:
+    # A candidate the dense retriever did not return gets the row's worst observed dense score.
+    with np.errstate(invalid="ignore"):
+        worst = np.nanmin(np.where(present, x, np.nan), axis=1, keepdims=True)
+    worst = np.nan_to_num(worst, nan=0.0)
+    return np.where(np.isnan(x), worst, x)
+
+
+def fuse_scores(
+    dense_ids: np.ndarray,
+    dense_scores: np.ndarray,
+    bm25: BM25Index,
+    query_tokens: Sequence[Sequence[str]],
+    k: int,
+    n_docs: int,
+    method: str = "raw",
+    bm25_k: int = 0,
+    dense_weight: float = 0.5,
+    rrf_k: int = 60,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse dense and BM25 scores for a batch of queries and keep the best `k` per query.
+
+    Args:
+        dense_ids (np.ndarray): (n, faiss_k) FAISS ids, -1 where FAISS returned fewer hits
+        dense_scores (np.ndarray): (n, faiss_k) similarities, see `dense_similarity`
+        bm25 (BM25Index): Lexical index
+        query_tokens: Cleaned query tokens per query
+        k (int): Candidates kept per query
+        n_docs (int): Corpus size; ids outside [0, n_docs) are dropped
+        method (str): One of FUSION_METHODS
+        bm25_k (int): BM25 top-k merged into the candidates (ignored by raw)
+        dense_weight (float): Weight of the dense score for zscore and minmax
+        rrf_k (int): Rank offset of reciprocal rank fusion
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (n, k) candidate ids and fused scores, best
+        first; short rows are padded with id -1 and score -inf.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"❌ Unknown fusion method '{method}'. Choose one of {', '.join(FUSION_METHODS)}.")
+    dense_ids = np.asarray(dense_ids)
+    cand_ids, dense, lexical = _candidate_matrix(
+        dense_ids, np.asarray(dense_scores, dtype=np.float64), bm25, query_tokens, n_docs,
+        0 if method == "raw" else bm25_k,
+    )
+    present = cand_ids >= 0
+
+    if method == "raw":
+        fused = dense + lexical
+    elif method == "rrf":
+        dense_rank = np.where(np.isnan(dense), np.inf, _ranks(dense))
+        lexical_rank = np.where(present, _ranks(np.where(present, lexical, np.nan)), np.inf)
+        fused = 1.0 / (rrf_k + dense_rank + 1) + 1.0 / (rrf_k + lexical_rank + 1)
+    else:
+        normalize = _zscore if method == "zscore" else _minmax
+        dense_n = _floor_missing(normalize(dense), present)
+        fused = dense_weight * dense_n + (1 - dense_weight) * normalize(lexical)
+    fused = np.where(present, fused, -np.inf)
+
+    k = min(k, fused.shape[1])
+    if k <= 0:
+        return np.empty((len(fused), 0), dtype=np.int64), np.empty((len(fused), 0))
+    top = np.argpartition(-fused, k - 1, axis=1)[:, :k] if fused.shape[1] > k else np.tile(np.arange(k), (len(fused), 1))
+    # Order the selected candidates by score, breaking ties by their original (FAISS-first) position.
+    top.sort(axis=1)
+    top_scores = np.take_along_axis(fused, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    ids = np.take_along_axis(cand_ids, top, axis=1)
+    scores = np.take_along_axis(fused, top, axis=1)
+    ids[np.isneginf(scores)] = -1
+    return ids, scores
+
+
+def split_rows(ids: np.ndarray, scores: np.ndarray) -> List[Tuple[List[int], List[float]]]:
+    """Per-query (ids, scores) lists with the padding removed."""
+    return [(row_ids[row_ids >= 0].tolist(), row_scores[row_ids >= 0].tolist())
+            for row_ids, row_scores in zip(ids, scores)]
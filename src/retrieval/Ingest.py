@@ -0,0 +1,234 @@
+import os
+import shutil
+import threading
+import time
+import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+
+from src.retrieval.ArtifactStore import build_artifacts
+from src.retrieval.Segments import (
+    COMPACTED_ARTIFACTS_DIR,
+    COMPACTED_INDEX_FILE,
+    SEGMENT_INDEX_FILE,
+    SegmentedCorpus,
+    manifest_lock,
+    read_manifest,
+    write_manifest,
+)
+from src.retrieval.VectorIndex import _MMAP_FLAG, build_index, index_path_for, reconstruct_vectors
+
+# Compact once this many segments have accumulated or this fraction of documents is tombstoned.
+COMPACT_MAX_SEGMENTS = int(os.environ.get("COMPACT_MAX_SEGMENTS", "8"))
+COMPACT_TOMBSTONE_RATIO = float(os.environ.get("COMPACT_TOMBSTONE_RATIO", "0.1"))
+
+
+def embed_documents(texts: Sequence[str]) -> np.ndarray:
+    """Index vectors for new chunks, from the same two-model average used for queries."""
+    from src.retrieval.QueryEmbedding import compute_query_embeddings
+    return compute_query_embeddings(texts, use_cache=False)
+
+
+def add_documents(corpus: SegmentedCorpus, documents: Sequence[Document],
+                  embed_fn: Callable[[Sequence[str]], np.ndarray] = embed_documents) -> List[int]:
+    """
+    Append documents as a new segment and publish it in the manifest.
+
+    Args:
+        corpus (SegmentedCorpus): Corpus to extend; refreshed before returning
+        documents: Chunks with `page_content` and `metadata`
+        embed_fn: Maps texts to (n, d) float32 vectors comparable with the base index
+
+    Returns:
+        List[int]: Global ids assigned to `documents`
+    """
+    if not documents:
+        return []
+    texts = [doc.page_content for doc in documents]
+    vectors = np.ascontiguousarray(embed_fn(texts), dtype="float32")
+    base_index = corpus.snapshot.base.index
+    if vectors.shape != (len(texts), base_index.d):
+        raise ValueError(f"❌ Embeddings have shape {vectors.shape}, expected ({len(texts)}, {base_index.d}).")
+
+    with manifest_lock(corpus.segments_dir):
+        manifest = read_manifest(corpus.segments_dir)
+        version = manifest["version"] + 1
+        name = f"seg-{version:06d}"
+        path = os.path.join(corpus.segments_dir, name)
+        build_artifacts(documents, path)
+        index = faiss.IndexFlat(base_index.d, base_index.metric_type)
+        index.add(vectors)
+        faiss.write_index(index, os.path.join(path, SEGMENT_INDEX_FILE))
+
+        first_id = _corpus_size(corpus, manifest)
+        manifest["segments"].append({"name": name, "n_docs": len(texts),
+                                     "created_at": datetime.datetime.now().isoformat()})
+        manifest["version"] = version
+        write_manifest(corpus.segments_dir, manifest)
+    corpus.refresh()
+    print(f"✅ Added {len(texts)} chunks as segment '{name}' (ids {first_id}-{first_id + len(texts) - 1}).")
+    return list(range(first_id, first_id + len(texts)))
+
+
+def delete_documents(corpus: SegmentedCorpus, ids: Sequence[int]) -> int:
+    """Tombstone global ids; they stop being returned once the manifest is refreshed."""
+    with manifest_lock(corpus.segments_dir):
+        manifest = read_manifest(corpus.segments_dir)
+        size = _corpus_size(corpus, manifest)
+        invalid = [i for i in ids if not 0 <= int(i) < size]
+        if invalid:
+            raise IndexError(f"❌ Document ids out of range: {invalid[:10]}")
+        tombstones = set(manifest["tombstones"])
+        added = {int(i) for i in ids} - tombstones
+        if not added:
+            return 0
+        manifest["tombstones"] = sorted(tombstones | added)
+        manifest["version"] += 1
+        write_manifest(corpus.segments_dir, manifest)
+    corpus.refresh()
+    return len(added)
+
+
+def _base_size(corpus: SegmentedCorpus, manifest: Dict[str, Any]) -> int:
+    base = manifest.get("base")
+    return base["n_docs"] if base is not None else len(corpus.original_base)
+
+
+def _corpus_size(corpus: SegmentedCorpus, manifest: Dict[str, Any]) -> int:
+    return _base_size(corpus, manifest) + sum(seg["n_docs"] for seg in manifest["segments"])
+
+
+def _base_vectors(corpus: SegmentedCorpus, base_info: Optional[Dict[str, Any]]) -> np.ndarray:
+    # Approximate modes cannot always reconstruct; read the exact index of the base instead.
+    if base_info is not None:
+        path = os.path.join(base_info["path"], COMPACTED_INDEX_FILE)
+    elif corpus.base_faiss_path:
+        path = corpus.base_faiss_path
+    else:
+        return reconstruct_vectors(corpus.original_base.index)
+    return reconstruct_vectors(faiss.read_index(path, _MMAP_FLAG))
+
+
+_compact_lock = threading.Lock()
+
+
+def compact(corpus: SegmentedCorpus) -> Optional[str]:
+    """
+    Merge the base and every current segment, minus tombstones, into a new base.
+
+    The expensive merge runs without holding the manifest lock; segments
+    appended and ids deleted meanwhile are carried over (with ids remapped)
+    when the new base is published.
+
+    Returns:
+        Optional[str]: Path of the new base, or None when there was nothing to compact
+    """
+    with _compact_lock:
+        return _compact(corpus)
+
+
+def _compact(corpus: SegmentedCorpus) -> Optional[str]:
+    with corpus.reading() as snapshot:
+        base_info = corpus.manifest.get("base")
+    if len(snapshot.parts) == 1 and not len(snapshot.tombstones):
+        return None
+    start = time.perf_counter()
+    n_total = len(snapshot)
+    live = np.ones(n_total, dtype=bool)
+    live[snapshot.tombstones] = False
+    live_ids = np.flatnonzero(live)
+
+    documents = [snapshot.chunks[int(i)] for i in live_ids]
+    vectors = np.vstack([_base_vectors(corpus, base_info)]
+                        + [reconstruct_vectors(part.index) for part in snapshot.parts[1:]])[live_ids]
+
+    path = os.path.join(corpus.segments_dir, f"base-{snapshot.version:06d}")
+    staging = f"{path}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    build_artifacts(documents, os.path.join(staging, COMPACTED_ARTIFACTS_DIR))
+    flat = faiss.IndexFlat(vectors.shape[1], snapshot.base.index.metric_type)
+    flat.add(vectors)
+    index_path = os.path.join(staging, COMPACTED_INDEX_FILE)
+    faiss.write_index(flat, index_path)
+    if corpus.index_mode not in (None, "flat", "flat_mmap"):
+        faiss.write_index(build_index(vectors, corpus.index_mode, flat.metric_type),
+                          index_path_for(index_path, corpus.index_mode))
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(staging, path)
+
+    merged_names = {part.name for part in snapshot.parts[1:]}
+    # Old global id -> new id for every live document that was merged.
+    remap = np.full(n_total, -1, dtype=np.int64)
+    remap[live_ids] = np.arange(len(live_ids))
+    with manifest_lock(corpus.segments_dir):
+        manifest = read_manifest(corpus.segments_dir)
+        present = {seg["name"] for seg in manifest["segments"]}
+        if manifest.get("base") != base_info or not merged_names <= present:
+            # Another process compacted first; this merge is based on a stale layout.
+            shutil.rmtree(path, ignore_errors=True)
+            print("⚠ Corpus was compacted concurrently; discarding this compaction.")
+            return None
+        later = [seg for seg in manifest["segments"] if seg["name"] not in merged_names]
+        shift = len(live_ids) - n_total
+        tombstones = []
+        for doc_id in manifest["tombstones"]:
+            if doc_id >= n_total:
+                tombstones.append(doc_id + shift)
+            elif remap[doc_id] >= 0:
+                tombstones.append(int(remap[doc_id]))
+        manifest.update({
+            "version": manifest["version"] + 1,
+            "base": {"path": path, "n_docs": len(live_ids), "created_at": datetime.datetime.now().isoformat()},
+            "segments": later,
+            "tombstones": sorted(tombstones),
+        })
+        write_manifest(corpus.segments_dir, manifest)
+    corpus.refresh()
+
+    # Open readers keep their mappings of unlinked files, so merged parts can go right away.
+    for name in merged_names:
+        shutil.rmtree(os.path.join(corpus.segments_dir, name), ignore_errors=True)
+    if base_info is not None and os.path.abspath(base_info["path"]) != os.path.abspath(path):
+        shutil.rmtree(base_info["path"], ignore_errors=True)
+    print(f"✅ Compacted {len(snapshot.parts)} parts into '{path}' ({len(live_ids)} chunks, "
+          f"{n_total - len(live_ids)} tombstones dropped) in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def needs_compaction(corpus: SegmentedCorpus, max_segments: int = COMPACT_MAX_SEGMENTS,
+                     tombstone_ratio: float = COMPACT_TOMBSTONE_RATIO) -> bool:
+    snapshot = corpus.snapshot
+    return (len(snapshot.parts) - 1 >= max_segments
+            or len(snapshot.tombstones) >= tombstone_ratio * max(len(snapshot), 1))
+
+
+class BackgroundCompactor:
+    """Daemon thread that compacts the corpus whenever `needs_compaction` says so."""
+
+    def __init__(self, corpus: SegmentedCorpus, interval: float = 60.0,
+                 max_segments: int = COMPACT_MAX_SEGMENTS, tombstone_ratio: float = COMPACT_TOMBSTONE_RATIO):
+        self.corpus = corpus
+        self.interval = interval
+        self.max_segments = max_segments
+        self.tombstone_ratio = tombstone_ratio
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="segment-compactor", daemon=True)
+
+    def start(self) -> "BackgroundCompactor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                if needs_compaction(self.corpus, self.max_segments, self.tombstone_ratio):
+                    compact(self.corpus)
+            except Exception as e:
+                print(f"⚠ Background compaction failed: {e}")
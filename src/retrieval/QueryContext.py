@@ -0,0 +1,23 @@
+from typing import List
+import numpy as np
+from pydantic import BaseModel
+
+
+class QueryContext(BaseModel):
+    """
+    A query prepared once for retrieval.
+
+    Carries the original text, the NLP-cleaned text and tokens, and the fused
+    dual-model embedding, so later pipeline stages (search, diagnosis, the
+    agent's search tool) do not re-run spaCy or the embedding models.
+    The embedding is kept as a plain float list so the context can live in
+    checkpointed graph state.
+    """
+    text: str
+    cleaned: str
+    tokens: List[str]
+    embedding: List[float]
+
+    def embedding_array(self) -> np.ndarray:
+        """Embedding as the (1, d) float32 matrix FAISS expects."""
+        return np.asarray(self.embedding, dtype="float32").reshape(1, -1)
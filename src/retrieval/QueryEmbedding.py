@@ -0,0 +1,152 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+from src.models.LoadEmbeddingModel import (
+    ALTERNATIVE_EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    PRIMARY_EMBEDDING_MODEL,
+    get_alternative_embeddings_model,
+    get_primary_embeddings_model,
+)
+from src.models.ModelRegistry import get_device
+from src.utils.Cache import LRUCache, SQLiteCacheStore, make_cache_key
+
+# The two query encoders run side by side on a two-thread pool. On CPU each
+# worker gets half of the cores for torch intra-op parallelism, so the two
+# forward passes do not oversubscribe the machine.
+# EMBEDDING_CONCURRENCY=0 restores the sequential path.
+CONCURRENT_EMBEDDING = os.environ.get("EMBEDDING_CONCURRENCY", "1") != "0"
+EMBEDDING_THREADS_PER_MODEL = int(os.environ.get("EMBEDDING_THREADS_PER_MODEL", "0")) or max(1, (os.cpu_count() or 2) // 2)
+
+# Fused embeddings are cached by the (whitespace-normalised) text that was embedded.
+# Search embeds the spaCy-cleaned query, so queries that differ only in case,
+# stopwords or inflection share an entry. Keys include EMBEDDING_BACKEND, whose vectors
+# differ slightly from torch's. EMBEDDING_CACHE_PATH adds a SQLite tier.
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_TTL = float(os.environ.get("EMBEDDING_CACHE_TTL", "0")) or None
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH")
+
+embedding_cache = LRUCache(
+    EMBEDDING_CACHE_SIZE,
+    ttl=EMBEDDING_CACHE_TTL,
+    disk=SQLiteCacheStore(EMBEDDING_CACHE_PATH, ttl=EMBEDDING_CACHE_TTL) if EMBEDDING_CACHE_PATH else None,
+    name="query_embedding",
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    if get_device() == "cpu":
+        import torch
+        torch.set_num_threads(EMBEDDING_THREADS_PER_MODEL)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="query-embedding",
+                                               initializer=_init_worker)
+    return _executor
+
+
+def _embed(model_getter, text: str) -> np.ndarray:
+    return np.asarray(model_getter().embed_query(text), dtype="float32")
+
+
+def embed_with_both_models(query_text: str, concurrent: Optional[bool] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Run both query encoders, in parallel unless `concurrent` (default CONCURRENT_EMBEDDING) is False."""
+    if concurrent is None:
+        concurrent = CONCURRENT_EMBEDDING
+    if not concurrent:
+        return _embed(get_primary_embeddings_model, query_text), _embed(get_alternative_embeddings_model, query_text)
+    executor = _get_executor()
+    primary = executor.submit(_embed, get_primary_embeddings_model, query_text)
+    alternative = executor.submit(_embed, get_alternative_embeddings_model, query_text)
+    return primary.result(), alternative.result()
+
+
+def fuse_embeddings(emb1: np.ndarray, emb2: np.ndarray) -> np.ndarray:
+    """Average the two model embeddings into the (1, d) query vector."""
+    if emb1.shape != emb2.shape:
+        print(f"⚠ Inconsistent embedding shapes detected: {emb1.shape} vs {emb2.shape}. Using primary model.")
+        return emb1.reshape(1, -1)
+    return ((emb1 + emb2) / 2.0).reshape(1, -1)
+
+
+def _embedding_key(text: str) -> str:
+    return make_cache_key("query_embedding", PRIMARY_EMBEDDING_MODEL, ALTERNATIVE_EMBEDDING_MODEL, EMBEDDING_BACKEND,
+                          " ".join(text.split()))
+
+
+def compute_query_embedding(query_text, concurrent: Optional[bool] = None, use_cache: bool = True):
+    """Compute query embeddings using multiple models and average them."""
+    key = _embedding_key(query_text)
+    if use_cache:
+        cached = embedding_cache.get(key)
+        if cached is not None:
+            return cached.copy()
+    try:
+        emb1, emb2 = embed_with_both_models(query_text, concurrent)
+        fused = fuse_embeddings(emb1, emb2)
+    except Exception as e:
+        raise RuntimeError(f"❌ Failed to compute embeddings: {e}")
+    if use_cache:
+        embedding_cache.set(key, fused.copy())
+    return fused
+
+
+def _embed_batch(model_getter, texts: Sequence[str]) -> np.ndarray:
+    return np.asarray(model_getter().embed_documents(list(texts)), dtype="float32")
+
+
+def compute_query_embeddings(query_texts: Sequence[str], concurrent: Optional[bool] = None,
+                             use_cache: bool = True) -> np.ndarray:
+    """
+    Batched `compute_query_embedding`: one forward pass per model for all texts
+    that are not already cached.
+
+    Returns:
+        np.ndarray: (n, d) fused embeddings, row i for query_texts[i]. Rows match
+        the single-query path up to floating-point noise from batch padding.
+    """
+    if not query_texts:
+        return np.empty((0, 0), dtype="float32")
+    if not use_cache:
+        return _compute_query_embeddings(query_texts, concurrent)
+
+    keys = [_embedding_key(text) for text in query_texts]
+    rows: List[Optional[np.ndarray]] = [embedding_cache.get(key) for key in keys]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if missing:
+        computed = _compute_query_embeddings([query_texts[i] for i in missing], concurrent)
+        for i, row in zip(missing, computed):
+            embedding_cache.set(keys[i], row.reshape(1, -1).copy())
+            rows[i] = row
+    return np.vstack([row.reshape(1, -1) for row in rows])
+
+
+def _compute_query_embeddings(query_texts: Sequence[str], concurrent: Optional[bool] = None) -> np.ndarray:
+    if concurrent is None:
+        concurrent = CONCURRENT_EMBEDDING
+    try:
+        if concurrent:
+            executor = _get_executor()
+            primary = executor.submit(_embed_batch, get_primary_embeddings_model, query_texts)
+            alternative = executor.submit(_embed_batch, get_alternative_embeddings_model, query_texts)
+            emb1, emb2 = primary.result(), alternative.result()
+        else:
+            emb1 = _embed_batch(get_primary_embeddings_model, query_texts)
+            emb2 = _embed_batch(get_alternative_embeddings_model, query_texts)
+        if emb1.shape != emb2.shape:
+            print(f"⚠ Inconsistent embedding shapes detected: {emb1.shape} vs {emb2.shape}. Using primary model.")
+            return emb1
+        return (emb1 + emb2) / 2.0
+    except Exception as e:
+        raise RuntimeError(f"❌ Failed to compute embeddings: {e}")
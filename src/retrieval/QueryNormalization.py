@@ -0,0 +1,63 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+from src.models.LoadEmbeddingModel import QUERY_NLP_MODELS, QUERY_NORMALIZATION, get_query_nlp
+from src.utils.Cache import LRUCache
+
+# Queries are normalized (lowercased, lemmatized, stopwords and non-alphabetic tokens
+# dropped) by the spaCy pipeline of the QUERY_NORMALIZATION mode, see
+# src/models/LoadEmbeddingModel.py. Results are memoized per mode and lowercased text,
+# so a repeated query or patient history never reaches spaCy twice.
+NORMALIZATION_MODES = tuple(QUERY_NLP_MODELS)
+NORMALIZATION_CACHE_SIZE = int(os.environ.get("NORMALIZATION_CACHE_SIZE", "4096"))
+NORMALIZATION_BATCH_SIZE = int(os.environ.get("NORMALIZATION_BATCH_SIZE", "32"))
+
+normalization_cache = LRUCache(NORMALIZATION_CACHE_SIZE, name="query_normalization")
+
+
+def normalize_doc(doc) -> str:
+    """Space-joined lemmas of the alphabetic non-stopword tokens of a spaCy Doc."""
+    tokens = [token.lemma_ for token in doc if not token.is_stop and token.is_alpha]
+    return " ".join(tokens)
+
+
+def normalize_query(text: str, mode: Optional[str] = None, use_cache: bool = True) -> str:
+    """
+    Normalize one query.
+
+    Args:
+        text (str): Raw query text
+        mode (str): One of NORMALIZATION_MODES, default QUERY_NORMALIZATION
+        use_cache (bool): Read and fill the memoization cache
+
+    Returns:
+        str: The normalized query
+    """
+    return normalize_queries([text], mode, use_cache)[0]
+
+
+def normalize_queries(texts: Sequence[str], mode: Optional[str] = None, use_cache: bool = True) -> List[str]:
+    """
+    Batched `normalize_query`: the distinct uncached texts go through a single `nlp.pipe` pass.
+
+    Returns:
+        List[str]: Normalized queries, in the order of `texts`
+    """
+    mode = mode or QUERY_NORMALIZATION
+    if mode not in NORMALIZATION_MODES:
+        raise ValueError(f"❌ Unknown normalization mode '{mode}'. Choose one of {', '.join(NORMALIZATION_MODES)}.")
+    lowered = [text.lower() for text in texts]
+    results: Dict[str, str] = {}
+    if use_cache:
+        for text in dict.fromkeys(lowered):
+            cached = normalization_cache.get((mode, text))
+            if cached is not None:
+                results[text] = cached
+    missing = [text for text in dict.fromkeys(lowered) if text not in results]
+    if missing:
+        nlp = get_query_nlp(mode)
+        for text, doc in zip(missing, nlp.pipe(missing, batch_size=NORMALIZATION_BATCH_SIZE)):
+            results[text] = normalize_doc(doc)
+            if use_cache:
+                normalization_cache.set((mode, text), results[text])
+    return [results[text] for text in lowered]
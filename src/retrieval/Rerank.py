@@ -0,0 +1,154 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Scores `candidate_ids` for `query`; higher is better, aligned with the ids.
+StageScorer = Callable[[str, Sequence[int]], np.ndarray]
+
+
+def score_margin(scores: np.ndarray) -> float:
+    """Gap between the best and second-best score in standard deviations of the stage's scores."""
+    if len(scores) < 2:
+        return float("inf")
+    top2 = np.partition(-np.asarray(scores, dtype=np.float64), 1)[:2]
+    spread = float(np.std(scores))
+    return float(top2[1] - top2[0]) / spread if spread > 0 else 0.0
+
+
+class RerankStage:
+    """
+    One scoring stage of the cascade, applied to the first `depth` candidates.
+
+    The stage keeps an exponentially weighted estimate of its cost per
+    candidate, which the cascade uses to shrink or skip it when the request's
+    time budget would otherwise be exceeded.
+    """
+
+    def __init__(self, name: str, scorer: StageScorer, depth: int, min_depth: int = 2, smoothing: float = 0.2):
+        self.name = name
+        self.scorer = scorer
+        self.depth = depth
+        self.min_depth = min_depth
+        self.smoothing = smoothing
+        self.ms_per_candidate: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def affordable_depth(self, remaining_ms: Optional[float]) -> int:
+        """How many candidates fit in `remaining_ms` (all of them without a budget or a cost estimate)."""
+        if remaining_ms is None or self.ms_per_candidate is None:
+            return self.depth
+        return min(self.depth, int(remaining_ms / self.ms_per_candidate))
+
+    def record(self, n_candidates: int, elapsed_ms: float) -> None:
+        cost = elapsed_ms / max(n_candidates, 1)
+        with self._lock:
+            if self.ms_per_candidate is None:
+                self.ms_per_candidate = cost
+            else:
+                self.ms_per_candidate += self.smoothing * (cost - self.ms_per_candidate)
+
+
+class RerankCascade:
+    """
+    Cheap-to-expensive reranking: fused candidates -> ColBERT top N -> cross-encoder top M.
+
+    Each stage reorders the head of the ranking it receives and leaves the tail
+    in the previous order. The cascade stops early when the last scores
+    separate the top candidate by at least `early_exit_margin` standard
+    deviations (0 disables early exit), and under a time budget stages are run
+    on fewer candidates, or skipped, instead of overrunning the deadline.
+    """
+
+    def __init__(self, stages: List[RerankStage], early_exit_margin: float = 0.0):
+        self.stages = stages
+        self.early_exit_margin = early_exit_margin
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {
+            stage.name: {"runs": 0, "truncated": 0, "skipped_budget": 0, "skipped_early_exit": 0}
+            for stage in stages
+        }
+        self.requests = 0
+        self.degraded = 0
+
+    def _decisive(self, scores: np.ndarray) -> bool:
+        return self.early_exit_margin > 0 and score_margin(scores) >= self.early_exit_margin
+
+    def _count(self, stage: str, counter: str) -> None:
+        with self._lock:
+            self._counters[stage][counter] += 1
+
+    def run(
+        self,
+        query: str,
+        candidate_ids: Sequence[int],
+        fused_scores: Sequence[float],
+        deadline: Optional[float] = None,
+    ) -> Tuple[List[int], Dict]:
+        """
+        Rerank `candidate_ids`, which arrive ordered by `fused_scores`.
+
+        Args:
+            query (str): Raw query text passed to every stage scorer
+            candidate_ids: Candidate chunk ids, best fused score first
+            fused_scores: Fusion scores aligned with `candidate_ids`
+            deadline (float): `time.perf_counter()` value by which reranking must finish
+
+        Returns:
+            Tuple[List[int], dict]: Final candidate order and a trace of what each stage did
+        """
+        ranking = list(candidate_ids)
+        scores = np.asarray(fused_scores, dtype=np.float32)
+        trace = {"stages": [], "early_exit": None, "degraded": False}
+        exited = self._decisive(scores)
+        if exited:
+            trace["early_exit"] = "fusion"
+
+        for stage in self.stages:
+            if exited:
+                self._count(stage.name, "skipped_early_exit")
+                continue
+            remaining_ms = None if deadline is None else (deadline - time.perf_counter()) * 1000
+            depth = min(len(ranking), stage.affordable_depth(remaining_ms))
+            if depth < min(stage.min_depth, len(ranking)) or (remaining_ms is not None and remaining_ms <= 0):
+                self._count(stage.name, "skipped_budget")
+                trace["stages"].append({"name": stage.name, "skipped": "budget"})
+                trace["degraded"] = True
+                continue
+            if depth < min(stage.depth, len(ranking)):
+                self._count(stage.name, "truncated")
+                trace["degraded"] = True
+
+            head = ranking[:depth]
+            start = time.perf_counter()
+            stage_scores = np.asarray(stage.scorer(query, head), dtype=np.float32)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stage.record(depth, elapsed_ms)
+            self._count(stage.name, "runs")
+
+            order = np.argsort(-stage_scores, kind="stable")
+            ranking = [head[i] for i in order] + ranking[depth:]
+            scores = stage_scores[order]
+            trace["stages"].append({"name": stage.name, "candidates": depth, "ms": elapsed_ms})
+            if self._decisive(scores):
+                exited = True
+                trace["early_exit"] = stage.name
+
+        with self._lock:
+            self.requests += 1
+            self.degraded += trace["degraded"]
+        return ranking, trace
+
+    def stats(self) -> Dict:
+        """Per-stage run/skip counters and cost estimates."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "degraded": self.degraded,
+                "early_exit_margin": self.early_exit_margin,
+                "stages": [
+                    {"name": stage.name, "depth": stage.depth, "ms_per_candidate": stage.ms_per_candidate,
+                     **self._counters[stage.name]}
+                    for stage in self.stages
+                ],
+            }
@@ -1,17 +1,33 @@
-from typing import List, Tuple
+import os
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple, Union
 import numpy as np
+import faiss
 from src.retrieval.DataLoader import (
     faiss_index, 
     chunks, 
-    bm25, 
-    colbert_reranker
+    bm25,
+    colbert_store,
+    corpus,
+    current_retrieval_version
 )
 
 from src.models.LoadEmbeddingModel import (
-    primary_embeddings_model,
-    alternative_embeddings_model,
-    nlp
+    get_colbert_reranker,
+    get_cross_encoder,
+    EMBEDDING_BACKEND,
+    QUERY_NORMALIZATION
 )
+from src.retrieval.ColBERTStore import encode_query
+from src.retrieval.Dedup import DedupStats, dedup_candidates
+from src.retrieval.Fusion import dense_similarity, fuse_scores, split_rows
+from src.retrieval.QueryContext import QueryContext
+from src.retrieval.Rerank import RerankCascade, RerankStage
+from src.retrieval.Sharding import ShardedChunks
+from src.retrieval.QueryEmbedding import compute_query_embedding, compute_query_embeddings, embedding_cache
+from src.retrieval.QueryNormalization import normalization_cache, normalize_queries, normalize_query
+from src.utils.Cache import LRUCache, SQLiteCacheStore, make_cache_key
 
 # from utils.TextProcessing import (
 # clean_query,
@@ -19,60 +35,248 @@ from src.models.LoadEmbeddingModel import (
 # )
 
 
+# Retrieval depth: FAISS hits per query, fused candidates sent to ColBERT, chunks kept after reranking
+FAISS_K = 60
+CANDIDATES_K = 30
+RERANK_K = 30
+
+# Hybrid fusion of FAISS and BM25 scores, see src/retrieval/Fusion.py. "raw" keeps the
+# original unnormalised sum over FAISS hits; the other methods also merge in the
+# FUSION_BM25_K best lexical matches.
+FUSION_METHOD = os.environ.get("FUSION_METHOD", "raw")
+FUSION_BM25_K = int(os.environ.get("FUSION_BM25_K", str(FAISS_K)))
+FUSION_DENSE_WEIGHT = float(os.environ.get("FUSION_DENSE_WEIGHT", "0.5"))
+FUSION_RRF_K = int(os.environ.get("FUSION_RRF_K", "60"))
+
+# Fused candidates whose estimated Jaccard similarity (MinHash over word 3-grams) to a
+# better-ranked candidate reaches DEDUP_THRESHOLD are dropped before reranking (0 = off).
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.8"))
+
+# Reranking cascade: ColBERT reorders the top COLBERT_N fused candidates, then the
+# cross-encoder (off unless CROSS_ENCODER_M > 0) reorders the top CROSS_ENCODER_M.
+# A stage is skipped once the previous scores separate the top candidate by
+# RERANK_EARLY_EXIT_MARGIN standard deviations (0 = never). RETRIEVAL_BUDGET_MS
+# bounds reranking time per request; over budget, stages shrink or are skipped.
+COLBERT_N = int(os.environ.get("COLBERT_N", str(CANDIDATES_K)))
+CROSS_ENCODER_M = int(os.environ.get("CROSS_ENCODER_M", "0"))
+RERANK_EARLY_EXIT_MARGIN = float(os.environ.get("RERANK_EARLY_EXIT_MARGIN", "0"))
+RETRIEVAL_BUDGET_MS = float(os.environ.get("RETRIEVAL_BUDGET_MS", "0")) or None
+
+# Final search results are cached by normalised query text and retrieval_version,
+# so a rebuilt corpus or a different FAISS mode never serves stale results.
+# RETRIEVAL_CACHE_PATH adds a SQLite tier shared across restarts and processes.
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL = float(os.environ.get("RETRIEVAL_CACHE_TTL", "3600")) or None
+RETRIEVAL_CACHE_PATH = os.environ.get("RETRIEVAL_CACHE_PATH")
+
+# Models shared by concurrent searches (report branches, batch cases, service requests).
+# The FAISS indexes, BM25, the sentence-transformer query encoders and the cross-encoder
+# only read their weights at query time and are used without locking; the caches lock
+# internally. The RAGatouille ColBERT model is not thread-safe: encoding a query sets
+# query_maxlen and rerank() sets doc_maxlen on the shared checkpoint, so a concurrent
+# call could score with the other query's lengths. Every ColBERT call holds this lock.
+_colbert_lock = threading.Lock()
+
+retrieval_cache = LRUCache(
+    RETRIEVAL_CACHE_SIZE,
+    ttl=RETRIEVAL_CACHE_TTL,
+    disk=SQLiteCacheStore(RETRIEVAL_CACHE_PATH, ttl=RETRIEVAL_CACHE_TTL) if RETRIEVAL_CACHE_PATH else None,
+    name="retrieval",
+)
+
+
 def clean_query(text):
-    """Clean the query using the medical NLP pipeline."""
-    doc = nlp(text.lower())
-    tokens = [token.lemma_ for token in doc if not token.is_stop and token.is_alpha]
-    return " ".join(tokens)
-
-def compute_query_embedding(query_text):
-    """Compute query embeddings using multiple models and average them."""
-    try:
-        emb1 = np.asarray(primary_embeddings_model.embed_query(query_text), dtype="float32")
-        emb2 = np.asarray(alternative_embeddings_model.embed_query(query_text), dtype="float32")
-        if emb1.shape != emb2.shape:
-            print(f"⚠ Inconsistent embedding shapes detected: {emb1.shape} vs {emb2.shape}. Using primary model.")
-            return emb1.reshape(1, -1)
-        return ((emb1 + emb2) / 2.0).reshape(1, -1)
-    except Exception as e:
-        raise RuntimeError(f"❌ Failed to compute embeddings: {e}")
-
-def search(query: str, embedding=None) -> Tuple[str, List[str]]:
+    """Clean the query with the QUERY_NORMALIZATION spaCy pipeline (memoized)."""
+    return normalize_query(text)
+
+def clean_queries(texts: Sequence[str]) -> List[str]:
+    """Batched `clean_query`: uncached texts go through one `nlp.pipe` pass."""
+    return normalize_queries(texts)
+
+def build_query_context(query_text: str, embedding: Optional[np.ndarray] = None) -> QueryContext:
+    """Clean and embed a query once so every later stage can reuse the result."""
+    cleaned = clean_query(query_text)
+    emb = embedding if embedding is not None else compute_query_embedding(cleaned)
+    return QueryContext(
+        text=query_text,
+        cleaned=cleaned,
+        tokens=cleaned.split(),
+        embedding=np.asarray(emb, dtype="float32").ravel().tolist(),
+    )
+
+def build_query_contexts(query_texts: Sequence[str]) -> List[QueryContext]:
+    """Batched `build_query_context`: one spaCy pipe and one forward pass per embedding model."""
+    if not query_texts:
+        return []
+    cleaned = clean_queries(query_texts)
+    embeddings = compute_query_embeddings(cleaned)
+    return [
+        QueryContext(text=text, cleaned=c, tokens=c.split(), embedding=emb.tolist())
+        for text, c, emb in zip(query_texts, cleaned, embeddings)
+    ]
+
+def fuse_candidates(contexts: Sequence[QueryContext], indices: np.ndarray,
+                    distances: np.ndarray) -> List[Tuple[List[int], List[float]]]:
+    """Fuse FAISS and BM25 scores for a batch of queries and keep the best CANDIDATES_K of each."""
+    ids, scores = fuse_scores(
+        indices,
+        dense_similarity(distances, faiss_index.metric_type == faiss.METRIC_INNER_PRODUCT),
+        bm25,
+        [ctx.tokens for ctx in contexts],
+        CANDIDATES_K,
+        n_docs=len(chunks),
+        method=FUSION_METHOD,
+        bm25_k=FUSION_BM25_K,
+        dense_weight=FUSION_DENSE_WEIGHT,
+        rrf_k=FUSION_RRF_K,
+    )
+    return split_rows(ids, scores)
+
+dedup_counter = DedupStats()
+
+def dedup(candidate_ids: List[int], fused_scores: List[float]) -> Tuple[List[int], List[float]]:
+    """Drop near-duplicate candidates and record how many chunk tokens that saved."""
+    if DEDUP_THRESHOLD <= 0 or len(candidate_ids) < 2:
+        return candidate_ids, fused_scores
+    token_counts = np.asarray(bm25.doc_len)[np.asarray(candidate_ids, dtype=np.int64)]
+    ids, scores, tokens_saved = dedup_candidates(
+        # Precomputed with the retrieval artifacts; parts without them hash the candidates on the fly.
+        candidate_ids, fused_scores, corpus.snapshot.signatures(candidate_ids), token_counts, DEDUP_THRESHOLD
+    )
+    dedup_counter.record(len(candidate_ids), len(candidate_ids) - len(ids), tokens_saved)
+    return ids, scores
+
+def chunk_texts(candidate_ids: Sequence[int]) -> List[str]:
+    """Texts of the given chunks; sharded chunks are fetched with one request per shard."""
+    current = corpus.snapshot.chunks
+    if isinstance(current, ShardedChunks):
+        return current.fetch_texts(candidate_ids)
+    return [current[idx].page_content for idx in candidate_ids]
+
+def _colbert_scores(query: str, candidate_ids: Sequence[int]) -> np.ndarray:
     """
-    Retrieves clinical context for a query.
-    Uses FAISS and BM25 to extract candidate text chunks,
-    and reranks them using ColBERT reranker.
+    ColBERT late-interaction scores. Chunks covered by the precomputed ColBERT
+    store only need the query encoded; the rest are encoded on the fly.
+    """
+    # The store covers the original base corpus only; compaction renumbers chunks.
+    if colbert_store is None or corpus.snapshot.base is not corpus.original_base:
+        return _encode_and_score(query, candidate_ids)
+    ids = np.asarray(candidate_ids, dtype=np.int64)
+    stored = ids < len(colbert_store)
+    if stored.all():
+        return colbert_store.score(_encode_colbert_query(query), ids)
+    scores = np.empty(len(ids), dtype=np.float32)
+    if stored.any():
+        scores[stored] = colbert_store.score(_encode_colbert_query(query), ids[stored])
+    scores[~stored] = _encode_and_score(query, ids[~stored].tolist())
+    return scores
+
+def _encode_colbert_query(query: str) -> np.ndarray:
+    with _colbert_lock:
+        return encode_query(get_colbert_reranker(), query)
+
+def _encode_and_score(query: str, candidate_ids: Sequence[int]) -> np.ndarray:
+    candidate_texts = chunk_texts(candidate_ids)
+    scores = np.full(len(candidate_ids), -np.inf, dtype=np.float32)
+    with _colbert_lock:
+        results = get_colbert_reranker().rerank(query, candidate_texts, k=len(candidate_texts))
+    for res in results:
+        scores[res["result_index"]] = res["score"]
+    return scores
+
+def _cross_encoder_scores(query: str, candidate_ids: Sequence[int]) -> np.ndarray:
+    pairs = [(query, text) for text in chunk_texts(candidate_ids)]
+    return np.asarray(get_cross_encoder().predict(pairs, show_progress_bar=False), dtype=np.float32)
+
+rerank_cascade = RerankCascade(
+    [RerankStage("colbert", _colbert_scores, COLBERT_N)]
+    + ([RerankStage("cross_encoder", _cross_encoder_scores, CROSS_ENCODER_M)] if CROSS_ENCODER_M > 0 else []),
+    early_exit_margin=RERANK_EARLY_EXIT_MARGIN,
+)
+
+def normalize_query_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query used for cache keys."""
+    return " ".join(text.lower().split())
+
+def _retrieval_key(text: str) -> str:
+    return make_cache_key("search", current_retrieval_version(), QUERY_NORMALIZATION, EMBEDDING_BACKEND,
+                          FAISS_K, CANDIDATES_K, RERANK_K, FUSION_METHOD, FUSION_BM25_K, FUSION_DENSE_WEIGHT, FUSION_RRF_K,
+                          DEDUP_THRESHOLD, COLBERT_N, CROSS_ENCODER_M, RERANK_EARLY_EXIT_MARGIN, normalize_query_text(text))
+
+def cache_stats() -> List[dict]:
+    """Hit/miss counters of the retrieval, query-normalization and query-embedding caches."""
+    return [retrieval_cache.stats(), normalization_cache.stats(), embedding_cache.stats()]
+
+def rerank_stats() -> dict:
+    """Run, skip and early-exit counters of the reranking cascade."""
+    return rerank_cascade.stats()
+
+def dedup_stats() -> dict:
+    """Candidates dropped as near-duplicates and the chunk tokens (whitespace-split) that saved."""
+    return dedup_counter.stats()
+
+def search_many(queries: Sequence[Union[str, QueryContext]], use_cache: bool = True,
+                budget_ms: Optional[float] = None) -> List[Tuple[str, List[str]]]:
+    """
+    Batched `search`: returns one (context, rag_chunks) tuple per query, in order.
     
-    Returns a tuple:
-      - context: concatenated string of top re-ranked chunks (from ColBERT),
-      - rag_chunks: a list of individual text chunks (from ColBERT).
+    Cached queries are answered without touching any model. The remaining
+    string queries are cleaned with a single `nlp.pipe` pass and embedded in one
+    batch per model, and all of them go through a single FAISS search call and
+    one vectorized fusion pass. Near-duplicate suppression and the reranking
+    cascade then run per query.
+    
+    `budget_ms` (default RETRIEVAL_BUDGET_MS) is the time budget of the whole
+    call; queries reranked after it runs out get cheaper, degraded rankings,
+    which are returned but not cached.
     """
-    cleaned = clean_query(query)
-    emb = embedding if embedding is not None else compute_query_embedding(cleaned)
+    budget_ms = budget_ms if budget_ms is not None else RETRIEVAL_BUDGET_MS
+    deadline = time.perf_counter() + budget_ms / 1000 if budget_ms else None
+    texts = [q.text if isinstance(q, QueryContext) else q for q in queries]
+    # One corpus snapshot for the whole call, even if new segments are published meanwhile
+    with corpus.reading():
+        keys = [_retrieval_key(text) for text in texts]
+        results: List[Optional[Tuple[str, List[str]]]] = [
+            retrieval_cache.get(key) if use_cache else None for key in keys
+        ]
+        todo = [i for i, result in enumerate(results) if result is None]
     
-    k = 60
-    distances, indices = faiss_index.search(emb, k)
-    bm25_scores = bm25.get_scores(cleaned.split())
-    scores = []
-    for idx, faiss_dist in zip(indices[0], distances[0]):
-        if 0 <= idx < len(chunks):
-            score = -faiss_dist + bm25_scores[idx]
-            scores.append((idx, score))
-    scores.sort(key=lambda x: x[1], reverse=True)
+        contexts = {i: queries[i] for i in todo if isinstance(queries[i], QueryContext)}
+        pending = [i for i in todo if i not in contexts]
+        contexts.update(zip(pending, build_query_contexts([queries[i] for i in pending])))
     
-    top_indices = [idx for idx, _ in scores[:30]]
-    candidate_texts = [chunks[idx].page_content for idx in top_indices]
+        if todo:
+            embeddings = np.vstack([contexts[i].embedding_array() for i in todo])
+            distances, indices = faiss_index.search(embeddings, FAISS_K)
+            fused = fuse_candidates([contexts[i] for i in todo], indices, distances)
+            for i, (top_indices, fused_scores) in zip(todo, fused):
+                top_indices, fused_scores = dedup(top_indices, fused_scores)
+                ranking, trace = rerank_cascade.run(contexts[i].text, top_indices, fused_scores, deadline)
+                colbert_candidates = chunk_texts(ranking[:RERANK_K])
+                results[i] = ("\n".join(colbert_candidates), colbert_candidates)
+                if use_cache and not trace["degraded"]:
+                    retrieval_cache.set(keys[i], results[i])
     
-    k_final = 30
-    reranked_results = colbert_reranker.rerank(query, candidate_texts, k=k_final)
-    colbert_candidates = [candidate_texts[res["result_index"]] for res in reranked_results]
+    # Hand out copies so callers cannot mutate cached chunk lists
+    return [(context, list(rag_chunks)) for context, rag_chunks in results]
+
+def search(query: Union[str, QueryContext], embedding=None, budget_ms: Optional[float] = None) -> Tuple[str, List[str]]:
+    """
+    Retrieves clinical context for a query.
+    Uses FAISS and BM25 to extract candidate text chunks,
+    and reranks them with the ColBERT (and optional cross-encoder) cascade
+    within `budget_ms`.
     
-    # print("\n📖 Retrieval Results:")
-    # for i, text in enumerate(colbert_candidates):
-    #     print(f"Rank {i+1}: {text[:300]}...")
+    `query` may be a raw string or a QueryContext from `build_query_context`;
+    a context skips query cleaning and embedding entirely.
     
-    retrieved_context = "\n".join(colbert_candidates)
-    return retrieved_context, colbert_candidates
+    Returns a tuple:
+      - context: concatenated string of top re-ranked chunks (from ColBERT),
+      - rag_chunks: a list of individual text chunks (from ColBERT).
+    """
+    if embedding is not None and not isinstance(query, QueryContext):
+        query = build_query_context(query, embedding)
+    return search_many([query], budget_ms=budget_ms)[0]
 
 def final_answer(answer: str) -> dict:
     """
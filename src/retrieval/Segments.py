@@ -0,0 +1,514 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+
+from src.retrieval.ArtifactStore import open_artifacts
+from src.retrieval.BM25Index import BM25Index, top_k_by_score
+from src.retrieval.Dedup import minhash_signatures
+from src.retrieval.VectorIndex import load_index, merge_search_results
+from src.utils.Cache import make_cache_key
+
+# Incremental corpus layout. The base corpus (the original artifacts and FAISS
+# index, or the output of the last compaction) is followed by append-only
+# segments; documents are addressed by one global id space, base first.
+#   manifest.json        version, base, segment list and tombstoned global ids
+#   seg-<version>/       retrieval artifacts of the segment plus faiss.idx (exact)
+#   base-<version>/      compacted base: retrieval_artifacts/ and faiss_index_D.idx
+SEGMENTS_DIR = os.environ.get("SEGMENTS_DIR", "./data/segments")
+SEGMENT_MANIFEST = "manifest.json"
+SEGMENT_INDEX_FILE = "faiss.idx"
+COMPACTED_INDEX_FILE = "faiss_index_D.idx"
+COMPACTED_ARTIFACTS_DIR = "retrieval_artifacts"
+
+# Largest relative difference between GlobalBM25 scores and those of a BM25 index
+# rebuilt over the live corpus. The average idf behind the epsilon floor sums the
+# terms in a different order, so floored terms may differ in the last bits; checked by
+# `python -m scripts.ingest_documents verify`.
+GLOBAL_BM25_RTOL = 1e-12
+
+
+def read_manifest(segments_dir: Optional[str]) -> Dict[str, Any]:
+    """The current segment manifest; an absent one (or no directory) describes the bare base corpus."""
+    path = os.path.join(segments_dir, SEGMENT_MANIFEST) if segments_dir else None
+    if path is None or not os.path.exists(path):
+        return {"version": 0, "base": None, "segments": [], "tombstones": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(segments_dir: str, manifest: Dict[str, Any]) -> None:
+    """Atomically replace the manifest; readers see either the old or the new version."""
+    os.makedirs(segments_dir, exist_ok=True)
+    tmp_path = os.path.join(segments_dir, f".{SEGMENT_MANIFEST}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, os.path.join(segments_dir, SEGMENT_MANIFEST))
+
+
+@contextmanager
+def manifest_lock(segments_dir: Optional[str]) -> Iterator[None]:
+    """Exclusive cross-process lock for read-modify-write cycles of the manifest."""
+    if not segments_dir:
+        raise RuntimeError("❌ This corpus has no segments directory, so documents cannot be added or deleted.")
+    os.makedirs(segments_dir, exist_ok=True)
+    with open(os.path.join(segments_dir, ".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class CorpusPart:
+    """One contiguous slice of the global id space: the base corpus or a segment."""
+
+    def __init__(self, name: str, chunks: Sequence[Any], bm25: BM25Index, index: faiss.Index,
+                 minhash: Optional[np.ndarray] = None, version: str = ""):
+        self.name = name
+        self.chunks = chunks
+        self.bm25 = bm25
+        self.index = index
+        self.minhash = minhash
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def text(self, i: int) -> str:
+        return self.chunks.text(i) if hasattr(self.chunks, "text") else self.chunks[i].page_content
+
+
+def open_segment(segments_dir: str, name: str) -> CorpusPart:
+    path = os.path.join(segments_dir, name)
+    artifacts = open_artifacts(path)
+    index = faiss.read_index(os.path.join(path, SEGMENT_INDEX_FILE))
+    return CorpusPart(name, artifacts.chunks, artifacts.bm25, index, artifacts.minhash, artifacts.version)
+
+
+def open_compacted_base(path: str, mode: Optional[str] = None) -> CorpusPart:
+    artifacts = open_artifacts(os.path.join(path, COMPACTED_ARTIFACTS_DIR))
+    index = load_index(os.path.join(path, COMPACTED_INDEX_FILE), mode)
+    return CorpusPart(os.path.basename(path.rstrip(os.sep)), artifacts.chunks, artifacts.bm25, index,
+                      artifacts.minhash, artifacts.version)
+
+
+def _vocab_items(vocab: Any) -> Iterator[Tuple[str, int]]:
+    # In-memory indexes map term -> id; persisted ones are a SortedVocab over the term list.
+    if isinstance(vocab, dict):
+        return iter(vocab.items())
+    return ((term, i) for i, term in enumerate(vocab.terms))
+
+
+class GlobalBM25:
+    """
+    BM25Okapi over the live documents of all parts, scored from the per-part postings.
+
+    Document frequencies are summed across parts (minus tombstoned documents),
+    so idf, the epsilon floor and the length normalisation are those of one
+    index built over the live corpus. Scores match a full rebuild to a relative
+    GLOBAL_BM25_RTOL (the average idf of the epsilon floor is summed in another
+    term order; see `rebuild_error`); dead documents are never returned by `top_k`.
+    """
+
+    def __init__(self, parts: List[CorpusPart], offsets: np.ndarray, tombstones: np.ndarray, epsilon: float = 0.25):
+        base = parts[0].bm25
+        self.parts = parts
+        self.offsets = offsets
+        self.tombstones = tombstones
+        self.k1 = base.k1
+        self.b = base.b
+        self.epsilon = epsilon
+
+        base_df = np.diff(np.asarray(base.indptr)).astype(np.int64)
+        extra_df: Dict[str, int] = {}
+        for part in parts[1:]:
+            indptr = np.asarray(part.bm25.indptr)
+            for term, term_id in _vocab_items(part.bm25.vocab):
+                df = int(indptr[term_id + 1] - indptr[term_id])
+                base_id = base.vocab.get(term)
+                if base_id is not None:
+                    base_df[base_id] += df
+                else:
+                    extra_df[term] = extra_df.get(term, 0) + df
+
+        self.doc_len = np.concatenate([np.asarray(part.bm25.doc_len, dtype=np.int64) for part in parts])
+        live = np.ones(len(self.doc_len), dtype=bool)
+        live[tombstones] = False
+        for doc_id in tombstones.tolist():
+            part = int(np.searchsorted(offsets, doc_id, side="right") - 1)
+            for term in set(parts[part].text(doc_id - int(offsets[part])).split()):
+                base_id = base.vocab.get(term)
+                if base_id is not None:
+                    base_df[base_id] -= 1
+                else:
+                    extra_df[term] -= 1
+
+        self.corpus_size = int(live.sum())
+        self.avgdl = int(self.doc_len[live].sum()) / max(self.corpus_size, 1)
+        self.norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+
+        extra_terms = list(extra_df)
+        all_df = np.concatenate([base_df, np.asarray([extra_df[t] for t in extra_terms], dtype=np.int64)])
+        present = all_df > 0
+        idf = np.zeros(len(all_df), dtype=np.float64)
+        idf[present] = BM25Index.compute_idf(all_df[present], self.corpus_size, epsilon)
+        self.base_idf = idf[:len(base_df)]
+        self.extra_idf = dict(zip(extra_terms, idf[len(base_df):].tolist()))
+
+    def rebuild_error(self, queries: Sequence[Sequence[str]]) -> float:
+        """
+        Largest relative score difference to a BM25 index rebuilt over the live documents.
+
+        Args:
+            queries: Tokenized queries, each scored against every live document
+
+        Returns:
+            float: max |global - rebuilt| / max(|rebuilt|, 1) over queries and documents
+        """
+        live = np.ones(len(self.doc_len), dtype=bool)
+        live[self.tombstones] = False
+        live_ids = np.flatnonzero(live)
+        owner = np.searchsorted(self.offsets, live_ids, side="right") - 1
+        rebuilt = BM25Index.from_tokenized(
+            (self.parts[p].text(int(i - self.offsets[p])).split() for i, p in zip(live_ids.tolist(), owner.tolist())),
+            k1=self.k1, b=self.b, epsilon=self.epsilon,
+        )
+        local_ids = np.arange(len(live_ids))
+        error = 0.0
+        for query in queries:
+            expected = rebuilt.score_candidates(query, local_ids)
+            actual = self.score_candidates(query, live_ids)
+            error = max(error, float(np.max(np.abs(actual - expected) / np.maximum(np.abs(expected), 1.0), initial=0.0)))
+        return error
+
+    def _idf(self, term: str) -> float:
+        base_id = self.parts[0].bm25.vocab.get(term)
+        if base_id is not None:
+            return float(self.base_idf[base_id])
+        return self.extra_idf.get(term, 0.0)
+
+    @staticmethod
+    def _local_postings(bm25: BM25Index, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        term_id = bm25.vocab.get(term)
+        if term_id is None:
+            return None
+        start, end = bm25.indptr[term_id], bm25.indptr[term_id + 1]
+        return bm25.doc_ids[start:end], bm25.term_freqs[start:end]
+
+    def _contribution(self, tf: np.ndarray, docs: np.ndarray, idf: float) -> np.ndarray:
+        tf = tf.astype(np.int64)
+        return idf * (tf * (self.k1 + 1) / (tf + self.norm[docs]))
+
+    def score_candidates(self, query: Sequence[str], candidate_ids: Sequence[int]) -> np.ndarray:
+        """Same contract as BM25Index.score_candidates, over global ids."""
+        candidates = np.asarray(candidate_ids, dtype=np.int64)
+        scores = np.zeros(len(candidates), dtype=np.float64)
+        if not len(candidates):
+            return scores
+        owner = np.searchsorted(self.offsets, candidates, side="right") - 1
+        for term in query:
+            idf = self._idf(term)
+            if not idf:
+                continue
+            for p, part in enumerate(self.parts):
+                mask = owner == p
+                if not mask.any():
+                    continue
+                postings = self._local_postings(part.bm25, term)
+                if postings is None:
+                    continue
+                docs, tfs = postings
+                local = candidates[mask] - self.offsets[p]
+                pos = np.searchsorted(docs, local)
+                pos[pos >= len(docs)] = 0
+                hit = docs[pos] == local
+                if hit.any():
+                    rows = np.flatnonzero(mask)[hit]
+                    scores[rows] += self._contribution(tfs[pos[hit]], candidates[rows], idf)
+        return scores
+
+    def top_k(self, query: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract as BM25Index.top_k, over live global ids."""
+        scores = np.zeros(len(self.doc_len), dtype=np.float64)
+        touched = []
+        for term in query:
+            idf = self._idf(term)
+            if not idf:
+                continue
+            for p, part in enumerate(self.parts):
+                postings = self._local_postings(part.bm25, term)
+                if postings is None:
+                    continue
+                docs = postings[0].astype(np.int64) + self.offsets[p]
+                scores[docs] += self._contribution(postings[1], docs, idf)
+                touched.append(docs)
+        if not touched or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        candidates = np.unique(np.concatenate(touched))
+        candidates = candidates[~np.isin(candidates, self.tombstones)]
+        return top_k_by_score(candidates, scores[candidates], k)
+
+
+    def score_candidates_many(self, queries: Sequence[Sequence[str]],
+                              candidate_ids: Sequence[Sequence[int]]) -> List[np.ndarray]:
+        """`score_candidates` for a batch of queries, each with its own candidates."""
+        return [self.score_candidates(query, ids) for query, ids in zip(queries, candidate_ids)]
+
+    def top_k_many(self, queries: Sequence[Sequence[str]], k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """`top_k` for a batch of queries."""
+        return [self.top_k(query, k) for query in queries]
+
+class SegmentedVectorIndex:
+    """FAISS-compatible `search` over every part, with global ids and tombstones filtered out."""
+
+    def __init__(self, parts: List[CorpusPart], offsets: np.ndarray, tombstones: np.ndarray):
+        self.parts = parts
+        self.offsets = offsets
+        self.tombstones = tombstones
+        base = parts[0].index
+        self.metric_type = base.metric_type
+        self.d = base.d
+        self.ntotal = int(sum(part.index.ntotal for part in parts))
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        fetch = k + len(self.tombstones)
+        all_d, all_i = [], []
+        for part, offset in zip(self.parts, self.offsets):
+            if part.index.ntotal == 0:
+                continue
+            distances, ids = part.index.search(x, min(fetch, part.index.ntotal))
+            all_d.append(distances)
+            all_i.append(np.where(ids >= 0, ids + offset, -1))
+        return merge_search_results(all_d, all_i, k, self.metric_type == faiss.METRIC_INNER_PRODUCT,
+                                    exclude=self.tombstones)
+
+
+class SegmentedChunks(Sequence[Document]):
+    """Global-id view over the chunks of every part."""
+
+    def __init__(self, parts: List[CorpusPart], offsets: np.ndarray):
+        self.parts = parts
+        self.offsets = offsets
+        self._total = int(offsets[-1] + len(parts[-1]))
+
+    def __len__(self) -> int:
+        return self._total
+
+    def _locate(self, i: int) -> Tuple[CorpusPart, int]:
+        if i < 0:
+            i += self._total
+        if not 0 <= i < self._total:
+            raise IndexError(i)
+        p = int(np.searchsorted(self.offsets, i, side="right") - 1)
+        return self.parts[p], i - int(self.offsets[p])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        part, local = self._locate(int(i))
+        return part.chunks[local]
+
+    def __iter__(self) -> Iterator[Document]:
+        for part in self.parts:
+            yield from part.chunks
+
+    def text(self, i: int) -> str:
+        part, local = self._locate(int(i))
+        return part.text(local)
+
+
+class CorpusSnapshot:
+    """Immutable view of the corpus at one manifest version."""
+
+    def __init__(self, parts: List[CorpusPart], tombstones: Sequence[int], version: int, epsilon: float = 0.25):
+        self.parts = parts
+        self.version = version
+        self.offsets = np.cumsum([0] + [len(part) for part in parts[:-1]]).astype(np.int64)
+        self.tombstones = np.unique(np.asarray(tombstones, dtype=np.int64))
+        if len(parts) == 1 and not len(self.tombstones):
+            # Nothing appended or deleted: serve the base structures directly.
+            self.chunks, self.bm25, self.faiss_index = parts[0].chunks, parts[0].bm25, parts[0].index
+        else:
+            self.chunks = SegmentedChunks(parts, self.offsets)
+            self.bm25 = GlobalBM25(parts, self.offsets, self.tombstones, epsilon)
+            self.faiss_index = SegmentedVectorIndex(parts, self.offsets, self.tombstones)
+
+    @property
+    def base(self) -> CorpusPart:
+        return self.parts[0]
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1] + len(self.parts[-1]))
+
+    def signatures(self, ids: Sequence[int]) -> np.ndarray:
+        """MinHash signatures of global ids; parts without stored signatures hash their texts."""
+        ids = np.asarray(ids, dtype=np.int64)
+        owner = np.searchsorted(self.offsets, ids, side="right") - 1
+        rows = None
+        # One lookup per part, so stored signatures are gathered with a single fancy index.
+        for p in np.unique(owner).tolist():
+            mask = owner == p
+            part, local = self.parts[p], ids[mask] - self.offsets[p]
+            if part.minhash is not None:
+                signatures = np.asarray(part.minhash[local])
+            else:
+                signatures = minhash_signatures([part.text(i) for i in local.tolist()])
+            if rows is None:
+                rows = np.empty((len(ids), signatures.shape[1]), dtype=np.uint32)
+            rows[mask] = signatures
+        return rows if rows is not None else np.empty((0, 0), dtype=np.uint32)
+
+
+class _ReadWriteLock:
+    """
+    Many concurrent readers or one writer; used so a request never sees two snapshots.
+    A waiting writer blocks new readers, so a steady stream of requests cannot starve a refresh.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            self._cond.wait_for(lambda: not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                self._cond.wait_for(lambda: self._readers == 0)
+                yield
+            finally:
+                self._writers_waiting -= 1
+                self._cond.notify_all()
+
+
+class _LiveView:
+    """Proxy that always resolves to the corresponding object of the current snapshot."""
+
+    def __init__(self, corpus: "SegmentedCorpus", attr: str):
+        self._corpus = corpus
+        self._attr = attr
+
+    def _target(self):
+        return getattr(self._corpus.snapshot, self._attr)
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __len__(self) -> int:
+        return len(self._target())
+
+    def __getitem__(self, i):
+        return self._target()[i]
+
+    def __iter__(self):
+        return iter(self._target())
+
+
+class SegmentedCorpus:
+    """
+    The base corpus plus the segments listed in the manifest, refreshed in place.
+
+    `chunks`, `bm25` and `faiss_index` are live proxies, so modules that
+    imported them keep working across refreshes. A refresh builds the new
+    snapshot first and swaps it in under the write lock; wrap each request in
+    `reading()` so it sees a single snapshot from start to finish.
+    """
+
+    def __init__(self, base: CorpusPart, segments_dir: str = SEGMENTS_DIR, base_faiss_path: Optional[str] = None,
+                 index_mode: Optional[str] = None, epsilon: float = 0.25):
+        self.original_base = base
+        self.segments_dir = segments_dir
+        self.base_faiss_path = base_faiss_path
+        self.index_mode = index_mode
+        self.epsilon = epsilon
+        self._lock = _ReadWriteLock()
+        self._refresh_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+        self.snapshot = CorpusSnapshot([base], [], 0, epsilon)
+        self.manifest: Dict[str, Any] = read_manifest(segments_dir)
+        self.chunks = _LiveView(self, "chunks")
+        self.bm25 = _LiveView(self, "bm25")
+        self.faiss_index = _LiveView(self, "faiss_index")
+        self.refresh(force=True)
+
+    @property
+    def version(self) -> str:
+        """Identifies the corpus contents; changes with every manifest version and base."""
+        return make_cache_key(self.snapshot.base.version, self.snapshot.version)[:16]
+
+    @contextmanager
+    def reading(self) -> Iterator[CorpusSnapshot]:
+        with self._lock.read():
+            yield self.snapshot
+
+    def refresh(self, force: bool = False) -> bool:
+        """Load the manifest and swap in a new snapshot if its version changed."""
+        with self._refresh_lock:
+            manifest = read_manifest(self.segments_dir)
+            if not force and manifest["version"] == self.snapshot.version:
+                return False
+            opened = {part.name: part for part in self.snapshot.parts}
+            base_info = manifest.get("base")
+            if base_info is None:
+                base = self.original_base
+            else:
+                base = opened.get(os.path.basename(base_info["path"].rstrip(os.sep))) or \
+                    open_compacted_base(base_info["path"], self.index_mode)
+            parts = [base] + [opened.get(seg["name"]) or open_segment(self.segments_dir, seg["name"])
+                              for seg in manifest["segments"]]
+            snapshot = CorpusSnapshot(parts, manifest["tombstones"], manifest["version"], self.epsilon)
+            with self._lock.write():
+                self.snapshot = snapshot
+                self.manifest = manifest
+        if manifest["version"]:
+            print(f"✅ Corpus at manifest version {manifest['version']}: {len(parts) - 1} segment(s), "
+                  f"{len(snapshot)} chunks, {len(snapshot.tombstones)} tombstoned.")
+        return True
+
+    def watch(self, interval: float) -> threading.Thread:
+        """Poll the manifest every `interval` seconds in a daemon thread until `stop_watching`."""
+        def loop(stop: threading.Event):
+            while not stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"⚠ Failed to refresh corpus segments: {e}")
+
+        if self._watcher is None:
+            self._stop_watching = threading.Event()
+            self._watcher = threading.Thread(target=loop, args=(self._stop_watching,), name="segment-watcher",
+                                             daemon=True)
+            self._watcher.start()
+        return self._watcher
+
+    def stop_watching(self, timeout: Optional[float] = None) -> None:
+        """Stop the manifest watcher started by `watch` and wait up to `timeout` seconds for it."""
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            self._stop_watching.set()
+            watcher.join(timeout)
+
+    def close(self) -> None:
+        self.stop_watching()
@@ -0,0 +1,554 @@
+import atexit
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+
+from src.retrieval.ArtifactStore import build_artifacts, open_artifacts
+from src.retrieval.BM25Index import BM25Index, top_k_by_score
+from src.retrieval.Segments import _vocab_items
+from src.retrieval.VectorIndex import build_index, index_path_for, load_index, merge_search_results
+from src.utils.Cache import make_cache_key
+
+# Sharded layout written by `python -m scripts.build_shards`. Shard i holds the
+# contiguous id range [offset_i, offset_i + n_docs_i) of the base corpus.
+#   shards.json                      shard list, corpus size and the source artifact build
+#   shard-<i>/retrieval_artifacts/   chunk texts, MinHash signatures and the shard's BM25
+#                                    postings with corpus-wide idf and length norms
+#   shard-<i>/faiss_index_D.idx      exact index of the shard's vectors (+ index mode variants)
+# Each shard is served by its own process over an AF_UNIX socket; ShardedCorpus
+# scatters requests to them and merges the results.
+SHARDS_MANIFEST = "shards.json"
+SHARD_ARTIFACTS_DIR = "retrieval_artifacts"
+SHARD_INDEX_FILE = "faiss_index_D.idx"
+
+# OpenMP threads per shard process for FAISS (0 = cores divided evenly between shards)
+SHARD_OMP_THREADS = int(os.environ.get("SHARD_OMP_THREADS", "0"))
+SHARD_START_TIMEOUT = float(os.environ.get("SHARD_START_TIMEOUT", "120"))
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def has_shards(path: str) -> bool:
+    return os.path.exists(os.path.join(path, SHARDS_MANIFEST))
+
+
+def read_shards_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, SHARDS_MANIFEST)) as f:
+        return json.load(f)
+
+
+def shard_bounds(n_docs: int, n_shards: int) -> List[Tuple[int, int]]:
+    """Contiguous, near-equal [start, stop) id ranges."""
+    edges = np.linspace(0, n_docs, n_shards + 1).round().astype(np.int64)
+    return [(int(edges[i]), int(edges[i + 1])) for i in range(n_shards)]
+
+
+def slice_bm25(bm25: BM25Index, terms: Sequence[str], start: int, stop: int) -> BM25Index:
+    """
+    BM25 postings of documents [start, stop), renumbered from 0.
+
+    idf, avgdl and the per-document length norms are copied from the full
+    index rather than recomputed, so every shard scores a document exactly as
+    the unsharded index does.
+
+    Args:
+        bm25 (BM25Index): Index over the whole corpus
+        terms: Term of every term id of `bm25`
+    """
+    indptr, doc_ids = np.asarray(bm25.indptr), np.asarray(bm25.doc_ids)
+    keep = (doc_ids >= start) & (doc_ids < stop)
+    term_of = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    counts = np.bincount(term_of[keep], minlength=len(indptr) - 1)
+    present = np.flatnonzero(counts)
+    shard_indptr = np.zeros(len(present) + 1, dtype=np.int64)
+    shard_indptr[1:] = np.cumsum(counts[present])
+    return BM25Index(
+        {terms[t]: i for i, t in enumerate(present.tolist())},
+        shard_indptr,
+        (doc_ids[keep] - start).astype(doc_ids.dtype),
+        np.asarray(bm25.term_freqs)[keep],
+        np.asarray(bm25.doc_len)[start:stop],
+        np.asarray(bm25.idf)[present],
+        bm25.avgdl,
+        k1=bm25.k1,
+        b=bm25.b,
+        norm=np.asarray(bm25.norm)[start:stop],
+    )
+
+
+def build_shards(
+    chunks: Sequence[Any],
+    bm25: BM25Index,
+    vectors: np.ndarray,
+    output_dir: str,
+    n_shards: int,
+    metric: int = faiss.METRIC_L2,
+    signatures: Optional[np.ndarray] = None,
+    index_modes: Sequence[str] = (),
+    source_build_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Split the base corpus into `n_shards` contiguous shards.
+
+    Args:
+        chunks: The base chunks, in global id order
+        bm25 (BM25Index): BM25 over all `chunks`
+        vectors (np.ndarray): (n, d) vectors of the exact index, aligned with `chunks`
+        output_dir (str): Destination directory, replaced atomically
+        metric (int): FAISS metric of the exact index
+        signatures (np.ndarray): MinHash signatures aligned with `chunks` (computed if None)
+        index_modes: Approximate FAISS modes to build per shard as well (see VectorIndex)
+        source_build_id (str): Build id of the retrieval artifacts the shards were cut from
+
+    Returns:
+        dict: The written shards manifest
+    """
+    if not 1 <= n_shards <= max(len(chunks), 1):
+        raise ValueError(f"❌ Cannot split {len(chunks)} chunks into {n_shards} shards.")
+    staging_dir = f"{output_dir.rstrip(os.sep)}.tmp"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    terms = [""] * len(bm25.vocab)
+    for term, i in _vocab_items(bm25.vocab):
+        terms[i] = term
+    shards = []
+    for i, (start, stop) in enumerate(shard_bounds(len(chunks), n_shards)):
+        name = f"shard-{i:02d}"
+        path = os.path.join(staging_dir, name)
+        os.makedirs(path)
+        manifest = build_artifacts(
+            [chunks[j] for j in range(start, stop)],
+            os.path.join(path, SHARD_ARTIFACTS_DIR),
+            bm25=slice_bm25(bm25, terms, start, stop),
+            signatures=signatures[start:stop] if signatures is not None else None,
+            extra={"shard": {"index": i, "offset": start, "n_total": len(chunks), "source_build_id": source_build_id}},
+        )
+        shard_vectors = np.ascontiguousarray(vectors[start:stop], dtype="float32")
+        flat = faiss.IndexFlat(shard_vectors.shape[1], metric)
+        flat.add(shard_vectors)
+        index_path = os.path.join(path, SHARD_INDEX_FILE)
+        faiss.write_index(flat, index_path)
+        for mode in index_modes:
+            faiss.write_index(build_index(shard_vectors, mode, metric), index_path_for(index_path, mode))
+        shards.append({"name": name, "offset": start, "n_docs": stop - start, "build_id": manifest["build_id"]})
+        print(f"✅ Built {name}: chunks {start}-{stop - 1}")
+
+    manifest = {
+        "build_id": make_cache_key(*(shard["build_id"] for shard in shards))[:16],
+        "source_build_id": source_build_id,
+        "created_at": datetime.datetime.now().isoformat(),
+        "n_docs": len(chunks),
+        "n_shards": n_shards,
+        "index_modes": list(index_modes),
+        "shards": shards,
+    }
+    with open(os.path.join(staging_dir, SHARDS_MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=4)
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.replace(staging_dir, output_dir)
+    return manifest
+
+
+class ShardServer:
+    """Retrieval structures of one shard, answering requests with global ids."""
+
+    def __init__(self, path: str, index_mode: Optional[str] = None):
+        self.path = path
+        self.artifacts = open_artifacts(os.path.join(path, SHARD_ARTIFACTS_DIR))
+        shard = self.artifacts.manifest["shard"]
+        self.shard_index = shard["index"]
+        self.offset = shard["offset"]
+        self.source_build_id = shard["source_build_id"]
+        self.index = load_index(os.path.join(path, SHARD_INDEX_FILE), index_mode)
+        self.chunks = self.artifacts.chunks
+        self.bm25 = self.artifacts.bm25
+        self._ops = {
+            "info": self.info,
+            "search": self.search,
+            "bm25_top_k_many": self.bm25_top_k_many,
+            "bm25_scores_many": self.bm25_scores_many,
+            "bm25_all_scores": self.bm25_all_scores,
+            "documents": self.documents,
+            "texts": self.texts,
+            "signatures": self.signatures,
+        }
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "index": self.shard_index,
+            "offset": self.offset,
+            "n_docs": len(self.chunks),
+            "d": self.index.d,
+            "metric_type": self.index.metric_type,
+            "build_id": self.artifacts.version,
+            "source_build_id": self.source_build_id,
+            "avgdl": self.bm25.avgdl,
+            "doc_len": np.asarray(self.bm25.doc_len),
+            "has_signatures": self.artifacts.minhash is not None,
+        }
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances, ids = self.index.search(x, min(k, self.index.ntotal))
+        return distances, np.where(ids >= 0, ids + self.offset, -1)
+
+    def bm25_top_k(self, query: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        ids, scores = self.bm25.top_k(query, k)
+        return ids + self.offset, scores
+
+    def bm25_scores(self, query: Sequence[str], ids: np.ndarray) -> np.ndarray:
+        return self.bm25.score_candidates(query, np.asarray(ids) - self.offset)
+
+    def bm25_top_k_many(self, queries: Sequence[Sequence[str]], k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return [self.bm25_top_k(query, k) for query in queries]
+
+    def bm25_scores_many(self, queries: Sequence[Sequence[str]], ids: Sequence[np.ndarray]) -> List[np.ndarray]:
+        return [self.bm25_scores(query, query_ids) for query, query_ids in zip(queries, ids)]
+
+    def bm25_all_scores(self, query: Sequence[str]) -> np.ndarray:
+        return self.bm25.get_scores(query)
+
+    def documents(self, ids: np.ndarray) -> List[Tuple[str, Dict[str, Any]]]:
+        docs = [self.chunks[int(i) - self.offset] for i in ids]
+        return [(doc.page_content, doc.metadata) for doc in docs]
+
+    def texts(self, ids: np.ndarray) -> List[str]:
+        return [self.chunks.text(int(i) - self.offset) for i in ids]
+
+    def signatures(self, ids: np.ndarray) -> np.ndarray:
+        return np.asarray(self.artifacts.minhash[np.asarray(ids) - self.offset])
+
+    def handle(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    conn.send(("ok", self._ops[op](*args)))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def serve_shard(path: str, address: str, authkey: bytes, index_mode: Optional[str] = None,
+                omp_threads: int = 0) -> None:
+    """Serve one shard on an AF_UNIX socket until the parent process exits."""
+    if omp_threads > 0:
+        faiss.omp_set_num_threads(omp_threads)
+    server = ShardServer(path, index_mode)
+    parent = os.getppid()
+
+    def watch_parent():
+        # Shards are owned by the coordinator; do not outlive it.
+        while os.getppid() == parent:
+            time.sleep(1.0)
+        os._exit(0)
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+    with Listener(address, family="AF_UNIX", authkey=authkey) as listener:
+        print(f"✅ Shard {server.shard_index} serving {len(server.chunks)} chunks on '{address}'.")
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=server.handle, args=(conn,), daemon=True).start()
+
+
+class ShardClient:
+    """Connections to one shard server; each thread gets its own, so requests never interleave."""
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self) -> Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        return conn
+
+    def _reset(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def send(self, op: str, *args) -> None:
+        try:
+            self._connection().send((op, args))
+        except (OSError, EOFError):
+            self._reset()
+            raise
+
+    def recv(self) -> Any:
+        try:
+            status, value = self._connection().recv()
+        except (OSError, EOFError):
+            self._reset()
+            raise
+        if status != "ok":
+            raise RuntimeError(f"❌ Shard at '{self.address}' failed: {value}")
+        return value
+
+    def call(self, op: str, *args) -> Any:
+        self.send(op, *args)
+        return self.recv()
+
+
+class ShardedVectorIndex:
+    """FAISS-compatible `search` that queries every shard and merges their top-k."""
+
+    def __init__(self, corpus: "ShardedCorpus", d: int, metric_type: int):
+        self.corpus = corpus
+        self.d = d
+        self.metric_type = metric_type
+        self.ntotal = corpus.n_docs
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.ascontiguousarray(x, dtype="float32")
+        results = self.corpus.scatter("search", [(x, k)] * len(self.corpus.clients))
+        return merge_search_results([d for d, _ in results], [i for _, i in results], k,
+                                    self.metric_type == faiss.METRIC_INNER_PRODUCT)
+
+
+class ShardedBM25:
+    """BM25Index interface over the shards; scores equal those of the unsharded index."""
+
+    def __init__(self, corpus: "ShardedCorpus", doc_len: np.ndarray, avgdl: float):
+        self.corpus = corpus
+        self.doc_len = doc_len
+        self.avgdl = avgdl
+        self.corpus_size = len(doc_len)
+
+    def score_candidates(self, query: Sequence[str], candidate_ids: Sequence[int]) -> np.ndarray:
+        return self.score_candidates_many([query], [candidate_ids])[0]
+
+    def top_k(self, query: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.top_k_many([query], k)[0]
+
+    def score_candidates_many(self, queries: Sequence[Sequence[str]],
+                              candidate_ids: Sequence[Sequence[int]]) -> List[np.ndarray]:
+        """Scores for a batch of queries with one request per shard."""
+        candidates = [np.asarray(ids, dtype=np.int64) for ids in candidate_ids]
+        routes = [self.corpus.route(ids) for ids in candidates]
+        n_shards = len(self.corpus.clients)
+        # Every shard gets every query, with the (possibly empty) candidates it owns.
+        requests = [([list(query) for query in queries],
+                     [r[s][1] if r[s][1] is not None else np.empty(0, dtype=np.int64) for r in routes])
+                    for s in range(n_shards)]
+        results = self.corpus.scatter("bm25_scores_many", requests)
+        scores = [np.zeros(len(ids), dtype=np.float64) for ids in candidates]
+        for s, shard_scores in enumerate(results):
+            for q, query_scores in enumerate(shard_scores):
+                positions = routes[q][s][0]
+                if positions is not None:
+                    scores[q][positions] = query_scores
+        return scores
+
+    def top_k_many(self, queries: Sequence[Sequence[str]], k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Exact top-k for a batch of queries: the global top-k is within the union of the shards' top-k."""
+        results = self.corpus.scatter("bm25_top_k_many", [([list(q) for q in queries], k)] * len(self.corpus.clients))
+        merged = []
+        for q in range(len(queries)):
+            ids = np.concatenate([shard[q][0] for shard in results]).astype(np.int64)
+            scores = np.concatenate([shard[q][1] for shard in results])
+            merged.append(top_k_by_score(ids, scores, k))
+        return merged
+
+    def get_scores(self, query: Sequence[str]) -> np.ndarray:
+        return np.concatenate(self.corpus.scatter("bm25_all_scores", [(list(query),)] * len(self.corpus.clients)))
+
+
+class ShardedChunks(Sequence[Document]):
+    """Chunk texts stay in the shard processes and are fetched by id."""
+
+    def __init__(self, corpus: "ShardedCorpus"):
+        self.corpus = corpus
+
+    def __len__(self) -> int:
+        return self.corpus.n_docs
+
+    def _shard_of(self, i: int) -> int:
+        if not 0 <= i < self.corpus.n_docs:
+            raise IndexError(i)
+        return int(np.searchsorted(self.corpus.offsets, i, side="right") - 1)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i) + (self.corpus.n_docs if int(i) < 0 else 0)
+        text, metadata = self.corpus.clients[self._shard_of(i)].call("documents", [i])[0]
+        return Document(page_content=text, metadata=metadata)
+
+    def text(self, i: int) -> str:
+        return self.corpus.clients[self._shard_of(int(i))].call("texts", [int(i)])[0]
+
+    def fetch_texts(self, ids: Sequence[int]) -> List[str]:
+        """Texts of many chunks with one request per shard."""
+        ids = np.asarray(ids, dtype=np.int64)
+        out: List[Optional[str]] = [None] * len(ids)
+        routes = self.corpus.route(ids)
+        results = self.corpus.scatter("texts", [(shard_ids,) if shard_ids is not None else None
+                                                for _, shard_ids in routes])
+        for (positions, _), texts in zip(routes, results):
+            if positions is not None:
+                for p, text in zip(positions.tolist(), texts):
+                    out[p] = text
+        return out
+
+
+class ShardedSignatures:
+    """Indexable like the MinHash signature matrix, gathering rows from the shards."""
+
+    def __init__(self, corpus: "ShardedCorpus"):
+        self.corpus = corpus
+
+    def __getitem__(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.ndim == 0:
+            return self[ids[None]][0]
+        routes = self.corpus.route(ids)
+        results = self.corpus.scatter("signatures", [(shard_ids,) if shard_ids is not None else None
+                                                     for _, shard_ids in routes])
+        rows = None
+        for (positions, _), signatures in zip(routes, results):
+            if positions is None:
+                continue
+            if rows is None:
+                rows = np.empty((len(ids), signatures.shape[1]), dtype=np.uint32)
+            rows[positions] = signatures
+        return rows if rows is not None else np.empty((0, 0), dtype=np.uint32)
+
+
+class ShardedCorpus:
+    """
+    Coordinator over running shard servers.
+
+    `faiss_index`, `bm25` and `chunks` mirror the unsharded objects, so the
+    search pipeline runs unchanged on top of them. Requests are scattered to
+    all shards before any reply is read, so shards work in parallel.
+    """
+
+    def __init__(self, addresses: Sequence[str], authkey: bytes):
+        self.clients = [ShardClient(address, authkey) for address in addresses]
+        infos = self.scatter("info", [()] * len(self.clients))
+        order = np.argsort([info["offset"] for info in infos], kind="stable")
+        self.clients, infos = [self.clients[i] for i in order], [infos[i] for i in order]
+        self.offsets = np.asarray([info["offset"] for info in infos], dtype=np.int64)
+        self.sizes = np.asarray([info["n_docs"] for info in infos], dtype=np.int64)
+        if (self.offsets[1:] != self.offsets[:-1] + self.sizes[:-1]).any() or self.offsets[0] != 0:
+            raise ValueError("❌ Shards do not cover one contiguous id range; rebuild them with scripts.build_shards.")
+        self.n_docs = int(self.sizes.sum())
+        self.version = make_cache_key(*(info["build_id"] for info in infos))[:16]
+        self.source_build_id = infos[0]["source_build_id"]
+        self.faiss_index = ShardedVectorIndex(self, infos[0]["d"], infos[0]["metric_type"])
+        self.bm25 = ShardedBM25(self, np.concatenate([info["doc_len"] for info in infos]), infos[0]["avgdl"])
+        self.chunks = ShardedChunks(self)
+        self.minhash = ShardedSignatures(self) if all(info["has_signatures"] for info in infos) else None
+
+    def scatter(self, op: str, args: Sequence[Optional[tuple]]) -> List[Any]:
+        """Send `op` to every shard whose args are not None, then collect the replies in shard order."""
+        sent, error = [], None
+        for i, (client, shard_args) in enumerate(zip(self.clients, args)):
+            if shard_args is None:
+                continue
+            try:
+                client.send(op, *shard_args)
+            except Exception as e:
+                error = e
+                break
+            sent.append(i)
+        # Always drain every reply, so no connection is left holding an unread one.
+        replies: List[Any] = [None] * len(self.clients)
+        for i in sent:
+            try:
+                replies[i] = self.clients[i].recv()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return replies
+
+    def route(self, ids: np.ndarray) -> List[Tuple[Optional[np.ndarray], Optional[np.ndarray]]]:
+        """Per shard, the positions in `ids` it owns and those ids (None where it owns none)."""
+        owner = np.searchsorted(self.offsets, ids, side="right") - 1
+        routes = []
+        for s in range(len(self.clients)):
+            positions = np.flatnonzero(owner == s)
+            routes.append((positions, ids[positions]) if len(positions) else (None, None))
+        return routes
+
+
+class ShardPool:
+    """
+    One server process per shard of a shards directory.
+
+    Shards run as fresh interpreters (`python -m scripts.serve_shard`) rather than
+    forked copies of the caller, so they never inherit loaded models.
+    """
+
+    def __init__(self, shards_dir: str, index_mode: Optional[str] = None, omp_threads: int = SHARD_OMP_THREADS):
+        self.shards_dir = os.path.abspath(shards_dir)
+        self.manifest = read_shards_manifest(self.shards_dir)
+        self.index_mode = index_mode
+        n_shards = len(self.manifest["shards"])
+        self.omp_threads = omp_threads or max(1, (os.cpu_count() or 1) // n_shards)
+        self.authkey = os.urandom(32)
+        self.addresses: List[str] = []
+        self.processes: List[subprocess.Popen] = []
+        self._socket_dir: Optional[str] = None
+
+    def start(self, timeout: float = SHARD_START_TIMEOUT) -> "ShardPool":
+        self._socket_dir = tempfile.mkdtemp(prefix="retrieval-shards-")
+        env = dict(os.environ, SHARD_AUTHKEY=self.authkey.hex(),
+                   PYTHONPATH=os.pathsep.join(filter(None, [_REPO_ROOT, os.environ.get("PYTHONPATH")])))
+        for shard in self.manifest["shards"]:
+            address = os.path.join(self._socket_dir, f"{shard['name']}.sock")
+            command = [sys.executable, "-m", "scripts.serve_shard", os.path.join(self.shards_dir, shard["name"]),
+                       "--address", address, "--threads", str(self.omp_threads)]
+            if self.index_mode:
+                command += ["--mode", self.index_mode]
+            self.processes.append(subprocess.Popen(command, env=env))
+            self.addresses.append(address)
+        atexit.register(self.close)
+
+        deadline = time.monotonic() + timeout
+        for process, address in zip(self.processes, self.addresses):
+            while not os.path.exists(address):
+                if process.poll() is not None:
+                    self.close()
+                    raise RuntimeError(f"❌ Shard server for '{address}' exited with code {process.returncode}.")
+                if time.monotonic() > deadline:
+                    self.close()
+                    raise TimeoutError(f"❌ Shard server for '{address}' did not start within {timeout:.0f}s.")
+                time.sleep(0.05)
+        return self
+
+    def connect(self) -> ShardedCorpus:
+        return ShardedCorpus(self.addresses, self.authkey)
+
+    def close(self) -> None:
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+        if self._socket_dir:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
@@ -0,0 +1,142 @@
+import math
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+import faiss
+
+# Supported FAISS index modes, all built from the vectors of the exact index:
+#   flat       exact search, read fully into RAM (previous behaviour)
+#   flat_mmap  exact search, vectors memory-mapped from disk and shared between processes
+#   ivf        inverted file over the exact vectors (IVF{nlist},Flat)
+#   hnsw       graph index (HNSW32)
+#   ivfpq      inverted file with product-quantized codes (IVF{nlist},PQ{m})
+#   sq8        exhaustive search over int8 scalar-quantized vectors (SQ8)
+INDEX_MODES = ("flat", "flat_mmap", "ivf", "hnsw", "ivfpq", "sq8")
+
+FAISS_INDEX_MODE = os.environ.get("FAISS_INDEX_MODE", "flat")
+FAISS_NPROBE = int(os.environ.get("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", "128"))
+
+# Zero-copy mmap where the installed FAISS supports it; IO_FLAG_MMAP copies flat codes into RAM.
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+def index_path_for(base_path: str, mode: str) -> str:
+    """Path of the index file for `mode`; flat modes share the original exact index file."""
+    if mode not in INDEX_MODES:
+        raise ValueError(f"❌ Unknown FAISS index mode '{mode}'. Choose one of {', '.join(INDEX_MODES)}.")
+    if mode in ("flat", "flat_mmap"):
+        return base_path
+    root, ext = os.path.splitext(base_path)
+    return f"{root}.{mode}{ext or '.idx'}"
+
+
+def reconstruct_vectors(index: faiss.Index) -> np.ndarray:
+    """Recover the stored vectors of an exact (flat) index."""
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def merge_search_results(distances: List[np.ndarray], ids: List[np.ndarray], k: int, higher_is_better: bool,
+                         exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge per-index `search` results that use one global id space into a single top-k.
+
+    Args:
+        distances: (n, k_i) distance matrices, one per searched index
+        ids: (n, k_i) global ids aligned with `distances`, -1 for missing hits
+        k (int): Results kept per query
+        higher_is_better (bool): True for inner-product indexes
+        exclude (np.ndarray): Global ids never to return (e.g. tombstones)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (n, k) float32 distances and int64 ids in
+        FAISS layout, padded with -1 ids; ties keep the order of the inputs.
+    """
+    missing = -np.finfo(np.float32).max if higher_is_better else np.finfo(np.float32).max
+    distances, ids = np.hstack(distances), np.hstack(ids)
+    dead = ids < 0
+    if exclude is not None and len(exclude):
+        dead |= np.isin(ids, exclude)
+    distances = np.where(dead, missing, distances)
+    order = np.argsort(-distances if higher_is_better else distances, axis=1, kind="stable")[:, :k]
+    distances = np.take_along_axis(distances, order, axis=1)
+    ids = np.where(np.take_along_axis(dead, order, axis=1), -1, np.take_along_axis(ids, order, axis=1))
+    if ids.shape[1] < k:
+        pad = k - ids.shape[1]
+        distances = np.hstack([distances, np.full((len(ids), pad), missing, dtype=distances.dtype)])
+        ids = np.hstack([ids, np.full((len(ids), pad), -1, dtype=ids.dtype)])
+    return distances.astype(np.float32), ids.astype(np.int64)
+
+
+def _pq_subquantizers(dim: int) -> int:
+    for m in (64, 48, 32, 24, 16, 8, 4, 2):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def factory_string(mode: str, n_vectors: int, dim: int) -> str:
+    """FAISS index_factory description for a compressed/approximate mode."""
+    nlist = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39 or 1))
+    if mode == "ivf":
+        return f"IVF{nlist},Flat"
+    if mode == "hnsw":
+        return "HNSW32"
+    if mode == "ivfpq":
+        return f"IVF{nlist},PQ{_pq_subquantizers(dim)}"
+    if mode == "sq8":
+        return "SQ8"
+    raise ValueError(f"❌ Mode '{mode}' is not built with index_factory.")
+
+
+def build_index(vectors: np.ndarray, mode: str, metric: int = faiss.METRIC_L2,
+                train_size: int = 100_000, seed: int = 0) -> faiss.Index:
+    """
+    Build an index of the given mode over `vectors`.
+
+    Args:
+        vectors (np.ndarray): float32 matrix (n, d), usually `reconstruct_vectors(exact_index)`
+        mode (str): One of INDEX_MODES except the flat ones, which reuse the exact index file
+        metric (int): FAISS metric of the exact index, so distances stay comparable
+        train_size (int): Maximum number of vectors sampled to train IVF/PQ/SQ quantizers
+
+    Returns:
+        faiss.Index: Trained and populated index
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    index = faiss.index_factory(dim, factory_string(mode, n, dim), metric)
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors if n <= train_size else vectors[rng.choice(n, train_size, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def configure_search(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> faiss.Index:
+    """Apply query-time knobs (IVF nprobe, HNSW efSearch) where the index supports them."""
+    params = faiss.ParameterSpace()
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params.set_index_parameter(index, "nprobe", nprobe or FAISS_NPROBE)
+    if isinstance(index, faiss.IndexHNSW):
+        params.set_index_parameter(index, "efSearch", ef_search or FAISS_EF_SEARCH)
+    return index
+
+
+def load_index(base_path: str, mode: Optional[str] = None, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None) -> faiss.Index:
+    """
+    Load the FAISS index for `mode` (defaults to FAISS_INDEX_MODE).
+
+    Approximate modes must have been built beforehand with
+    `python -m scripts.build_faiss_indexes`.
+    """
+    mode = mode or FAISS_INDEX_MODE
+    path = index_path_for(base_path, mode)
+    if not os.path.exists(path):
+        hint = "" if mode in ("flat", "flat_mmap") else f" Build it with `python -m scripts.build_faiss_indexes --modes {mode}`."
+        raise FileNotFoundError(f"❌ FAISS index '{path}' not found.{hint}")
+    index = faiss.read_index(path, _MMAP_FLAG) if mode == "flat_mmap" else faiss.read_index(path)
+    return configure_search(index, nprobe=nprobe, ef_search=ef_search)
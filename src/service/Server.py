@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from src.utils.Profiling import latency_summary
+
+# Long-running diagnosis service. The compiled graph (main.build_graph_runnable) and
+# the retrieval stack (indexes, BM25, patient histories, embedding models, rerankers)
+# are loaded once in the background after the server starts listening; /readyz turns
+# green when warmup has finished. Diagnoses run on a pool of SERVICE_WORKERS threads,
+# SERVICE_MAX_QUEUE more requests may wait, and further ones are rejected with 429.
+SERVICE_HOST = os.environ.get("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.environ.get("SERVICE_PORT", "8080"))
+SERVICE_SOCKET = os.environ.get("SERVICE_SOCKET")  # Unix socket path, replaces host/port
+SERVICE_WORKERS = int(os.environ.get("SERVICE_WORKERS", "4"))
+SERVICE_MAX_QUEUE = int(os.environ.get("SERVICE_MAX_QUEUE", "16"))
+SERVICE_REQUEST_TIMEOUT = float(os.environ.get("SERVICE_REQUEST_TIMEOUT", "600"))
+# Retrieval query run during warmup so the first request finds every model loaded and warm
+SERVICE_WARMUP_QUERY = os.environ.get("SERVICE_WARMUP_QUERY", "chest pain and shortness of breath")
+SERVICE_LATENCY_SAMPLES = int(os.environ.get("SERVICE_LATENCY_SAMPLES", "1000"))
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class ServiceUnavailable(Exception):
+    """The service cannot take the request now; carries the HTTP status to answer with."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class DiagnosisService:
+    """
+    Warm models plus a worker pool that runs diagnosis requests.
+
+    Each request runs as a batch case (`src.reports.Batch.run_case`): its own
+    ReportSession and graph thread, on the models and caches shared by all.
+    """
+
+    def __init__(self, workers: int = SERVICE_WORKERS, max_queue: int = SERVICE_MAX_QUEUE,
+                 request_timeout: float = SERVICE_REQUEST_TIMEOUT):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.request_timeout = request_timeout
+        self.state = "starting"  # starting → warming → ready, or failed
+        self.error: Optional[str] = None
+        self.started = time.time()
+        self.warmup_seconds: Optional[float] = None
+        self.runnable = None
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="diagnosis")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._counts = {"completed": 0, "failed": 0, "rejected": 0, "timed_out": 0}
+        self._latency = deque(maxlen=SERVICE_LATENCY_SAMPLES)
+
+    # Warmup
+
+    def warmup(self) -> None:
+        """Load the graph and the retrieval stack and run a warm-up search."""
+        self.state = "warming"
+        start = time.perf_counter()
+        try:
+            # Importing main loads the retrieval stack (DataLoader) and the report modules
+            from main import build_graph_runnable
+            from src.models.LoadEmbeddingModel import preload_retrieval_models
+            from src.retrieval.Search import build_query_context, search
+
+            self.runnable = build_graph_runnable()
+            preload_retrieval_models()
+            search(build_query_context(SERVICE_WARMUP_QUERY))
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "failed"
+            print(f"❌ Service warmup failed: {self.error}")
+            return
+        self.warmup_seconds = time.perf_counter() - start
+        self.state = "ready"
+        print(f"✅ Service ready after {self.warmup_seconds:.1f}s warmup")
+
+    def start_warmup(self) -> threading.Thread:
+        thread = threading.Thread(target=self.warmup, name="service-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    # Endpoints
+
+    def health(self) -> Tuple[int, Dict[str, Any]]:
+        """Liveness: the process serves requests; a failed warmup needs a restart."""
+        status = 503 if self.state == "failed" else 200
+        return status, {"status": "failed" if status == 503 else "ok", "state": self.state,
+                        "uptime_seconds": time.time() - self.started}
+
+    def readiness(self) -> Tuple[int, Dict[str, Any]]:
+        """Readiness: green only once warmup has finished."""
+        body = {"status": self.state, "warmup_seconds": self.warmup_seconds}
+        if self.error:
+            body["error"] = self.error
+        return (200 if self.state == "ready" else 503), body
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counters, queue depth and latencies of the service and the LLM client."""
+        with self._lock:
+            body = {**self._counts, "pending": self._pending, "workers": self.workers, "max_queue": self.max_queue,
+                    "latency_seconds": {k: v / 1000 for k, v in latency_summary(list(self._latency)).items()}}
+        if self.state == "ready":
+            from src.models.LoadLLM import llm
+            body["llm_latency_ms"] = llm.latency_stats()
+            body["llm_cache"] = llm.cache_stats()
+        return body
+
+    def _admit(self) -> None:
+        if self.state != "ready":
+            raise ServiceUnavailable(503, f"Service is not ready ({self.state}).")
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._counts["rejected"] += 1
+                raise ServiceUnavailable(429, "Too many diagnosis requests in flight; retry later.")
+            self._pending += 1
+
+    def _run(self, case: Dict[str, str], thread_id: str) -> Dict[str, Any]:
+        from src.reports.Batch import run_case
+        try:
+            result = run_case(self.runnable, case, thread_id=thread_id)
+        finally:
+            # Every request has its own graph thread; drop its checkpoints once answered
+            delete_thread = getattr(getattr(self.runnable, "checkpointer", None), "delete_thread", None)
+            if delete_thread is not None:
+                delete_thread(thread_id)
+            with self._lock:
+                self._pending -= 1
+        with self._lock:
+            self._counts["failed" if result["error"] else "completed"] += 1
+            self._latency.append(result["latency_seconds"] * 1000)
+        return result
+
+    def diagnose(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Run one diagnosis request: {"query": ..., "subject_id": ..., "image": ..., "case_id": ...}.
+
+        Returns:
+            tuple: (HTTP status, the `run_case` result or an error body)
+        """
+        from src.reports.Batch import normalize_case
+
+        request_id = uuid.uuid4().hex[:12]
+        case = normalize_case(payload, 0)
+        if not payload.get("case_id") and not payload.get("id"):
+            case["case_id"] = request_id
+        if not case["query"]:
+            return 400, {"error": "Query cannot be empty!", "request_id": request_id}
+        self._admit()
+        future = self._executor.submit(self._run, case, f"request-{request_id}")
+        try:
+            result = future.result(timeout=self.request_timeout)
+        except FutureTimeoutError:
+            # The worker finishes the case in the background and frees its slot then
+            with self._lock:
+                self._counts["timed_out"] += 1
+            return 504, {"error": f"Diagnosis did not finish within {self.request_timeout:g}s.",
+                         "request_id": request_id}
+        result["request_id"] = request_id
+        return (500 if result["error"] else 200), result
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MedicalAgent/1.0"
+    protocol_version = "HTTP/1.1"
+    service: DiagnosisService = None
+
+    def address_string(self) -> str:
+        # Unix socket peers have no host
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        print(f"🌐 {self.address_string()} {format % args}")
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status in (429, 503):
+            self.send_header("Retry-After", "5")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/healthz":
+            self._send(*self.service.health())
+        elif path == "/readyz":
+            self._send(*self.service.readiness())
+        elif path == "/stats":
+            self._send(200, self.service.stats())
+        else:
+            self._send(404, {"error": f"Unknown path '{path}'."})
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        if path != "/diagnose":
+            self._send(404, {"error": f"Unknown path '{path}'."})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self._send(413, {"error": "Request body too large."})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            self._send(400, {"error": f"Invalid JSON body: {e}"})
+            return
+        try:
+            self._send(*self.service.diagnose(payload))
+        except ServiceUnavailable as e:
+            self._send(e.status, {"error": str(e)})
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: DiagnosisService, host: str = SERVICE_HOST, port: int = SERVICE_PORT,
+                socket_path: Optional[str] = SERVICE_SOCKET) -> socketserver.BaseServer:
+    """HTTP server on host:port, or on a Unix socket if `socket_path` is given, dispatching to `service`."""
+    handler = type("DiagnosisHandler", (_Handler,), {"service": service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return _ThreadingUnixHTTPServer(socket_path, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Medical Agent diagnosis service with warm models.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--socket", default=SERVICE_SOCKET, help="Serve on this Unix socket instead of host:port")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Diagnoses run concurrently")
+    parser.add_argument("--max-queue", type=int, default=SERVICE_MAX_QUEUE, help="Requests waiting for a worker")
+    args = parser.parse_args(argv)
+
+    service = DiagnosisService(args.workers, args.max_queue)
+    server = make_server(service, args.host, args.port, args.socket)
+    where = args.socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"🏥 Diagnosis service listening on {where} (GET /healthz, /readyz, /stats; POST /diagnose)")
+    service.start_warmup()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🏥 Shutting down diagnosis service")
+    finally:
+        server.server_close()
+        service.shutdown()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence
+import numpy as np
+
+
+def memory_usage() -> Dict[str, int]:
+    """
+    Resident memory of the current process in bytes.
+
+    Returns:
+        dict: rss (total resident), rss_anon (private heap, not shareable) and
+              rss_file (file-backed pages such as mmap'd indexes, shareable
+              between processes). Falls back to peak RSS where /proc is unavailable.
+    """
+    usage = {"rss": 0, "rss_anon": 0, "rss_file": 0}
+    fields = {"VmRSS:": "rss", "RssAnon:": "rss_anon", "RssFile:": "rss_file"}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0] in fields:
+                    usage[fields[parts[0]]] = int(parts[1]) * 1024
+    except OSError:
+        import resource
+        # ru_maxrss is KiB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage["rss"] = usage["rss_anon"] = peak if sys.platform == "darwin" else peak * 1024
+    return usage
+
+
+def format_bytes(n: float) -> str:
+    """Human readable byte count."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}GB"
+
+
+def latency_summary(samples_ms: Sequence[float]) -> Dict[str, float]:
+    """Mean, p50 and p99 of a list of latencies in milliseconds."""
+    if not len(samples_ms):
+        return {"mean": 0.0, "p50": 0.0, "p99": 0.0}
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p99": float(np.percentile(arr, 99)),
+    }
+
+
+@contextmanager
+def timed(samples: List[float]) -> Iterator[None]:
+    """Append the wall time of the block, in milliseconds, to `samples`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        samples.append((time.perf_counter() - start) * 1000)
@@ -0,0 +1,109 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Report functions stream through an on_token(section, token) callback. Sections are
+# the keys the report exports to diagnosis_data.
+SECTION_HEADERS = {
+    "image_diagnosis": "✅ Final Image Diagnosis:",
+    "diagnosis_with_history": "✅ Final Diagnosis:",
+    "combined_final_diagnosis": "✅ Final Combined Diagnosis (Image + Query+History):",
+}
+
+TokenCallback = Callable[[str, str], None]
+
+_DONE = object()
+
+
+@contextmanager
+def streaming_section(on_token: Optional[TokenCallback], section: str) -> Iterator[Optional[Callable[[str], None]]]:
+    """
+    Bind a report-level on_token(section, token) callback to one section for `llm._call`.
+
+    Callbacks with an `end_section(section)` method (such as TokenPrinter) are
+    told when the section's completion is over, also when it failed.
+    """
+    if on_token is None:
+        yield None
+        return
+    try:
+        yield lambda token: on_token(section, token)
+    finally:
+        end_section = getattr(on_token, "end_section", None)
+        if end_section is not None:
+            end_section(section)
+
+
+class TokenPrinter:
+    """
+    on_token callback that prints every section's tokens as they arrive, under its header.
+
+    Sections may stream concurrently (see src/reports/Pipeline.py): the first one
+    is printed live and the others are buffered until it ends.
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None):
+        self.headers = SECTION_HEADERS if headers is None else headers
+        self._live: Optional[str] = None
+        self._buffers: Dict[str, List[str]] = {}
+        self._ended: set = set()
+        self._lock = threading.Lock()
+
+    def _print_header(self, section: str) -> None:
+        print(f"\n\n{self.headers.get(section, section)}")
+
+    def __call__(self, section: str, token: str) -> None:
+        with self._lock:
+            if self._live is None:
+                self._live = section
+                self._print_header(section)
+            if section == self._live:
+                print(token, end="", flush=True)
+            else:
+                self._buffers.setdefault(section, []).append(token)
+
+    def end_section(self, section: str) -> None:
+        with self._lock:
+            self._ended.add(section)
+            if section != self._live:
+                return
+            self._live = None
+            # Catch up on the sections that streamed meanwhile; the first unfinished one goes live.
+            while self._buffers:
+                next_section = next(iter(self._buffers))
+                self._print_header(next_section)
+                print("".join(self._buffers.pop(next_section)), end="", flush=True)
+                if next_section not in self._ended:
+                    self._live = next_section
+                    break
+
+
+def iterate_tokens(run: Callable[[TokenCallback], Any]) -> Iterator[Tuple[str, Any]]:
+    """
+    Generator interface over a function that streams through an on_token callback.
+
+    `run(on_token)` is executed on a worker thread. Its (section, token) events
+    are yielded as they arrive, followed by ("done", return value). Exceptions
+    raised by `run` are re-raised in the consumer.
+    """
+    events: "queue.Queue" = queue.Queue()
+    outcome = {}
+
+    def worker():
+        try:
+            outcome["result"] = run(lambda section, token: events.put((section, token)))
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            events.put(_DONE)
+
+    threading.Thread(target=worker, name="report-stream", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is _DONE:
+            break
+        yield event
+    if "error" in outcome:
+        raise outcome["error"]
+    yield "done", outcome["result"]